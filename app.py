@@ -1,10 +1,21 @@
 # app.py
-import logging
 import streamlit as st
-from src.app.ui import create_ui
-from src.app.backend import process_query
-# In backend.py or app.py
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+from src.app.ui import create_ui, show_readiness
+# Thin client: queries go to the headless server (python -m src.app.server) when it is running
+from src.app.client import get_default_backend
+from src.setup.logging_config import configure_logging
+# Once per process (Streamlit reruns this script); SHADOW_LOG_MODE=production queues and samples
+configure_logging()
+
+@st.cache_resource(show_spinner=False)
+def shared_backend():
+    """
+    The QueryBackend every session and rerun of this Streamlit process goes through
+    (created and started once; it answers via the query server or the in-process backend).
+    """
+    backend = get_default_backend()
+    backend.start()
+    return backend
 
 def main():
     """Main entry point for the Project SHADOW application."""
@@ -166,11 +177,13 @@ def main():
 
     # --- Rest of the app logic remains the same ---
     query, agent_level, submit_button = create_ui()
+    # Starts the model/corpus warm-up in the background on the first run, so the page paints right away
+    backend = shared_backend()
+    show_readiness(backend.readiness())
 
     if submit_button and query:
         with st.spinner("Processing your query..."):
-            # Replace with your actual backend call
-            response, explanation, status = process_query(query, agent_level)
+            response, explanation, status = backend.process_query(query, agent_level)
 
             if status == "success":
                 st.markdown("<div class='response-container'>", unsafe_allow_html=True)
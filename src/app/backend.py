@@ -1,21 +1,38 @@
 # --- COMPLETED and CORRECTED backend.py (Indentation Fixed) ---
 
 import os
+import atexit
 import logging
+import functools
 import datetime
 import time
+import threading
+import multiprocessing
 import re # Make sure re is imported
+from concurrent.futures import ProcessPoolExecutor
 from typing import Tuple, List, Dict, Any, Optional
+import numpy as np
 
 # Import project modules
-from src.data_processing.ingest_documents import load_documents
-from src.data_processing.chunk_and_annotate import create_chunks, get_chunk_context # Import get_chunk_context
-from src.retrieval.embedding_engine import get_embeddings
-from src.retrieval.vector_search import search_similar_chunks
+from src.setup import environment as env
+from src.setup import metrics
+from src.data_processing.ingest_documents import discover_documents, ingest_documents
+from src.data_processing.chunk_and_annotate import get_chunk_context # Import get_chunk_context
+from src.data_processing.pipeline import run_build_pipeline
+from src.data_processing.incremental import file_signature, detect_changed_documents, diff_chunks
+from src.retrieval.embedding_engine import get_embeddings, get_query_embeddings, normalize_query, MODEL_KEY
+from src.retrieval.embedding_cache import EmbeddingCache, text_hash
+from src.retrieval.vector_search import search_similar_chunks, search_similar_chunks_batch, normalize_embeddings
+from src.retrieval.index_backends import load_or_build_index, apply_index_delta, corpus_fingerprint
+from src.retrieval.metadata_index import ChunkMetadataIndex
+from src.retrieval.chunk_store import ChunkStore
+from src.retrieval.lexical_index import BM25Index
+from src.retrieval.embedding_store import open_embedding_store, write_embedding_store, update_embedding_store
+from src.retrieval.lru_cache import LRUCache
 from src.retrieval.security_filter import filter_by_clearance
 # Use standard response generator only as fallback or if style guide fails
 from src.retrieval.response_handler import generate_standard_response
-from src.framework.rule_parser import parse_rules, match_rule_to_query
+from src.framework.rule_parser import parse_rules, compile_rules, match_rule_to_query
 
 # Setup logging
 # Configure logging format ONCE at the application entry point (e.g., app.py) if possible
@@ -23,28 +40,96 @@ from src.framework.rule_parser import parse_rules, match_rule_to_query
 logger = logging.getLogger(__name__) # Use __name__ for logger
 
 # Global variables to store processed data
-document_chunks: List[Dict[str, Any]] = []
-chunk_embeddings: List[Any] = [] # Typically list of numpy arrays or tensors
-parsed_rules: List[Dict[str, Any]] = []
+document_chunks: Any = [] # ChunkStore (sequence of ChunkView), or the plain chunk dicts with SHADOW_CHUNK_STORE off
+chunk_embeddings: Any = [] # Normalized float32 matrix, usually a read-only memmap of the embedding store
+search_engine: Optional[Any] = None # Vector index built from chunk_embeddings (see index_backends)
+chunk_metadata_index: Optional[ChunkMetadataIndex] = None # Source/doc_type/level bitmaps for predicate pushdown
+lexical_index: Optional[BM25Index] = None # BM25 postings for the hybrid / lexical_prefilter retrieval modes
+parsed_rules: Any = [] # CompiledRuleSet (iterates like the parsed rule list)
+document_signatures: Dict[str, Dict[str, Any]] = {} # Document name -> mtime/size/sha256 at the last (re)ingestion
 initialized: bool = False
+last_build_stats: Dict[str, Any] = {} # Per-stage throughput of the last pipelined build
+corpus_version: int = 0 # Bumped on every successful (re)initialization; part of every response cache key
 last_initialization_attempt: float = 0
 INITIALIZATION_COOLDOWN: int = 300  # 5 minutes in seconds
+CONTENT_DOC_TYPES: Tuple[str, ...] = ("classified",) # Document types RAG answers are drawn from (see the corpus manifest)
+FRAMEWORK_SOURCE: str = "Response Framework" # Corpus document the framework rules are parsed from
+LEVEL_MAPPING: Dict[str, int] = {"Level 1 (Low)": 1, "Level 2 (Medium)": 2, "Level 3 (High)": 3, "Level 4 (Very High)": 4, "Level 5 (Top Secret)": 5}
+
+# End-to-end (query, clearance level, corpus version) -> (response, explanation, status)
+_response_cache = LRUCache(maxsize=env.RESPONSE_CACHE_SIZE, ttl=env.RESPONSE_CACHE_TTL)
 
 class SystemNotInitializedError(Exception):
     """Exception raised when the system is not properly initialized."""
     pass
 
+# --- single-flight (re)initialization ---
+class _InitFlight:
+    """One (re)initialization in progress; concurrent callers wait on it instead of starting their own."""
+    __slots__ = ("name", "done", "result")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.done = threading.Event()
+        self.result = False
+
+_init_lock = threading.Lock() # Guards _init_flight only; never held while building
+_init_flight: Optional[_InitFlight] = None
+
+def _single_flight(name: str, build, share: bool = True) -> bool:
+    """
+    Run build() unless a (re)initialization is already in flight, in which case block until
+    that one finishes and return its result. Only one build touches the globals at a time.
+
+    share=False is for operations another build can't stand in for (e.g. a rule reload from
+    a given path): they wait for the in-flight build and then run their own.
+    """
+    global _init_flight
+    while True:
+        with _init_lock:
+            flight = _init_flight
+            if flight is None:
+                flight = _init_flight = _InitFlight(name)
+                break
+        logger.info("%s already in progress; waiting for it before continuing.", flight.name)
+        flight.done.wait()
+        if share:
+            return flight.result
+    try:
+        flight.result = bool(build())
+    finally:
+        with _init_lock:
+            _init_flight = None
+        flight.done.set()
+    return flight.result
+
 # --- initialize_system function ---
-def initialize_system(force: bool = False) -> bool:
+def initialize_system(force: bool = False, full_rebuild: bool = False) -> bool:
     """
     Initialize the system by loading documents, creating chunks, and generating embeddings.
     This is done once and cached for subsequent queries.
+
+    force=True on an initialized system re-ingests only the documents that changed
+    (see refresh_corpus) unless SHADOW_INCREMENTAL_INGEST is off or full_rebuild is set.
+
+    Thread-safe and single-flight: callers arriving while a build or refresh is running
+    wait for it and share its result (also when they passed different arguments), so
+    concurrent sessions on a cold process never load the model or embed the corpus twice.
+    A forced rebuild keeps serving the current corpus until the new one is swapped in.
     """
-    global document_chunks, chunk_embeddings, parsed_rules, initialized, last_initialization_attempt
+    if initialized and not force:
+        return True # Fast path: no locking once the corpus is live
+    return _single_flight("Initialization", lambda: _initialize_system(force, full_rebuild))
+
+def _initialize_system(force: bool, full_rebuild: bool) -> bool:
+    global document_chunks, chunk_embeddings, search_engine, chunk_metadata_index, lexical_index, parsed_rules, initialized, last_initialization_attempt, corpus_version, document_signatures
+
+    if force and initialized and env.INCREMENTAL_INGEST and not full_rebuild:
+        return _refresh_corpus()
 
     current_time = time.time()
     if not force and initialized:
-        logger.debug("System already initialized.") # Use debug level for this
+        logger.debug("System already initialized.") # Another caller finished the build while this one queued
         return True
     elif not force and (current_time - last_initialization_attempt < INITIALIZATION_COOLDOWN) and not initialized:
         logger.warning(f"Initialization failed less than {INITIALIZATION_COOLDOWN/60:.1f} minutes ago. Skipping attempt.")
@@ -54,89 +139,301 @@ def initialize_system(force: bool = False) -> bool:
     logger.info("Attempting system initialization (force=%s)...", force)
 
     try:
-        # Reset globals ONLY if forcing or if not initialized yet
-        if force or not initialized:
-            logger.info("Resetting global data for initialization.")
-            initialized = False # Mark as not initialized until success
-            document_chunks = []
-            chunk_embeddings = []
-            parsed_rules = []
-
-        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        data_dir = os.path.join(project_root, "data")
+        data_dir = env.DATA_DIR
         logger.info(f"Looking for data directory at: {data_dir}")
         if not os.path.exists(data_dir):
             logger.error(f"Data directory not found at {data_dir}.")
             return False # Cannot initialize
 
-        secret_manual_path = os.path.join(data_dir, "Secret_Info_Manual.txt")
-        response_framework_path = os.path.join(data_dir, "Response_Framework.txt")
-        logger.info(f"Checking for Secret Manual at: {secret_manual_path}")
+        corpus_entries = discover_documents(data_dir)
+        response_framework_path = _framework_path(corpus_entries)
         logger.info(f"Checking for Response Framework at: {response_framework_path}")
-        if not os.path.exists(secret_manual_path) or not os.path.exists(response_framework_path):
+        if not any(entry["type"] == "classified" for entry in corpus_entries.values()) or not os.path.exists(response_framework_path):
             logger.error("Required document(s) not found.")
             return False
 
-        # Load documents
-        logger.info("Loading documents...")
-        documents = load_documents(
-            secret_manual_path=secret_manual_path,
-            response_framework_path=response_framework_path
-        )
-        logger.info(f"Loaded {len(documents)} documents.")
+        # Signatures are taken before reading, so an edit made while loading is picked up by the next refresh
+        signatures = {name: file_signature(entry["path"]) for name, entry in corpus_entries.items()}
 
+        # Everything is built into locals; the live globals keep serving queries until the final swap
         # Parse rules
-        if force or not parsed_rules: # Check before parsing
-            logger.info(f"Parsing response framework rules from: {response_framework_path}")
-            try:
-                parsed_rules = parse_rules(response_framework_path)
-                logger.info(f"Successfully parsed {len(parsed_rules)} rules.")
-                if not parsed_rules:
-                    logger.warning("No rules parsed. Rule-based responses disabled.")
-            except Exception as e:
-                logger.error(f"Failed to parse response framework rules: {e}", exc_info=True)
+        rules: Any = []
+        logger.info(f"Parsing response framework rules from: {response_framework_path}")
+        try:
+            rules = compile_rules(parse_rules(response_framework_path))
+            logger.info(f"Successfully parsed {len(rules)} rules.")
+            if not rules:
+                logger.warning("No rules parsed. Rule-based responses disabled.")
+        except Exception as e:
+            logger.error(f"Failed to parse response framework rules: {e}", exc_info=True)
+
+        # Create chunks (the pipelined build embeds them while later documents are still being read)
+        prebuilt_embeddings, embedding_cache = None, None
+        logger.info(f"Loading and chunking {len(corpus_entries)} documents...")
+        if env.BUILD_PIPELINE:
+            chunks, prebuilt_embeddings, embedding_cache = _pipelined_build(corpus_entries)
         else:
-            logger.info("Rules already parsed, skipping parse.")
-
-        # Create chunks
-        if force or not document_chunks: # Check before chunking
-             logger.info("Creating chunks...")
-             document_chunks = create_chunks(documents)
-             if not document_chunks:
-                 logger.error("No chunks were created. Cannot proceed.")
-                 return False
-             # Debug: Print sample chunk metadata
-             logger.info("Sample chunks metadata:")
-             for i, chunk in enumerate(document_chunks[:3]): logger.info(f"  Chunk {i}: {chunk['metadata']}")
-             if len(document_chunks) > 3: logger.info(f"  Chunk {len(document_chunks)-1}: {document_chunks[-1]['metadata']}")
-        else:
-            logger.info("Chunks already created, skipping.")
-
+            chunks = ingest_documents(corpus_entries)
+        if not chunks:
+            logger.error("No chunks were created. Cannot proceed.")
+            return False
+        chunks = _as_chunk_store(chunks)
+        # Debug: Print sample chunk metadata
+        logger.info("Sample chunks metadata:")
+        for i, chunk in enumerate(chunks[:3]): logger.info(f"  Chunk {i}: {chunk['metadata']}")
+        if len(chunks) > 3: logger.info(f"  Chunk {len(chunks)-1}: {chunks[-1]['metadata']}")
+
+        # Generate embeddings (or map them from the shared on-disk store)
+        logger.info("Generating embeddings...")
+        embeddings = _load_or_embed_chunks(chunks, embeddings=prebuilt_embeddings, cache=embedding_cache)
+        if len(embeddings) == 0:
+            logger.error("No embeddings were generated. Cannot proceed.")
+            return False
 
-        # Generate embeddings
-        if force or not chunk_embeddings: # Check before embedding
-            logger.info("Generating embeddings...")
-            chunk_embeddings = get_embeddings(document_chunks)
-            if not chunk_embeddings:
-                logger.error("No embeddings were generated. Cannot proceed.")
-                return False
-        else:
-            logger.info("Embeddings already generated, skipping.")
+        # Build (or load from disk) the vector index once so queries don't touch raw embeddings
+        logger.info("Loading/building vector index...")
+        engine = load_or_build_index(chunks, embeddings, model_name=MODEL_KEY, normalized=True)
+        logger.info(f"Vector index ready: {type(engine).__name__} with {len(engine)} x {engine.dim} vectors.")
+        metadata_index = ChunkMetadataIndex(chunks)
+        bm25_index = _build_lexical_index(chunks)
 
         # Final validation
-        if len(document_chunks) != len(chunk_embeddings):
-            logger.error(f"CRITICAL: Mismatch between chunk count ({len(document_chunks)}) and embedding count ({len(chunk_embeddings)})")
+        if len(chunks) != len(embeddings):
+            logger.error(f"CRITICAL: Mismatch between chunk count ({len(chunks)}) and embedding count ({len(embeddings)})")
             return False
 
+        # Swap in one statement so queries snapshotting these globals see old or new, never a mix
+        document_chunks, chunk_embeddings, search_engine, chunk_metadata_index, lexical_index, parsed_rules = chunks, embeddings, engine, metadata_index, bm25_index, rules
+        document_signatures = signatures
+        corpus_version += 1
+        _response_cache.clear()
         initialized = True
-        logger.info("System initialization successful.")
+        logger.info(f"System initialization successful (corpus version {corpus_version}).")
         return True
 
     except Exception as e:
         logger.exception(f"CRITICAL ERROR during initialization: {e}")
-        initialized = False # Ensure state reflects failure
+        if initialized:
+            logger.error("Keeping the previously loaded corpus.") # A failed forced rebuild doesn't take the system down
         return False
 
+# --- _framework_path helper ---
+def _framework_path(corpus_entries: Dict[str, Dict[str, str]]) -> str:
+    """Path of the Response Framework the rules are parsed from."""
+    entry = corpus_entries.get(FRAMEWORK_SOURCE)
+    return entry["path"] if entry else os.path.join(env.DATA_DIR, "Response_Framework.txt")
+
+# --- _as_chunk_store helper ---
+def _as_chunk_store(chunks: List[Dict[str, Any]]) -> Any:
+    """Pack freshly built chunk dicts into a ChunkStore (unless SHADOW_CHUNK_STORE is off)."""
+    return ChunkStore(chunks) if env.CHUNK_STORE else chunks
+
+# --- _build_lexical_index helper ---
+def _build_lexical_index(chunks: List[Dict[str, Any]]) -> Optional[BM25Index]:
+    """BM25 index for the lexical retrieval modes (None in the default dense mode)."""
+    if env.RETRIEVAL_MODE == "dense":
+        return None
+    return BM25Index(chunks, k1=env.BM25_K1, b=env.BM25_B)
+
+# --- refresh_corpus function ---
+def refresh_corpus() -> bool:
+    """
+    Incrementally re-ingest documents that changed on disk since the last (re)ingestion.
+
+    Changed documents are found by mtime/size and confirmed by content hash. Only those
+    are re-chunked; the chunk-id diff against the live corpus gives the rows to delete and
+    the chunks to embed, and the delta is applied to the embedding store and vector index.
+    The live corpus keeps serving queries until the updated one is swapped in.
+
+    Returns:
+        bool: True if the corpus is up to date (changed or not)
+    """
+    return _single_flight("Corpus refresh", _refresh_corpus)
+
+def _refresh_corpus() -> bool:
+    global document_chunks, chunk_embeddings, search_engine, chunk_metadata_index, lexical_index, document_signatures, corpus_version
+    if not initialized:
+        return _initialize_system(force=False, full_rebuild=False)
+
+    try:
+        corpus_entries = discover_documents(env.DATA_DIR)
+        signatures, changed = detect_changed_documents({name: entry["path"] for name, entry in corpus_entries.items()}, document_signatures)
+        if not changed:
+            document_signatures = signatures # Remember new mtimes of touched-but-identical files
+            logger.info("No document changes detected; corpus is up to date.")
+            return True
+
+        if FRAMEWORK_SOURCE in changed:
+            _reload_rules(_framework_path(corpus_entries)) # Keeps the previous rules if the new file doesn't parse
+
+        new_chunks = ingest_documents({name: entry for name, entry in corpus_entries.items() if name in changed})
+        kept_chunks, removed_rows, added_chunks = diff_chunks(document_chunks, new_chunks, changed)
+        if not kept_chunks and not added_chunks:
+            logger.error("Refresh would leave no chunks. Keeping the current corpus.")
+            return False
+        chunks = _as_chunk_store(kept_chunks + added_chunks)
+
+        embeddings, engine = chunk_embeddings, search_engine
+        if removed_rows or added_chunks:
+            embeddings = _apply_embedding_delta(chunks, removed_rows, added_chunks)
+            engine = apply_index_delta(search_engine, chunks, embeddings, removed_rows, model_name=MODEL_KEY)
+        metadata_index = ChunkMetadataIndex(chunks) # Metadata can change without text changes (e.g. a header's level)
+        bm25_index = _build_lexical_index(chunks) if removed_rows or added_chunks else lexical_index
+
+        # Swap in one statement so queries snapshotting these globals see old or new, never a mix
+        document_chunks, chunk_embeddings, search_engine, chunk_metadata_index, lexical_index = chunks, embeddings, engine, metadata_index, bm25_index
+        document_signatures = signatures
+        corpus_version += 1
+        _response_cache.clear()
+        logger.info(f"Incremental refresh complete: -{len(removed_rows)} +{len(added_chunks)} chunks, {len(chunks)} total (corpus version {corpus_version}).")
+        return True
+    except Exception as e:
+        logger.exception(f"Incremental refresh failed, keeping the current corpus: {e}")
+        return False
+
+# --- _apply_embedding_delta helper ---
+def _apply_embedding_delta(chunks: List[Dict[str, Any]], removed_rows: List[int], added_chunks: List[Dict[str, Any]]) -> Any:
+    """
+    Embed only the added chunks and apply the delete/insert delta to the current matrix.
+
+    Args:
+        chunks (list): Chunk list after the delta (survivors in order, then added chunks)
+        removed_rows (list): Rows of the current matrix to delete
+        added_chunks (list): Chunks to embed and append
+
+    Returns:
+        np.ndarray: Normalized matrix matching chunks (a memmap of the store when enabled)
+    """
+    dim = chunk_embeddings.shape[1]
+    added_matrix = np.empty((0, dim), dtype=np.float32)
+    if added_chunks:
+        cache = EmbeddingCache(MODEL_KEY) if env.EMBEDDING_CACHE else None
+        added_matrix = normalize_embeddings(get_embeddings(added_chunks, cache=cache))
+        if cache is not None:
+            try:
+                cache.prune(text_hash(chunk["text"]) for chunk in chunks)
+                cache.save()
+            except Exception as e:
+                logger.warning(f"Could not save embedding cache: {e}")
+
+    fingerprint = corpus_fingerprint(chunks, MODEL_KEY)
+    if env.EMBEDDING_STORE:
+        try:
+            # Only patch the store in place if it still holds exactly the live matrix
+            if open_embedding_store(env.EMBEDDING_STORE_PATH, fingerprint=corpus_fingerprint(document_chunks, MODEL_KEY)) is not None:
+                return update_embedding_store(env.EMBEDDING_STORE_PATH, removed_rows, added_matrix, fingerprint=fingerprint).matrix
+        except Exception as e:
+            logger.warning(f"Could not update embedding store in place: {e}")
+
+    keep = np.ones(len(chunk_embeddings), dtype=bool)
+    keep[np.asarray(removed_rows, dtype=np.int64)] = False
+    matrix = np.concatenate([np.asarray(chunk_embeddings)[keep], added_matrix])
+    if env.EMBEDDING_STORE:
+        try:
+            write_embedding_store(env.EMBEDDING_STORE_PATH, matrix, fingerprint=fingerprint)
+            store = open_embedding_store(env.EMBEDDING_STORE_PATH, fingerprint=fingerprint)
+            if store is not None:
+                return store.matrix
+        except Exception as e:
+            logger.warning(f"Could not write embedding store, keeping embeddings in process memory: {e}")
+    return matrix
+
+# --- reload_rules function ---
+def reload_rules(response_framework_path: Optional[str] = None) -> bool:
+    """
+    Re-parse the Response Framework and rebuild the rule automaton without a full
+    initialize_system (chunks, embeddings and the vector index are left alone).
+
+    Args:
+        response_framework_path (str): Framework file (defaults to the corpus' Response Framework)
+
+    Returns:
+        bool: True if the new rules were installed
+    """
+    # Serialized with initialize_system / refresh_corpus, so a rebuild that parsed the framework
+    # earlier can't swap its rules in over a newer reload (and corpus_version bumps don't race)
+    return _single_flight("Rule reload", lambda: _reload_rules(response_framework_path), share=False)
+
+def _reload_rules(response_framework_path: Optional[str]) -> bool:
+    global parsed_rules, corpus_version
+    path = response_framework_path or _framework_path(discover_documents(env.DATA_DIR))
+    logger.info(f"Reloading response framework rules from: {path}")
+    try:
+        new_rules = compile_rules(parse_rules(path))
+    except Exception as e:
+        logger.error(f"Failed to reload response framework rules, keeping previous rules: {e}", exc_info=True)
+        return False
+    parsed_rules = new_rules # Swap in one assignment so in-flight queries see old or new rules, never a mix
+    corpus_version += 1 # Cached responses were produced under the old rules
+    _response_cache.clear()
+    logger.info(f"Reloaded {len(parsed_rules)} rules (corpus version {corpus_version}).")
+    return True
+
+# --- _pipelined_build helper ---
+def _pipelined_build(corpus_entries: Dict[str, Dict[str, str]]) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray], Optional[EmbeddingCache]]:
+    """
+    Read, chunk and embed the corpus with overlapping stages (see run_build_pipeline).
+
+    Returns:
+        tuple: (chunks, embeddings or None, embedding cache used)
+    """
+    global last_build_stats
+    cache = EmbeddingCache(MODEL_KEY) if env.EMBEDDING_CACHE else None
+    embed_fn = lambda batch: get_embeddings(batch, cache=cache)
+    if cache is None and env.EMBEDDING_STORE and os.path.exists(env.EMBEDDING_STORE_PATH):
+        embed_fn = None # Without the cache, embedding up front could redo work the store already holds
+    elif env.EMBED_WORKERS > 1:
+        # Pipeline batches are far below SHADOW_EMBED_PARALLEL_MIN_CHUNKS; encode the whole corpus once in
+        # _load_or_embed_chunks instead, so a full rebuild is sharded over one pool of SHADOW_EMBED_WORKERS processes
+        embed_fn = None
+    chunks, embeddings, last_build_stats = run_build_pipeline(corpus_entries, embed_fn=embed_fn)
+    return chunks, embeddings, cache
+
+# --- get_build_stats function ---
+def get_build_stats() -> Dict[str, Any]:
+    """Per-stage items, busy seconds and throughput of the last pipelined build."""
+    return dict(last_build_stats)
+
+# --- _load_or_embed_chunks helper ---
+def _load_or_embed_chunks(chunks: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None,
+                          cache: Optional[EmbeddingCache] = None) -> Any:
+    """
+    Return the normalized float32 embedding matrix for chunks.
+
+    A store file matching the corpus is memory-mapped read-only (no model load,
+    shared page cache across processes). Otherwise chunks are embedded (reusing
+    the content-addressed cache), normalized and written to the store first.
+    embeddings already computed for chunks (e.g. by the pipelined build) skip the model.
+    """
+    fingerprint = corpus_fingerprint(chunks, MODEL_KEY)
+    if env.EMBEDDING_STORE:
+        store = open_embedding_store(env.EMBEDDING_STORE_PATH, fingerprint=fingerprint)
+        if store is not None and len(store) == len(chunks):
+            logger.info(f"Mapped {len(store)} embeddings from store {env.EMBEDDING_STORE_PATH} (read-only).")
+            return store.matrix
+
+    # Content-addressed cache: only new or edited chunks go through the model
+    if embeddings is None:
+        cache = cache or (EmbeddingCache(MODEL_KEY) if env.EMBEDDING_CACHE else None)
+        embeddings = get_embeddings(chunks, cache=cache)
+    if cache is not None:
+        try:
+            cache.prune(text_hash(chunk["text"]) for chunk in chunks)
+            cache.save()
+        except Exception as e:
+            logger.warning(f"Could not save embedding cache: {e}")
+
+    matrix = normalize_embeddings(embeddings)
+    if env.EMBEDDING_STORE and len(matrix) > 0:
+        try:
+            write_embedding_store(env.EMBEDDING_STORE_PATH, matrix, fingerprint=fingerprint)
+            store = open_embedding_store(env.EMBEDDING_STORE_PATH, fingerprint=fingerprint)
+            if store is not None:
+                return store.matrix
+        except Exception as e:
+            logger.warning(f"Could not write embedding store, keeping embeddings in process memory: {e}")
+    return matrix
+
 # --- check_time_based_rule function ---
 def check_time_based_rule(rule: Dict[str, Any]) -> bool:
     """Check if a time-based rule should trigger based on current UTC time."""
@@ -245,16 +542,14 @@ def handle_style_guide_response(query: str, rule: Dict[str, Any], accessible_chu
     final_explanation = explanation_prefix + explanation_detail + source_info
     return response, final_explanation
 
-# --- process_query function - The Core Logic ---
-def process_query(query: str, agent_level_str: str) -> Tuple[str, str, str]:
-    """Process a user query, applying framework rules and falling back to RAG."""
-    if not query.strip():
-        logger.warning("Received empty query.")
-        return "", "Please enter a valid query.", "error"
-
-    logger.info(f"Processing query: '{query[:50]}...' for agent level: {agent_level_str}")
+# --- map_agent_level function ---
+def map_agent_level(agent_level_str: str) -> int:
+    """Map a UI clearance label (e.g. 'Level 2 (Medium)') to its numeric level (default 1)."""
+    return LEVEL_MAPPING.get(agent_level_str, 1)
 
-    # --- Initialization Check ---
+# --- _ensure_ready helper ---
+def _ensure_ready() -> Optional[Tuple[str, str, str]]:
+    """Initialize lazily and check core data; returns an error result, or None when ready."""
     if not initialized:
         logger.info("System not initialized. Attempting initialization...")
         if not initialize_system():
@@ -265,128 +560,354 @@ def process_query(query: str, agent_level_str: str) -> Tuple[str, str, str]:
                 err_msg = f"System initialization failed recently. Please wait a few minutes and try again."
             return "", err_msg, "error"
 
-    # --- Agent Level Mapping ---
-    level_mapping = {"Level 1 (Low)": 1, "Level 2 (Medium)": 2, "Level 3 (High)": 3, "Level 4 (Very High)": 4, "Level 5 (Top Secret)": 5}
-    numeric_level = level_mapping.get(agent_level_str, 1)
-    logger.info(f"Mapped agent level string '{agent_level_str}' to numeric: {numeric_level}")
-
-    # --- Data Availability Check ---
-    if not document_chunks or not chunk_embeddings:
+    if not document_chunks or len(chunk_embeddings) == 0 or search_engine is None or chunk_metadata_index is None:
          logger.error("Core data (chunks/embeddings) missing after initialization check.")
          return "", "System data is unavailable. Please contact support.", "error"
     if not parsed_rules:
         logger.warning("Parsed rules are missing, proceeding with RAG only.")
+    return None
 
-    # --- Stage 1: Rule Matching ---
+# --- process_query function - The Core Logic ---
+def process_query(query: str, agent_level_str: str) -> Tuple[str, str, str]:
+    """Process a user query, applying framework rules and falling back to RAG."""
+    with metrics.span("total"):
+        result = _process_query(query, agent_level_str)
+    metrics.increment("queries", status=result[2])
+    return result
+
+def _process_query(query: str, agent_level_str: str) -> Tuple[str, str, str]:
+    if not query.strip():
+        logger.warning("Received empty query.")
+        return "", "Please enter a valid query.", "error"
+
+    logger.info("Processing query: '%.50s...' for agent level: %s", query, agent_level_str)
+
+    # --- Initialization & Data Availability Check ---
+    with metrics.span("init_check"):
+        not_ready = _ensure_ready()
+    if not_ready:
+        return not_ready
+
+    # --- Agent Level Mapping ---
+    numeric_level = map_agent_level(agent_level_str)
+    logger.info("Mapped agent level string '%s' to numeric: %d", agent_level_str, numeric_level)
+
+    # --- Response Cache ---
+    # Keyed by clearance level and corpus version, so levels never share entries and a rebuild invalidates everything
+    cache_key = (normalize_query(query), numeric_level, corpus_version)
+    cached_result = _response_cache.get(cache_key)
+    metrics.increment("response_cache", result="hit" if cached_result is not None else "miss")
+    if cached_result is not None:
+        logger.info("Serving cached response for level %d (corpus version %d).", numeric_level, corpus_version)
+        return cached_result
+
+    response, explanation, status, cacheable = _run_query_pipeline(query, numeric_level)
+    if cacheable and status != "error":
+        _response_cache.put(cache_key, (response, explanation, status))
+    return response, explanation, status
+
+# --- get_response_cache_stats function ---
+def get_response_cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters of the end-to-end response cache."""
+    return _response_cache.stats()
+
+# --- _apply_rule_stage function ---
+def _apply_rule_stage(query: str, numeric_level: int, rules: Any) -> Tuple[Optional[Tuple[str, str, str]], Optional[Dict[str, Any]], bool, bool]:
+    """
+    Stage 1: match the framework rules against a query.
+
+    Returns:
+        tuple: (direct_result, matched_rule, apply_style_guide, cacheable). direct_result is
+            the final (response, explanation, status) when a rule answers on its own,
+            otherwise None and the RAG stage must run. cacheable is False when the
+            result depends on the current time (time-based framework rules).
+    """
     matched_rule: Optional[Dict[str, Any]] = None
     apply_style_guide: bool = False
+    cacheable: bool = True # Time-dependent answers must never be served from the response cache
 
-    if parsed_rules: # Only attempt matching if rules were parsed
-        matched_rule = match_rule_to_query(parsed_rules, query, numeric_level)
+    if rules: # Only attempt matching if rules were parsed
+        with metrics.span("rule_match"):
+            matched_rule = match_rule_to_query(rules, query, numeric_level)
 
     if matched_rule:
         rule_number = matched_rule.get('rule_number', 'N/A')
+        metrics.increment("rule_matches", rule=rule_number)
         trigger_type = matched_rule.get('trigger_type', 'N/A')
         trigger_value = matched_rule.get('trigger_value', 'N/A')
         response_type = matched_rule.get('response_type', 'N/A')
         response_value = matched_rule.get('response_value', '')
 
-        logger.info(f"Framework rule {rule_number} matched: Type={trigger_type}, Trigger='{trigger_value}', RespType={response_type}")
+        logger.info("Framework rule %s matched: Type=%s, Trigger='%s', RespType=%s", rule_number, trigger_type, trigger_value, response_type)
 
         # Handle rules providing immediate, direct responses
         if response_type in ["direct_quote", "access_denied"]:
             explanation = f"Response generated based on framework rule {rule_number} ('{trigger_value}')."
-            logger.info(f"Returning direct response from rule {rule_number}.")
-            return response_value, explanation, "success"
+            logger.info("Returning direct response from rule %s.", rule_number)
+            return (response_value, explanation, "success"), matched_rule, False, cacheable
         elif response_type == "time_based":
+            cacheable = False # Outcome depends on the current UTC hour either way
             if check_time_based_rule(matched_rule):
-                logger.info(f"Time-based rule {rule_number} triggered by time condition.")
+                logger.info("Time-based rule %s triggered by time condition.", rule_number)
                 current_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
                 weather_response = f"As per time-sensitive protocols (Rule {rule_number}): Weather Report for {current_date}: Conditions variable. Proceed with caution."
                 explanation = f"Response generated based on time-sensitive framework rule {rule_number} for trigger '{trigger_value.split('|')[0]}'."
-                return weather_response, explanation, "success"
+                return (weather_response, explanation, "success"), matched_rule, False, cacheable
             else:
-                logger.info(f"Time-based rule {rule_number} matched trigger, but time condition not met. Proceeding to RAG.")
+                logger.info("Time-based rule %s matched trigger, but time condition not met. Proceeding to RAG.", rule_number)
                 matched_rule = None # Ignore rule, proceed as if no match
         elif response_type == "style_guide":
-            logger.info(f"Style guide rule {rule_number} matched. Will apply style after RAG.")
+            logger.info("Style guide rule %s matched. Will apply style after RAG.", rule_number)
             apply_style_guide = True # Flag to apply style later
         else:
-            logger.warning(f"Rule {rule_number} matched but has unhandled response type: '{response_type}'. Proceeding to RAG.")
+            logger.warning("Rule %s matched but has unhandled response type: '%s'. Proceeding to RAG.", rule_number, response_type)
             matched_rule = None # Ignore rule
 
-    # --- Stage 2: RAG Pipeline (Vector Search, Source Filter, Security Filter) ---
+    return None, matched_rule, apply_style_guide, cacheable
+
+# --- _build_rag_response function ---
+def _build_rag_response(query: str, numeric_level: int, matched_rule: Optional[Dict[str, Any]], apply_style_guide: bool,
+                        accessible_chunks: List[Dict[str, Any]], access_denied: bool) -> Tuple[str, str, str]:
+    """
+    Stage 3: turn retrieved chunks into the final (response, explanation, status).
+
+    Args:
+        accessible_chunks (list): Chunks returned by the filtered search
+        access_denied (bool): Relevant chunks exist but only above the agent's clearance
+    """
+    if not accessible_chunks:
+        if access_denied:
+            logger.warning("Access Denied: Relevant content chunks required higher clearance.")
+            reason_explanation = "Access Denied: Required clearance level not met for retrieved information."
+            status = "access_denied"
+        else:
+            logger.warning("No relevant chunks found originating from 'Secret Info Manual'.")
+            reason_explanation = "No specific information found in the Secret Information Manual matching your query."
+            status = "no_results"
+        if apply_style_guide and matched_rule:
+            no_access_response, no_access_explanation = handle_style_guide_response(query, matched_rule, [])
+            return no_access_response, no_access_explanation, "success"
+        else:
+            return "", reason_explanation, status
+
+    # Security Filtering (defence in depth; the search already applied the clearance predicate)
+    with metrics.span("clearance_filter"):
+        accessible_chunks, _ = filter_by_clearance(accessible_chunks, numeric_level)
+
+    if apply_style_guide and matched_rule:
+        logger.info("Applying style guide from rule %s using %d chunks.", matched_rule.get('rule_number'), len(accessible_chunks))
+        response, explanation = handle_style_guide_response(query, matched_rule, accessible_chunks)
+        return response, explanation, "success"
+    else:
+        logger.info("Generating standard response using %d accessible chunks.", len(accessible_chunks))
+        response, explanation = generate_standard_response(query, accessible_chunks)
+        # Check if the standard response indicates low relevance and potentially adjust status
+        if response.startswith("Based on the available information"):
+             logger.warning("Standard response generator indicated low relevance/threshold not met.")
+             # Consider if returning 'no_results' status is more appropriate here
+             # return response, explanation, "no_results" # Optional change
+        return response, explanation, "success"
+
+# --- _run_query_pipeline function ---
+def _run_query_pipeline(query: str, numeric_level: int) -> Tuple[str, str, str, bool]:
+    """
+    Run rule matching and the RAG pipeline for an already validated query.
+
+    Returns:
+        tuple: (response, explanation, status, cacheable)
+    """
+    # --- Stage 1: Rule Matching ---
+    direct_result, matched_rule, apply_style_guide, cacheable = _apply_rule_stage(query, numeric_level, parsed_rules)
+    if direct_result:
+        return (*direct_result, cacheable)
+
+    # --- Stage 2: RAG Pipeline (Vector Search with Doc-Type & Security Predicates) ---
     # This stage runs if no direct response was returned by a rule above.
     logger.info("Proceeding to RAG pipeline...")
+    chunks, engine, metadata_index, bm25_index = document_chunks, search_engine, chunk_metadata_index, lexical_index # One consistent corpus for this query
     try:
-        # Step 2a: Initial Search
-        logger.debug("Performing initial vector search across all documents...")
-        relevant_chunks = search_similar_chunks(query, document_chunks, chunk_embeddings)
-        if not relevant_chunks:
-            logger.info("Initial vector search returned no relevant chunks.")
-            if apply_style_guide and matched_rule:
-                 no_rag_response, no_rag_explanation = handle_style_guide_response(query, matched_rule, [])
-                 return no_rag_response, no_rag_explanation, "success"
-            else:
-                 return "", "No information found matching your query.", "no_results" # Clearer explanation
-
-        # Step 2b: Source Filtering (Prioritize Secret Info Manual)
-        logger.debug(f"Filtering {len(relevant_chunks)} retrieved chunks for 'Secret Info Manual' source...")
-        content_focused_chunks = [
-            chunk for chunk in relevant_chunks
-            if chunk.get('metadata', {}).get('source') == 'Secret Info Manual'
-        ]
-        logger.info(f"{len(content_focused_chunks)} content chunks relevant after source filtering.")
-        if not content_focused_chunks:
-             logger.warning("No relevant chunks found originating from 'Secret Info Manual'.")
-             rag_explanation = "No specific information found in the Secret Information Manual matching your query."
-             if apply_style_guide and matched_rule:
-                  no_content_response, no_content_explanation = handle_style_guide_response(query, matched_rule, [])
-                  return no_content_response, no_content_explanation, "success"
-             return "", rag_explanation, "no_results"
-
-        # Step 2c: Security Filtering
-        logger.debug(f"Filtering {len(content_focused_chunks)} content chunks by clearance level {numeric_level}...")
-        accessible_chunks, is_access_denied = filter_by_clearance(content_focused_chunks, numeric_level)
-        logger.info(f"{len(accessible_chunks)} accessible content chunks after security filtering. Access denied flag: {is_access_denied}")
+        # Step 2a: Search only eligible chunks. Doc-type and clearance predicates are applied as bitmaps
+        # before top-k selection, so framework or over-clearance chunks can't take up result slots.
+        logger.debug("Performing vector search over %s chunks at or below level %d...", CONTENT_DOC_TYPES, numeric_level)
+        accessible_chunks = search_similar_chunks(
+            query, chunks, engine,
+            doc_types=CONTENT_DOC_TYPES, max_security_level=numeric_level, metadata_index=metadata_index,
+            lexical_index=bm25_index
+        )
+        logger.info("%d accessible content chunks found by filtered search.", len(accessible_chunks))
+
+        # Step 2b: Tell "access denied" apart from "nothing relevant" by probing without the clearance predicate
+        access_denied = False
         if not accessible_chunks:
-            reason_explanation = ""
-            status = "no_results"
-            if is_access_denied:
-                logger.warning("Access Denied: Relevant content chunks required higher clearance.")
-                reason_explanation = "Access Denied: Required clearance level not met for retrieved information."
-                status = "access_denied"
-            else:
-                logger.warning("No accessible content chunks remaining after security filtering (and not denied).")
-                reason_explanation = "No information accessible at your clearance level was found for this query."
-            if apply_style_guide and matched_rule:
-                no_access_response, no_access_explanation = handle_style_guide_response(query, matched_rule, [])
-                return no_access_response, no_access_explanation, "success"
-            else:
-                return "", reason_explanation, status
+            with metrics.span("access_probe"):
+                access_denied = bool(search_similar_chunks(
+                    query, chunks, engine,
+                    doc_types=CONTENT_DOC_TYPES, metadata_index=metadata_index, lexical_index=bm25_index
+                ))
 
         # --- Stage 3: Generate Final Response using RAG Results ---
-        if apply_style_guide and matched_rule:
-            logger.info(f"Applying style guide from rule {matched_rule.get('rule_number')} using {len(accessible_chunks)} chunks.")
-            response, explanation = handle_style_guide_response(query, matched_rule, accessible_chunks)
-            return response, explanation, "success"
-        else:
-            logger.info(f"Generating standard response using {len(accessible_chunks)} accessible chunks.")
-            response, explanation = generate_standard_response(query, accessible_chunks)
-            # Check if the standard response indicates low relevance and potentially adjust status
-            if response.startswith("Based on the available information"):
-                 logger.warning("Standard response generator indicated low relevance/threshold not met.")
-                 # Consider if returning 'no_results' status is more appropriate here
-                 # return response, explanation, "no_results" # Optional change
-            return response, explanation, "success"
+        with metrics.span("response_generation"):
+            response, explanation, status = _build_rag_response(query, numeric_level, matched_rule, apply_style_guide,
+                                                                accessible_chunks, access_denied)
+        return response, explanation, status, cacheable
 
     except Exception as e:
         logger.exception(f"Error during RAG pipeline execution: {e}")
-        return "", f"An error occurred during information retrieval.", "error" # Keep UI error generic
-
-    # --- Fallback catch --- This should only be reached if there's a logic flaw above
-    logger.error("Reached end of process_query function unexpectedly.")
-    return "", "An unexpected internal error occurred.", "error"
+        return "", f"An error occurred during information retrieval.", "error", cacheable # Keep UI error generic
+
+# ======================================================================
+# BATCH QUERY API (offline replay / evaluation runs)
+# ======================================================================
+# Long-lived pool for large batches (spawned once, reused by later batches; see _batch_executor)
+_batch_pool: Optional[ProcessPoolExecutor] = None
+_batch_pool_workers: int = 0
+_batch_pool_lock = threading.Lock()
+
+def _batch_executor(workers: int) -> ProcessPoolExecutor:
+    """The shared batch worker pool, restarted only when a different size is requested."""
+    global _batch_pool, _batch_pool_workers
+    with _batch_pool_lock:
+        if _batch_pool is None or _batch_pool_workers != workers:
+            if _batch_pool is not None:
+                _batch_pool.shutdown(wait=False) # Work already submitted to the old pool still completes
+            else:
+                atexit.register(_shutdown_batch_pool)
+            # spawn: forking after the model's thread pools have started can deadlock the children
+            _batch_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _batch_pool_workers = workers
+        return _batch_pool
+
+def _shutdown_batch_pool() -> None:
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is not None:
+            _batch_pool.shutdown()
+            _batch_pool = None
+
+def _batch_slice(fn, rows: List[Tuple[Any, ...]]) -> Tuple[List[Any], Any]:
+    """Run fn over one slice of a batch in a pool worker; also returns the metrics it recorded there."""
+    results = [fn(*row) for row in rows]
+    return results, metrics.drain()
+
+def _batch_map(executor: Optional[ProcessPoolExecutor], workers: int, fn, *iterables) -> List[Any]:
+    """map() over the process pool when there is one, in-process otherwise."""
+    if executor is None:
+        return list(map(fn, *iterables))
+    rows = list(zip(*iterables))
+    size = max(1, -(-len(rows) // (workers * 4))) # Few, large tasks keep pickling overhead down
+    slices = [rows[start:start + size] for start in range(0, len(rows), size)]
+    results = []
+    for part, worker_metrics in executor.map(_batch_slice, [fn] * len(slices), slices):
+        results.extend(part)
+        metrics.merge(worker_metrics) # Stage spans recorded in the workers land in this process's registry
+    return results
+
+def process_queries(queries: List[str], agent_levels: List[str], workers: Optional[int] = None,
+                    batch_size: Optional[int] = None) -> List[Tuple[str, str, str]]:
+    """
+    Process many queries at once; results match process_query one-for-one.
+
+    Query embeddings are computed in large model batches and scored with one
+    matrix-matrix product against the chunk matrix. Rule matching and response
+    formatting of large batches fan out over a long-lived process pool.
+
+    Args:
+        queries (list): Query strings
+        agent_levels (list): Clearance labels, one per query (e.g. 'Level 2 (Medium)')
+        workers (int): Process pool size for rule matching/formatting (defaults to SHADOW_BATCH_WORKERS).
+            Batches run in-process unless workers > 1 and at least SHADOW_BATCH_PARALLEL_MIN
+            queries miss the cache; both stages take microseconds per query, so smaller
+            batches would spend more on pickling than they save.
+        batch_size (int): Model batch size for query encoding (defaults to SHADOW_QUERY_BATCH_SIZE)
+
+    Returns:
+        list: (response, explanation, status) per query
+    """
+    if len(queries) != len(agent_levels):
+        raise ValueError(f"Got {len(queries)} queries but {len(agent_levels)} agent levels.")
+    if not queries:
+        return []
+    with metrics.span("batch_total"):
+        results = _process_queries(queries, agent_levels, workers, batch_size)
+    for _, _, status in results:
+        metrics.increment("queries", status=status)
+    return results
+
+def _process_queries(queries: List[str], agent_levels: List[str], workers: Optional[int],
+                     batch_size: Optional[int]) -> List[Tuple[str, str, str]]:
+
+    not_ready = _ensure_ready()
+    if not_ready:
+        return [not_ready] * len(queries)
+
+    results: List[Optional[Tuple[str, str, str]]] = [None] * len(queries)
+    numeric_levels = [map_agent_level(level) for level in agent_levels]
+    cache_keys = [(normalize_query(query), level, corpus_version) for query, level in zip(queries, numeric_levels)]
+    pending = []
+    for i, query in enumerate(queries):
+        if not query.strip():
+            results[i] = ("", "Please enter a valid query.", "error")
+        else:
+            results[i] = _response_cache.get(cache_keys[i])
+            if results[i] is None:
+                pending.append(i)
+    logger.info("Batch of %d queries: %d answered from cache/validation, %d to process.", len(queries), len(queries) - len(pending), len(pending))
+    if not pending:
+        return results
+
+    workers = env.BATCH_WORKERS if workers is None else workers
+    executor = _batch_executor(workers) if workers > 1 and len(pending) >= env.BATCH_PARALLEL_MIN else None
+    rules = parsed_rules # One rule set for the whole batch, even if reload_rules swaps it meanwhile
+    cacheable_flags: Dict[int, bool] = {}
+    # --- Stage 1: Rule Matching (fan-out) ---
+    stage_one = _batch_map(executor, workers, functools.partial(_apply_rule_stage, rules=rules),
+                           [queries[i] for i in pending], [numeric_levels[i] for i in pending])
+    rag_jobs = [] # (query index, matched_rule, apply_style_guide)
+    for i, (direct_result, matched_rule, apply_style_guide, cacheable) in zip(pending, stage_one):
+        cacheable_flags[i] = cacheable
+        if direct_result:
+            results[i] = direct_result
+        else:
+            rag_jobs.append((i, matched_rule, apply_style_guide))
+
+    # --- Stage 2: Batched Encoding & Search ---
+    if rag_jobs:
+        rag_ids = [job[0] for job in rag_jobs]
+        try:
+            query_matrix = get_query_embeddings([queries[i] for i in rag_ids], batch_size=batch_size or env.QUERY_BATCH_SIZE)
+            chunks, engine, metadata_index, bm25_index = document_chunks, search_engine, chunk_metadata_index, lexical_index
+            masks = [metadata_index.mask(doc_types=CONTENT_DOC_TYPES, max_security_level=numeric_levels[i]) for i in rag_ids]
+            found = search_similar_chunks_batch(query_matrix, chunks, engine, masks=masks,
+                                                queries=[queries[i] for i in rag_ids], lexical_index=bm25_index)
+
+            # Access-denied probe (no clearance predicate) only for queries that found nothing
+            empty_rows = [row for row, chunks in enumerate(found) if not chunks]
+            denied_rows = set()
+            if empty_rows:
+                content_mask = metadata_index.mask(doc_types=CONTENT_DOC_TYPES)
+                probes = search_similar_chunks_batch(query_matrix[empty_rows], chunks, engine,
+                                                     masks=[content_mask] * len(empty_rows),
+                                                     queries=[queries[rag_ids[row]] for row in empty_rows], lexical_index=bm25_index)
+                denied_rows = {row for row, probe in zip(empty_rows, probes) if probe}
+
+            # --- Stage 3: Response Formatting (fan-out) ---
+            formatted = _batch_map(
+                executor, workers, _build_rag_response,
+                [queries[i] for i in rag_ids], [numeric_levels[i] for i in rag_ids],
+                [job[1] for job in rag_jobs], [job[2] for job in rag_jobs],
+                found, [row in denied_rows for row in range(len(rag_ids))]
+            )
+            for i, result in zip(rag_ids, formatted):
+                results[i] = result
+        except Exception as e:
+            logger.exception(f"Error during batched RAG pipeline execution: {e}")
+            for i in rag_ids:
+                results[i] = ("", "An error occurred during information retrieval.", "error")
+
+    for i in pending:
+        if cacheable_flags.get(i) and results[i][2] != "error":
+            _response_cache.put(cache_keys[i], results[i])
+    return results
 
 
 # --- Example __main__ block for testing ---
@@ -0,0 +1,114 @@
+# --- START OF FILE src/app/batch_cli.py ---
+# Offline replay of agent queries through the batch API.
+#
+#   python -m src.app.batch_cli queries.jsonl results.jsonl --workers 8
+#
+# Input: one JSON object per line with "query" and "level" (a UI label such as
+# "Level 2 (Medium)" or a number 1-5); any other fields (e.g. "id") are passed through.
+# Output: the input object plus "response", "explanation" and "status".
+
+import sys
+import json
+import time
+import argparse
+import logging
+
+from src.setup import environment as env
+from src.setup.logging_config import configure_logging
+from src.app.backend import process_queries, initialize_system, LEVEL_MAPPING
+
+logger = logging.getLogger(__name__)
+
+LEVEL_NAMES = {number: name for name, number in LEVEL_MAPPING.items()}
+
+def _level_label(value):
+    """Accept either the UI label or a bare level number."""
+    if isinstance(value, int) or (isinstance(value, str) and value.strip().isdigit()):
+        return LEVEL_NAMES.get(int(value), "Level 1 (Low)")
+    return value or "Level 1 (Low)"
+
+def _iter_records(stream):
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.error(f"Skipping malformed JSON on line {line_number}: {e}")
+            continue
+        if not isinstance(record, dict) or "query" not in record:
+            logger.error(f"Skipping line {line_number}: expected an object with a 'query' field.")
+            continue
+        yield record
+
+def run_batch(input_stream, output_stream, chunk_size=10000, workers=None, batch_size=None):
+    """
+    Stream JSONL queries through process_queries, chunk_size records at a time.
+
+    Returns:
+        dict: Counts per status plus total and elapsed seconds
+    """
+    summary = {"total": 0}
+    started = time.perf_counter()
+    records = []
+
+    def flush():
+        if not records:
+            return
+        results = process_queries(
+            [str(r["query"]) for r in records],
+            [_level_label(r.get("level", r.get("agent_level"))) for r in records],
+            workers=workers, batch_size=batch_size,
+        )
+        for record, (response, explanation, status) in zip(records, results):
+            record.update(response=response, explanation=explanation, status=status)
+            output_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            summary[status] = summary.get(status, 0) + 1
+        summary["total"] += len(records)
+        output_stream.flush()
+        logger.info(f"Processed {summary['total']} queries so far.")
+        records.clear()
+
+    for record in _iter_records(input_stream):
+        records.append(record)
+        if len(records) >= chunk_size:
+            flush()
+    flush()
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay agent queries (JSONL) through Project SHADOW in batch.")
+    parser.add_argument("input", help="Input JSONL file ('-' for stdin)")
+    parser.add_argument("output", help="Output JSONL file ('-' for stdout)")
+    parser.add_argument("--workers", type=int, default=env.BATCH_WORKERS, help="Process pool size for rule matching/formatting of large batches (1 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=env.QUERY_BATCH_SIZE, help="Model batch size for query encoding")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Queries held in memory per batch")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level (default WARNING)")
+    args = parser.parse_args(argv)
+
+    configure_logging(level=args.log_level)
+    if not initialize_system():
+        print("System initialization failed. Check logs or document files.", file=sys.stderr)
+        return 1
+
+    input_stream = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        summary = run_batch(input_stream, output_stream, chunk_size=args.chunk_size,
+                            workers=args.workers, batch_size=args.batch_size)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE src/app/batch_cli.py ---
@@ -0,0 +1,173 @@
+# --- START OF FILE src/app/client.py ---
+# Thin client for the headless query server (src/app/server.py).
+# The Streamlit app and other tools call process_query() here instead of importing the backend.
+
+import json
+import socket
+import logging
+from typing import Any, Dict, Tuple
+
+from src.setup import environment as env
+from src.app import warmup
+
+logger = logging.getLogger(__name__)
+
+class ServerUnavailableError(ConnectionError):
+    """Raised when the query server cannot be reached."""
+    pass
+
+class ShadowClient:
+    """
+    Blocking JSON-lines client; opens one short-lived connection per request.
+
+    Args:
+        host (str): Server host (defaults to SHADOW_SERVER_HOST)
+        port (int): Server port (defaults to SHADOW_SERVER_PORT)
+        socket_path (str): Unix socket path; used instead of host/port when set
+        timeout (float): Seconds to wait for a reply (defaults to SHADOW_SERVER_TIMEOUT)
+    """
+
+    def __init__(self, host=None, port=None, socket_path=None, timeout=None):
+        self.host = host or env.SERVER_HOST
+        self.port = port or env.SERVER_PORT
+        self.socket_path = socket_path if socket_path is not None else env.SERVER_SOCKET
+        self.timeout = timeout or env.SERVER_TIMEOUT
+
+    def _connect(self):
+        try:
+            if self.socket_path:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                return sock
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise ServerUnavailableError(f"SHADOW query server not reachable: {e}") from e
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one request object and return the decoded reply (raises RuntimeError if not ok)."""
+        with self._connect() as sock:
+            sock.sendall(json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as reader:
+                line = reader.readline()
+        if not line:
+            raise ServerUnavailableError("SHADOW query server closed the connection without replying.")
+        reply = json.loads(line)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error", "Query server returned an error."))
+        return reply
+
+    def process_query(self, query: str, agent_level_str: str) -> Tuple[str, str, str]:
+        reply = self.request({"op": "query", "query": query, "level": agent_level_str})
+        return reply["response"], reply["explanation"], reply["status"]
+
+    def health(self) -> Dict[str, Any]:
+        return self.request({"op": "health"})
+
+    def metrics(self) -> Dict[str, Any]:
+        """Server-side stage latencies and counters: {"prometheus": text, "snapshot": dict}."""
+        return self.request({"op": "metrics"})
+
+class QueryBackend:
+    """
+    Whatever answers queries for this process: the query server when one is reachable, otherwise
+    the in-process backend (warmed up once; its initialization is single-flight). One instance is
+    meant to be shared process-wide, e.g. by every Streamlit session through st.cache_resource.
+
+    Args:
+        client (ShadowClient): Server client (defaults to one built from the SHADOW_SERVER_* settings)
+    """
+
+    def __init__(self, client=None):
+        self.client = client or ShadowClient()
+        self._local = None # src.app.backend once the in-process fallback has been used
+
+    def _health(self) -> Any:
+        """The server's health reply, or None when no server is reachable."""
+        try:
+            return self.client.health()
+        except ServerUnavailableError:
+            pass
+        except (RuntimeError, ValueError, OSError) as e:
+            logger.warning(f"Query server health check failed: {e}")
+        return None
+
+    def _local_backend(self):
+        """
+        Import the in-process backend, joining the background warm-up (when SHADOW_WARMUP is on)
+        rather than initializing a second time; otherwise the first query initializes it lazily.
+        """
+        if self._local is None:
+            if env.WARMUP:
+                warmup.start_warmup()
+                warmup.wait_until_ready()
+            from src.app import backend
+            self._local = backend
+        return self._local
+
+    def start(self) -> str:
+        """
+        Start whatever will answer queries: "server" if a query server answers (or fallback is off),
+        otherwise "local" after starting the in-process warm-up when SHADOW_WARMUP is on.
+        """
+        if self._health() is not None or not env.SERVER_FALLBACK:
+            return "server"
+        if env.WARMUP:
+            warmup.start_warmup()
+        return "local"
+
+    def process_query(self, query: str, agent_level_str: str) -> Tuple[str, str, str]:
+        """
+        Drop-in replacement for backend.process_query that goes through the query server.
+
+        When no server answers and SHADOW_SERVER_FALLBACK is on, the backend is imported
+        and run in this process instead (the pre-server behaviour).
+        """
+        try:
+            return self.client.process_query(query, agent_level_str)
+        except ServerUnavailableError as e:
+            if not env.SERVER_FALLBACK:
+                logger.error(str(e))
+                return "", "The query service is unavailable. Please try again later.", "error"
+            logger.warning(f"{e}. Falling back to the in-process backend.")
+        except (RuntimeError, ValueError, OSError) as e:
+            logger.error(f"Query server request failed: {e}")
+            return "", "An error occurred during processing. Please try again.", "error"
+        return self._local_backend().process_query(query, agent_level_str) # Heavy import, only on fallback
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Readiness of whatever will answer the next query: the query server if one is reachable,
+        otherwise the in-process backend (whose warm-up this starts when SHADOW_WARMUP is on).
+
+        Returns:
+            dict: {"state": "cold" | "warming" | "ready" | "failed", "stage", "elapsed_seconds", "via": "server" | "local", ...}
+        """
+        health = self._health()
+        if health is not None:
+            readiness = health.get("readiness") or {"state": "ready" if health.get("initialized") else "warming"}
+            return {**readiness, "via": "server"}
+        if not env.SERVER_FALLBACK:
+            return {"state": "failed", "error": "The query service is unavailable.", "via": "server"}
+        if env.WARMUP:
+            warmup.start_warmup()
+        return {**warmup.get_readiness(), "via": "local"}
+
+_default_backend = None
+
+def get_default_backend() -> QueryBackend:
+    """The process-wide QueryBackend used by the module-level helpers below."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = QueryBackend()
+    return _default_backend
+
+def process_query(query: str, agent_level_str: str) -> Tuple[str, str, str]:
+    """Module-level form of QueryBackend.process_query on the default backend."""
+    return get_default_backend().process_query(query, agent_level_str)
+
+def get_readiness() -> Dict[str, Any]:
+    """Module-level form of QueryBackend.readiness on the default backend."""
+    return get_default_backend().readiness()
+
+# --- END OF FILE src/app/client.py ---
@@ -0,0 +1,191 @@
+# --- START OF FILE src/app/server.py ---
+# Headless query service: one warm, initialized backend serving many clients concurrently.
+#
+#   python -m src.app.server                      # 127.0.0.1:8765 (SHADOW_SERVER_HOST/PORT)
+#   python -m src.app.server --socket /tmp/shadow.sock
+#
+# Protocol: newline-delimited JSON over TCP (localhost) or a Unix socket. Each request line is
+# an object with an "op" field; each gets exactly one response line with "ok" true/false.
+#   {"op": "query", "query": "...", "level": "Level 2 (Medium)"} -> {"ok": true, "response", "explanation", "status"}
+#   {"op": "batch", "queries": [...], "levels": [...]}           -> {"ok": true, "results": [[response, explanation, status], ...]}
+#   {"op": "health"} / {"op": "stats"} / {"op": "reload_rules"} / {"op": "refresh"} (re-ingest changed documents)
+#   {"op": "metrics"} -> {"ok": true, "prometheus": "<text exposition>", "snapshot": {...}} (see src/setup/metrics.py)
+
+import os
+import sys
+import json
+import signal
+import asyncio
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from src.setup import environment as env
+from src.setup.logging_config import configure_logging
+from src.setup import metrics
+from src.app import backend, warmup
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+
+# ======================================================================
+# REQUEST HANDLERS (run on the worker pool, never on the event loop)
+# ======================================================================
+def _op_query(request):
+    response, explanation, status = backend.process_query(str(request.get("query", "")), request.get("level") or "Level 1 (Low)")
+    return {"response": response, "explanation": explanation, "status": status}
+
+def _op_batch(request):
+    queries = [str(q) for q in request.get("queries", [])]
+    levels = request.get("levels") or ["Level 1 (Low)"] * len(queries)
+    # Already on a server worker thread; keep the batch in this process
+    return {"results": [list(r) for r in backend.process_queries(queries, levels, workers=0)]}
+
+def _op_health(request):
+    return {"initialized": backend.initialized, "corpus_version": backend.corpus_version, "chunks": len(backend.document_chunks),
+            "readiness": warmup.get_readiness()}
+
+def _op_stats(request):
+    from src.retrieval.embedding_engine import get_query_cache_stats
+    return {"query_cache": get_query_cache_stats(), "response_cache": backend.get_response_cache_stats(),
+            "build": backend.get_build_stats()}
+
+def _op_metrics(request):
+    return {"prometheus": metrics.render_prometheus(), "snapshot": metrics.snapshot()}
+
+def _op_reload_rules(request):
+    return {"reloaded": backend.reload_rules(request.get("path"))}
+
+def _op_refresh(request):
+    return {"refreshed": backend.refresh_corpus(), "corpus_version": backend.corpus_version}
+
+OPERATIONS = {
+    "query": _op_query,
+    "batch": _op_batch,
+    "health": _op_health,
+    "stats": _op_stats,
+    "metrics": _op_metrics,
+    "reload_rules": _op_reload_rules,
+    "refresh": _op_refresh,
+}
+
+# ======================================================================
+# SERVER
+# ======================================================================
+class QueryServer:
+    """
+    asyncio front end over the backend. The event loop only parses and writes JSON;
+    all backend work is offloaded to a thread pool so slow queries don't block others.
+
+    Args:
+        workers (int): Size of the worker thread pool
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or env.SERVER_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shadow-worker")
+        self._server = None
+
+    async def _dispatch(self, request):
+        op = request.get("op", "query") if isinstance(request, dict) else None
+        handler = OPERATIONS.get(op)
+        if handler is None:
+            return {"ok": False, "error": f"Unknown op: {op!r}"}
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, handler, request)
+        except Exception as e:
+            logger.exception(f"Error handling '{op}' request: {e}")
+            return {"ok": False, "error": "Internal server error."}
+        result["ok"] = True
+        return result
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername") or "unix-socket"
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    writer.write(json.dumps({"ok": False, "error": "Request too large."}).encode("utf-8") + b"\n")
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError:
+                    reply = {"ok": False, "error": "Malformed JSON request."}
+                else:
+                    reply = await self._dispatch(request)
+                writer.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            logger.debug(f"Client {peer} disconnected.")
+        finally:
+            writer.close()
+
+    async def start(self, host=None, port=None, socket_path=None):
+        """Initialize the backend and load the embedding model once, then start listening."""
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(self.executor, warmup.run_warmup):
+            raise RuntimeError("Backend initialization failed; refusing to serve.")
+        metrics.start_file_exporter() # No-op unless SHADOW_METRICS_FILE is set
+
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path) # Stale socket from a previous run
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=socket_path, limit=MAX_REQUEST_BYTES)
+            os.chmod(socket_path, 0o660)
+            logger.info(f"SHADOW query server listening on unix socket {socket_path} ({self.workers} workers)")
+        else:
+            host, port = host or env.SERVER_HOST, port or env.SERVER_PORT
+            self._server = await asyncio.start_server(self._handle_connection, host=host, port=port, limit=MAX_REQUEST_BYTES)
+            logger.info(f"SHADOW query server listening on {host}:{port} ({self.workers} workers)")
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+async def serve(host=None, port=None, socket_path=None, workers=None):
+    server = QueryServer(workers=workers)
+    await server.start(host=host, port=port, socket_path=socket_path)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, server.close)
+        except (NotImplementedError, RuntimeError, ValueError): # Windows, or not running in the main thread
+            pass
+    try:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Project SHADOW headless query server.")
+    parser.add_argument("--host", default=env.SERVER_HOST, help="Bind address (keep it on localhost)")
+    parser.add_argument("--port", type=int, default=env.SERVER_PORT)
+    parser.add_argument("--socket", default=env.SERVER_SOCKET or None, help="Serve on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=env.SERVER_WORKERS, help="Worker threads for backend calls")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    configure_logging(level=args.log_level)
+    try:
+        asyncio.run(serve(host=args.host, port=args.port, socket_path=args.socket, workers=args.workers))
+    except RuntimeError as e:
+        logger.error(str(e))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE src/app/server.py ---
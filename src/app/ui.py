@@ -55,4 +55,30 @@ def create_ui():
             key="submit_query" # Add a key for better state management
             )
 
-    return query, agent_level, submit_button
\ No newline at end of file
+    return query, agent_level, submit_button
+
+
+def show_readiness(readiness):
+    """
+    Shows the backend readiness (model + corpus warm-up) in the sidebar.
+
+    Args:
+        readiness (dict): State from client.get_readiness()
+    """
+    state = readiness.get("state")
+    with st.sidebar:
+        st.markdown("---")
+        st.markdown("### System Status")
+        if state == "ready":
+            st.success("Ready")
+        elif state == "failed":
+            st.error(f"Initialization failed: {readiness.get('error') or 'see logs'}")
+        elif state == "cold":
+            # Nothing is warming (SHADOW_WARMUP off): the first query loads the model and corpus
+            st.info("Idle. The model and corpus load on the first query, which will take longer.")
+        else:
+            stage = readiness.get("stage") or "starting"
+            elapsed = readiness.get("elapsed_seconds")
+            st.info(f"Warming up ({stage}{f', {elapsed}s' if elapsed is not None else ''}). "
+                    "Queries submitted now will wait for it to finish.")
+            st.button("Refresh status", key="refresh_status") # Any rerun re-reads the state
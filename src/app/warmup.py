@@ -0,0 +1,116 @@
+# --- START OF FILE src/app/warmup.py ---
+# Background warm-up: import the backend, load the embedding model and map/build the corpus off
+# the critical path, and expose a readiness state the UI and the server's health op can report.
+# This module only uses the standard library so importing it never delays the first paint.
+
+import sys
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# States: cold (nothing started) -> warming -> ready | failed
+_state = {"state": "cold", "stage": None, "started_at": None, "finished_at": None, "error": None,
+          "model_ready": False, "corpus_ready": False}
+_lock = threading.Lock()
+_done = threading.Event()
+_thread = None
+RETRY_AFTER_SECONDS = 300 # A failed warm-up may be restarted after this long (matches the backend's init cooldown)
+
+def _update(**fields):
+    with _lock:
+        _state.update(fields)
+
+def _load_model():
+    from src.retrieval.embedding_engine import get_model
+    get_model().encode(["warm-up"], show_progress_bar=False) # First call initializes kernels / the ONNX session
+    _update(model_ready=True)
+
+def _load_corpus():
+    from src.app import backend
+    if not backend.initialize_system():
+        raise RuntimeError("Backend initialization failed.")
+    _update(corpus_ready=True)
+
+def run_warmup():
+    """
+    Load the model and the corpus concurrently in the calling thread and record readiness.
+
+    The model load (mostly import + weights) and the corpus load (store mapping, index,
+    or a full build) don't depend on each other, so the model loads on a helper thread.
+
+    Returns:
+        bool: True if both finished successfully
+    """
+    _update(state="warming", stage="importing backend", started_at=_state["started_at"] or time.time(), error=None)
+    errors = []
+    try:
+        import src.app.backend # noqa: F401 (module import is the first cost; keep it in the stage timing)
+
+        def model_worker():
+            try:
+                _load_model()
+            except Exception as e:
+                logger.exception(f"Embedding model warm-up failed: {e}")
+                errors.append(e)
+
+        model_thread = threading.Thread(target=model_worker, name="shadow-warmup-model", daemon=True)
+        model_thread.start()
+        _update(stage="loading model and corpus")
+        _load_corpus()
+        _update(stage="loading model")
+        model_thread.join()
+        if errors:
+            raise errors[0]
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        _update(state="failed", stage=None, error=str(e), finished_at=time.time())
+        _done.set()
+        return False
+
+    _update(state="ready", stage=None, finished_at=time.time())
+    logger.info(f"Warm-up complete in {_state['finished_at'] - _state['started_at']:.1f}s.")
+    _done.set()
+    return True
+
+def start_warmup():
+    """
+    Start run_warmup on a daemon thread (once per process; later calls are no-ops), or restart
+    it when the previous warm-up failed at least RETRY_AFTER_SECONDS ago.
+    """
+    global _thread
+    with _lock:
+        if _thread is not None:
+            if _state["state"] != "failed" or time.time() - (_state["finished_at"] or 0) < RETRY_AFTER_SECONDS:
+                return
+            logger.info("Restarting the warm-up after the earlier failure.")
+        _done.clear()
+        _state.update(state="warming", stage="starting", started_at=time.time(), finished_at=None, error=None)
+        _thread = threading.Thread(target=run_warmup, name="shadow-warmup", daemon=True)
+    _thread.start()
+
+def wait_until_ready(timeout=None):
+    """Block until an in-flight warm-up finishes. Returns True if it succeeded (False on timeout or failure)."""
+    if _thread is None:
+        return False
+    _done.wait(timeout)
+    return _state["state"] == "ready"
+
+def _backend_initialized():
+    """True once the backend has a live corpus, however it got there (warm-up or a lazy initialize_system)."""
+    backend = sys.modules.get("src.app.backend") # Never import it from here; that is the expensive part
+    return bool(backend is not None and getattr(backend, "initialized", False))
+
+def get_readiness():
+    """Snapshot of the warm-up state with elapsed seconds."""
+    with _lock:
+        if _state["state"] in ("cold", "failed") and _backend_initialized():
+            _state.update(state="ready", stage=None, error=None, corpus_ready=True, finished_at=_state["finished_at"] or time.time())
+            _done.set()
+        readiness = dict(_state)
+    if readiness["started_at"]:
+        readiness["elapsed_seconds"] = round((readiness["finished_at"] or time.time()) - readiness["started_at"], 1)
+    return readiness
+
+# --- END OF FILE src/app/warmup.py ---
@@ -0,0 +1,292 @@
+# --- START OF FILE src/benchmarks/run_benchmarks.py ---
+# Benchmark suite on synthetic corpora: chunking, embedding, search, rule matching and
+# end-to-end process_query latency, with peak RSS, written as JSON for baseline comparison.
+#
+#   python -m src.benchmarks.run_benchmarks --scales 1000 10000 --model stub --output bench.json
+#   python -m src.benchmarks.run_benchmarks --scales 1000 10000 --model stub --baseline bench.json
+#
+# Each scale runs in a fresh process so its peak RSS is its own. "--model stub" swaps the
+# embedding model for a deterministic hashing encoder (CPU-only, no download); "--model real"
+# uses SHADOW_EMBEDDING_MODEL on the configured backend. Baseline mode exits with status 1 if
+# any metric regressed by more than --tolerance.
+
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.setup import environment as env
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+LEVELS = ("Level 1 (Low)", "Level 2 (Medium)", "Level 3 (High)")
+
+class StubModel:
+    """
+    Deterministic stand-in for the sentence-transformer: hashed bag-of-words vectors.
+
+    Costs roughly what tokenization costs, so chunking/search/end-to-end numbers are
+    measured without a GPU or model download; embedding throughput is then not representative.
+    """
+
+    max_seq_length = 256
+    tokenizer = None
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        from src.retrieval.lexical_index import tokenize
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            buckets = [zlib.crc32(token.encode("utf-8")) % self.dim for token in tokenize(text)]
+            np.add.at(vectors[row], buckets, 1.0)
+        return vectors[0] if single else vectors
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (None where the resource module is missing)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1) # bytes on macOS, KiB on Linux
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean in milliseconds of a list of per-call durations."""
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"count": len(ms), "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "mean_ms": round(float(ms.mean()), 3)}
+
+def _timed_calls(fn, args_list):
+    durations = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def run_scale(scale, model="stub", query_count=200, seed=0, work_dir=None):
+    """
+    Build a synthetic corpus of about scale chunks and benchmark every stage on it.
+
+    Runs in the calling process and points the SHADOW_* data/cache settings at a scratch
+    directory, so it should be called in a dedicated process (see run_benchmarks).
+
+    Returns:
+        dict: Per-stage metrics and peak RSS after each stage
+    """
+    from src.benchmarks.synthetic_corpus import write_synthetic_corpus, synthetic_queries
+    from src.data_processing.ingest_documents import discover_documents, load_document
+    from src.data_processing.chunk_and_annotate import create_chunks
+    from src.framework.rule_parser import parse_rules, compile_rules, match_rule_to_query
+    from src.retrieval import embedding_engine
+    from src.retrieval.embedding_cache import EmbeddingCache
+    from src.retrieval.vector_search import search_similar_chunks
+
+    work_dir = work_dir or tempfile.mkdtemp(prefix=f"shadow-bench-{scale}-")
+    corpus_dir = os.path.join(work_dir, "corpus")
+    framework_path = os.path.join(env.DATA_DIR, "Response_Framework.txt") # The real framework, before DATA_DIR is redirected
+    env.DATA_DIR = corpus_dir
+    env.CACHE_DIR = os.path.join(work_dir, "cache")
+    env.EMBEDDING_STORE_PATH = os.path.join(env.CACHE_DIR, "chunk_embeddings.f32")
+    env.INDEX_DIR = os.path.join(env.CACHE_DIR, "index")
+    env.BUILD_PIPELINE = False # Keep initialize_system comparable across runs
+    if model == "stub":
+        embedding_engine._model = StubModel()
+        env.EMBED_WORKERS = 1 # Worker processes would load the real model
+    report = {"scale": scale, "model": "stub" if model == "stub" else embedding_engine.MODEL_KEY}
+
+    try:
+        started = time.perf_counter()
+        env.DOCUMENT_MANIFEST = write_synthetic_corpus(corpus_dir, scale, seed=seed, framework_path=framework_path)
+        report["generate_seconds"] = round(time.perf_counter() - started, 3)
+
+        # --- Chunking ---
+        entries = discover_documents(corpus_dir)
+        documents = {source: load_document(entry["path"], source, entry["type"]) for source, entry in entries.items()}
+        started = time.perf_counter()
+        chunks = create_chunks(documents)
+        elapsed = time.perf_counter() - started
+        del documents
+        report["create_chunks"] = {"chunks": len(chunks), "seconds": round(elapsed, 3),
+                                   "per_second": round(len(chunks) / elapsed, 1) if elapsed > 0 else None,
+                                   "peak_rss_mb": peak_rss_mb()}
+
+        # --- Embedding (cold; the filled cache lets initialize_system below skip the model) ---
+        cache = EmbeddingCache(embedding_engine.MODEL_KEY)
+        embedding_engine.get_model()
+        started = time.perf_counter()
+        embedding_engine.get_embeddings(chunks, cache=cache)
+        elapsed = time.perf_counter() - started
+        cache.save()
+        report["get_embeddings"] = {"chunks": len(chunks), "seconds": round(elapsed, 3),
+                                    "per_second": round(len(chunks) / elapsed, 1) if elapsed > 0 else None,
+                                    "peak_rss_mb": peak_rss_mb()}
+        del chunks, cache
+
+        # --- Backend initialization (warm embedding cache: store, index and metadata build) ---
+        from src.app import backend
+        started = time.perf_counter()
+        if not backend.initialize_system(force=True, full_rebuild=True):
+            raise RuntimeError("initialize_system failed on the synthetic corpus.")
+        report["initialize_system"] = {"seconds": round(time.perf_counter() - started, 3), "peak_rss_mb": peak_rss_mb()}
+
+        queries = synthetic_queries(query_count, seed=seed)
+        levels = [LEVELS[i % len(LEVELS)] for i in range(len(queries))]
+
+        # --- Vector search (query embedding + filtered top-k, as the RAG stage calls it) ---
+        embedding_engine.clear_query_cache()
+        chunks, engine, metadata_index, bm25_index = backend.document_chunks, backend.search_engine, backend.chunk_metadata_index, backend.lexical_index
+        search = lambda query, level: search_similar_chunks(query, chunks, engine, doc_types=backend.CONTENT_DOC_TYPES,
+                                                            max_security_level=backend.map_agent_level(level),
+                                                            metadata_index=metadata_index, lexical_index=bm25_index)
+        report["search_similar_chunks"] = {**latency_summary(_timed_calls(search, zip(queries, levels))),
+                                           "mode": env.RETRIEVAL_MODE, "index": type(engine).__name__}
+
+        # --- Rule matching ---
+        rules = compile_rules(parse_rules(os.path.join(corpus_dir, "Response_Framework.txt")))
+        match = lambda query, level: match_rule_to_query(rules, query, backend.map_agent_level(level))
+        report["rule_matching"] = latency_summary(_timed_calls(match, zip(queries, levels)))
+
+        # --- End to end (response cache cleared; repeated queries hit it as they would in production) ---
+        embedding_engine.clear_query_cache()
+        backend._response_cache.clear()
+        report["process_query"] = {**latency_summary(_timed_calls(backend.process_query, zip(queries, levels))),
+                                   "peak_rss_mb": peak_rss_mb()}
+        report["peak_rss_mb"] = peak_rss_mb()
+        return report
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _run_scale_in_child(scale, model, query_count, seed, log_level):
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    return run_scale(scale, model=model, query_count=query_count, seed=seed)
+
+def run_benchmarks(scales=DEFAULT_SCALES, model="stub", query_count=200, seed=0, isolate=True, log_level="WARNING"):
+    """
+    Run run_scale for each scale (each in a fresh spawned process when isolate is set).
+
+    Returns:
+        dict: {"meta": environment description, "scales": {str(scale): report}}
+    """
+    results = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                        "platform": platform.platform(), "cpus": os.cpu_count(), "model": model,
+                        "index_backend": env.INDEX_BACKEND, "retrieval_mode": env.RETRIEVAL_MODE,
+                        "embed_workers": env.EMBED_WORKERS if model == "real" else 1,
+                        "queries": query_count, "seed": seed},
+               "scales": {}}
+    for scale in scales:
+        logger.info(f"Benchmarking {scale} chunks...")
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                report = executor.submit(_run_scale_in_child, scale, model, query_count, seed, log_level).result()
+        else:
+            report = run_scale(scale, model=model, query_count=query_count, seed=seed)
+        results["scales"][str(scale)] = report
+        logger.info(f"{scale} chunks: {json.dumps(report)}")
+    return results
+
+# ======================================================================
+# BASELINE COMPARISON
+# ======================================================================
+def _flatten(report, prefix=""):
+    metrics = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+def _direction(metric):
+    """+1 if larger is better, -1 if smaller is better, 0 for counts and other descriptive values."""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf == "per_second":
+        return 1
+    if leaf.endswith("_ms") or leaf.endswith("seconds") or leaf == "peak_rss_mb":
+        return -1
+    return 0
+
+def compare_to_baseline(current, baseline, tolerance=0.1):
+    """
+    Compare two run_benchmarks results scale by scale.
+
+    Returns:
+        list: One dict per compared metric {"metric", "baseline", "current", "change", "regressed"};
+            change is relative (+0.2 = 20% larger), regressed means worse by more than tolerance
+    """
+    rows = []
+    for scale, report in current["scales"].items():
+        if scale not in baseline.get("scales", {}):
+            continue
+        previous = _flatten(baseline["scales"][scale])
+        for metric, value in _flatten(report).items():
+            direction = _direction(metric)
+            if direction == 0 or metric not in previous or not previous[metric]:
+                continue
+            change = (value - previous[metric]) / abs(previous[metric])
+            rows.append({"metric": f"{scale}.{metric}", "baseline": previous[metric], "current": value,
+                         "change": round(change, 4), "regressed": -direction * change > tolerance})
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Project SHADOW on synthetic corpora.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES), help="Corpus sizes in chunks (1000 .. 1000000)")
+    parser.add_argument("--model", choices=("stub", "real"), default="stub", help="Hashing stub (CPU-only) or the configured embedding model")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per latency measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown/growth treated as a regression")
+    parser.add_argument("--in-process", action="store_true", help="Run all scales in this process (peak RSS is then cumulative)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    results = run_benchmarks(args.scales, model=args.model, query_count=args.queries, seed=args.seed,
+                             isolate=not args.in_process, log_level=args.log_level.upper())
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            comparison = compare_to_baseline(results, json.load(file), tolerance=args.tolerance)
+        results["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "metrics": comparison}
+        regressions = [row for row in comparison if row["regressed"]]
+        for row in regressions:
+            print(f"REGRESSION {row['metric']}: {row['baseline']} -> {row['current']} ({row['change']:+.1%})", file=sys.stderr)
+        print(f"{len(comparison)} metrics compared, {len(regressions)} regressions (tolerance {args.tolerance:.0%}).", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE src/benchmarks/run_benchmarks.py ---
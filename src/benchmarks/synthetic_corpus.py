@@ -0,0 +1,118 @@
+# --- START OF FILE src/benchmarks/synthetic_corpus.py ---
+# Synthetic classified manuals in the same "#"-header / paragraph format as
+# data/Secret_Info_Manual.txt, sized by the number of chunks they should produce.
+
+import os
+import json
+import random
+import shutil
+
+from src.setup import environment as env
+
+# Header vocabulary: one word from each list gives the chunker the same level mix as the real manual
+_LEVEL_HEADERS = {
+    1: ["Training Overview", "Field Logistics", "Equipment Handling", "Travel Guidelines", "Communication Basics"],
+    2: ["Covert Entry Methods", "Safehouse Procedures", "Counter-Surveillance Drills", "Verification Protocol", "Covert Asset Handling"],
+    3: ["Black Site Access", "Operation Eclipse Briefing", "Omega Contingency", "Termination Orders", "Shadow Network Directives"],
+}
+_SUBJECTS = ["Agents", "Field officers", "Handlers", "Extraction teams", "Analysts", "Operatives"]
+_ACTIONS = ["must rotate", "shall verify", "are required to encrypt", "should burn", "must relay", "will escort", "must decode"]
+_OBJECTS = ["all dead-drop coordinates", "the courier manifests", "every alias backstory", "the relay frequencies",
+            "the biometric cipher", "each safehouse entry code", "the extraction timetable", "the mirror-wallet ledgers"]
+_CONDITIONS = ["before crossing any border", "within 6 hours of compromise", "every 72 hours", "after each handshake",
+               "during radio silence", "when surveillance is suspected", "prior to debriefing"]
+_CITIES = ["New Delhi", "Berlin", "Istanbul", "Cairo", "Lisbon", "Jakarta", "Nairobi", "Vilnius"]
+_GREEK = "ΣΔΩΦΨΛ"
+
+def codeword(rng):
+    """A random identifier in one of the manual's codeword shapes (S-29, K-41, EK7-ΣΔ19, Vault-17)."""
+    shape = rng.randrange(4)
+    if shape == 0:
+        return f"{rng.choice('SKQZ')}-{rng.randrange(10, 100)} Protocol"
+    if shape == 1:
+        return f"Safehouse {rng.choice('KLMN')}-{rng.randrange(10, 100)}"
+    if shape == 2:
+        return f"{rng.choice('EKX')}{rng.choice('KQZ')}{rng.randrange(10)}-{rng.choice(_GREEK)}{rng.choice(_GREEK)}{rng.randrange(10, 100)}"
+    return f"Vault-{rng.randrange(10, 100)}"
+
+def _sentence(rng):
+    text = f"{rng.choice(_SUBJECTS)} {rng.choice(_ACTIONS)} {rng.choice(_OBJECTS)} {rng.choice(_CONDITIONS)}"
+    if rng.random() < 0.3:
+        text += f" under the {codeword(rng)}"
+    if rng.random() < 0.2:
+        text += f" in {rng.choice(_CITIES)}"
+    return text + "."
+
+def _paragraph(rng, target_chars):
+    sentences, length = [], 0
+    while length < target_chars:
+        sentence = _sentence(rng)
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)
+
+def iter_manual_lines(target_chunks, seed=0, chunk_size=1000):
+    """
+    Stream the lines of one synthetic manual expected to chunk into about target_chunks chunks.
+
+    Each "###" section gets a header that assigns level 1, 2 or 3 and a few paragraphs
+    (occasionally a "####" sub-header) totalling roughly one chunk of text.
+    """
+    rng = random.Random(seed)
+    yield f"### RAW Agents’ Synthetic Field Manual {seed} (Classified Level 7)\n"
+    yield "#### Issued By: Directorate of Covert Operations\n\n"
+    for section in range(target_chunks):
+        level = rng.choice((1, 1, 2, 2, 3))
+        yield f"\n### {rng.choice(_LEVEL_HEADERS[level])} {section}\n"
+        if rng.random() < 0.25:
+            yield f"#### {rng.choice(_LEVEL_HEADERS[level])} Addendum\n"
+        remaining = int(chunk_size * rng.uniform(0.6, 0.85))
+        while remaining > 0:
+            paragraph = _paragraph(rng, min(remaining, rng.randrange(150, 500)))
+            yield paragraph + "\n"
+            remaining -= len(paragraph) + 1
+
+def write_synthetic_corpus(corpus_dir, target_chunks, documents=None, seed=0, framework_path=None):
+    """
+    Write a synthetic corpus of about target_chunks chunks plus the real Response Framework.
+
+    Args:
+        corpus_dir (str): Output directory (replaced if it exists)
+        target_chunks (int): Approximate total chunk count
+        documents (int): Number of manuals to spread the chunks over (defaults to one per ~2000 chunks)
+        seed (int): Seed; the same arguments always produce the same corpus
+        framework_path (str): Framework copied into the corpus (defaults to DATA_DIR/Response_Framework.txt)
+
+    Returns:
+        str: Path of the corpus manifest written alongside the documents
+    """
+    if os.path.exists(corpus_dir):
+        shutil.rmtree(corpus_dir)
+    os.makedirs(corpus_dir)
+    documents = documents or max(1, target_chunks // 2000)
+    per_document = max(1, target_chunks // documents)
+    for index in range(documents):
+        path = os.path.join(corpus_dir, f"Synthetic_Manual_{index:04d}.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.writelines(iter_manual_lines(per_document, seed=seed * 100003 + index))
+
+    shutil.copy(framework_path or os.path.join(env.DATA_DIR, "Response_Framework.txt"), os.path.join(corpus_dir, "Response_Framework.txt"))
+    manifest_path = os.path.join(corpus_dir, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        json.dump({"documents": {"Response_Framework.txt": {"source": "Response Framework", "type": "framework"},
+                                 "Synthetic_Manual_*.txt": {"type": "classified"}}}, file, indent=2)
+    return manifest_path
+
+def synthetic_queries(count, seed=0):
+    """Query mix for latency runs: natural questions, codeword lookups and framework-rule triggers."""
+    rng = random.Random(seed)
+    templates = [
+        lambda: f"How do {rng.choice(_SUBJECTS).lower()} handle {rng.choice(_OBJECTS)} {rng.choice(_CONDITIONS)}?",
+        lambda: f"What is the {codeword(rng)}?",
+        lambda: f"Where is {codeword(rng)} located in {rng.choice(_CITIES)}?",
+        lambda: f"Explain the emergency extraction protocol for {rng.choice(_CITIES)}",
+        lambda: f"Tell me about Operation Hollow Stone and {codeword(rng)}",
+    ]
+    return [rng.choice(templates)() for _ in range(count)]
+
+# --- END OF FILE src/benchmarks/synthetic_corpus.py ---
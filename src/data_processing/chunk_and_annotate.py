@@ -1,7 +1,8 @@
 # --- START OF FILE chunk_and_annotate.py (Simplified Level Logic) ---
 
+import io
 import re
-import uuid
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,102 +12,207 @@ LEVEL3_KEYWORDS_HEADER = re.compile(r'\b(classified|black site|termination|omega
 LEVEL2_KEYWORDS_HEADER = re.compile(r'\b(covert|safehouse|counter-surveillance|protocol|verification|level [2-6]|level-[2-6])\b', re.IGNORECASE) # Added 'verification'
 # No paragraph keyword sets needed for this simplified logic
 
-def create_chunks(documents, chunk_size=1000, overlap=100):
-    """Split documents using header-focused level assignment."""
-    all_chunks = []
-    logger.info(f"Starting chunking (Header-Focused Level): ChunkSize={chunk_size}, Overlap={overlap}")
+def make_chunk_id(source, text, seen_ids=None):
+    """
+    Deterministic, content-addressed chunk id (same document text -> same id on every run).
+
+    Args:
+        source (str): Document name the chunk came from
+        text (str): Final chunk text
+        seen_ids (set): Ids already issued in this run; repeated text gets an ordinal suffix
+
+    Returns:
+        str: Hex id derived from sha256(source, text)
+    """
+    base_id = hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()[:32]
+    if seen_ids is None:
+        return base_id
+    chunk_id, ordinal = base_id, 1
+    while chunk_id in seen_ids:
+        ordinal += 1
+        chunk_id = f"{base_id}-{ordinal}"
+    seen_ids.add(chunk_id)
+    return chunk_id
+
+def _split_point(text, max_length):
+    """Where to cut an over-long paragraph: the last line break, else the last whitespace, within max_length."""
+    window = text[:max_length + 1] # A break right at the limit still counts
+    cut = window.rfind("\n")
+    if cut < max_length // 2: # A break near the start would leave a tiny piece; prefer a later word boundary
+        cut = max(cut, window.rfind(" "), window.rfind("\t"))
+    return cut if cut > 0 else max_length # No whitespace at all: hard cut
+
+def iter_paragraphs(lines, max_length=None):
+    """
+    Lazily split a stream of text lines into paragraphs (blocks separated by blank lines).
+
+    Only the current paragraph is held in memory. A paragraph longer than max_length is
+    yielded in consecutive pieces of at most max_length characters, cut at the last line
+    break (or else word boundary) before the limit, so a document without blank lines
+    can't grow the buffer past that bound and words or rule lines aren't split in half.
+
+    Args:
+        lines (iterable): Text lines, e.g. an open text file
+        max_length (int): Longest piece to yield (None = unbounded)
+
+    Yields:
+        tuple: (stripped, non-empty paragraph text, True for the second and later pieces of a split paragraph)
+    """
+    buffer, length, continued = [], 0, False
+    for line in lines:
+        if not line.strip():
+            if buffer:
+                paragraph = "".join(buffer).strip()
+                if paragraph: yield paragraph, continued
+                buffer, length, continued = [], 0, False
+            continue
+        buffer.append(line); length += len(line)
+        while max_length and length > max_length:
+            text = "".join(buffer)
+            cut = _split_point(text, max_length)
+            piece, rest = text[:cut].strip(), text[cut:].lstrip()
+            if piece:
+                yield piece, continued
+                continued = True
+            buffer, length = [rest], len(rest)
+    if buffer:
+        paragraph = "".join(buffer).strip()
+        if paragraph: yield paragraph, continued
+
+def _overlap_tail(text, overlap):
+    """Last ~overlap characters of a chunk, starting on a word boundary."""
+    if overlap <= 0 or not text:
+        return ""
+    if len(text) <= overlap:
+        return text
+    tail = text[-overlap:]
+    if not text[-overlap - 1].isspace():
+        cut = re.search(r"\s", tail)
+        tail = tail[cut.end():] if cut else ""
+    return tail.strip()
+
+def _section_level(section_title):
+    """Security level (1-3) a header assigns to the following section of a classified document."""
+    explicit_level_match = re.search(r'level\s+(\d+)', section_title, re.IGNORECASE)
+    if explicit_level_match:
+        level = int(explicit_level_match.group(1)); new_level = max(1, min(level, 3))
+        logger.debug("  Header '%s' explicit Level %d. Setting section level to %d.", section_title, level, new_level)
+    elif LEVEL3_KEYWORDS_HEADER.search(section_title):
+        new_level = 3
+        logger.debug("  Header '%s' L3 keyword. Setting section level to 3.", section_title)
+    elif LEVEL2_KEYWORDS_HEADER.search(section_title):
+        new_level = 2
+        logger.debug("  Header '%s' L2 keyword. Setting section level to 2.", section_title)
+    else:
+        new_level = 1 # Default classified level
+        logger.debug("  Header '%s' no keywords. Setting section level to 1.", section_title)
+    return new_level
+
+def _document_lines(document):
+    """Line stream of a document: 'lines' (any iterable, e.g. an open file) or the 'content' string."""
+    if document.get("lines") is not None:
+        return document["lines"]
+    return io.StringIO(document.get("content", ""))
+
+def iter_chunks(documents, chunk_size=1000, overlap=100, seen_ids=None):
+    """
+    Stream chunks out of documents one at a time (header-focused level assignment).
+
+    Memory is bounded by chunk_size: documents are consumed paragraph by paragraph and
+    each chunk is yielded as soon as it is complete. Each new chunk starts with ~overlap
+    characters from the end of the previous one; that carried-over text is dropped again
+    if a header changes the security level before the chunk is finished, so overlap never
+    moves text into a different clearance level.
+
+    Args:
+        documents (dict): Document name -> {"metadata": {...}, "content": str} or
+            {"metadata": {...}, "lines": iterable of lines}
+        chunk_size (int): Maximum chunk length in characters
+        overlap (int): Characters repeated from the end of the previous chunk
+        seen_ids (set): Chunk ids issued so far (shared across calls for unique ids)
+
+    Yields:
+        dict: {"id", "text", "metadata"}
+    """
+    seen_ids = set() if seen_ids is None else seen_ids
+    overlap = max(0, min(overlap, chunk_size // 2))
+    logger.info("Starting chunking (Header-Focused Level): ChunkSize=%d, Overlap=%d", chunk_size, overlap)
 
     for doc_name, document in documents.items():
-        content = document["content"]; metadata = document["metadata"]
-        logger.info(f"Processing document: {doc_name} (Type: {metadata['type']})")
+        metadata = document["metadata"]
+        logger.info("Processing document: %s (Type: %s)", doc_name, metadata['type'])
         is_classified = metadata["type"] == "classified"
-        paragraphs = [p.strip() for p in re.split(r'\n\s*\n+', content) if p.strip()]
-        logger.info(f"'{doc_name}' split into {len(paragraphs)} paragraphs.")
-        if not paragraphs: continue
 
         current_chunk_text = ""
+        overlap_len = 0 # Leading characters of current_chunk_text carried over from the previous chunk
         # Metadata now primarily holds the level determined by the LAST SEEN HEADER
         current_section_metadata = { # Renamed for clarity
             "source": doc_name, "doc_type": metadata["type"], "section": "Unknown",
             "security_level": 1 if is_classified else 0 # Default level before first header
         }
-        logger.debug(f"Initial metadata for '{doc_name}': {current_section_metadata}")
-
-        for i, paragraph in enumerate(paragraphs):
+        logger.debug("Initial metadata for '%s': %s", doc_name, current_section_metadata)
+
+        def finalize(text):
+            chunk_id = make_chunk_id(doc_name, text, seen_ids)
+            # The level is determined by the last header encountered before this chunk was finalized
+            chunk_metadata_final = current_section_metadata.copy()
+            # Per-chunk line: DEBUG (sampled in production logging) with lazy %-formatting
+            logger.debug("--> Creating Chunk %s: Level=%s, Section='%s', Text='%.80s...'",
+                         chunk_id[-6:], chunk_metadata_final['security_level'], chunk_metadata_final['section'], text)
+            return {"id": chunk_id, "text": text, "metadata": chunk_metadata_final}
+
+        # Pieces leave room for the overlap tail so a split paragraph still fits in one chunk
+        paragraphs = iter_paragraphs(_document_lines(document), max_length=max(1, chunk_size - overlap - 2))
+        paragraph_count = 0
+        for i, (paragraph, continued) in enumerate(paragraphs):
+            paragraph_count += 1
             # --- 1. Check for Headers & SET SECTION LEVEL ---
-            header_match = re.match(r'^#+\s+(.+)$', paragraph)
+            # (never on the rest of a split paragraph: a piece that happens to start with '#' is body text)
+            header_match = None if continued else re.match(r'^#+\s+(.+)$', paragraph)
             if header_match:
                 section_title = header_match.group(1).strip()
                 current_section_metadata["section"] = section_title # Update section name
-                logger.debug(f"Paragraph {i}: Found header: '{section_title}'")
+                logger.debug("Paragraph %d: Found header: '%s'", i, section_title)
 
                 # Determine and SET level based *only* on this header (for classified)
                 if is_classified:
-                    new_level = 1 # Default classified level
-                    explicit_level_match = re.search(r'level\s+(\d+)', section_title, re.IGNORECASE)
-                    if explicit_level_match:
-                        level = int(explicit_level_match.group(1)); new_level = max(1, min(level, 3))
-                        logger.debug(f"  Header '{section_title}' explicit Level {level}. Setting section level to {new_level}.")
-                    elif LEVEL3_KEYWORDS_HEADER.search(section_title):
-                        new_level = 3
-                        logger.debug(f"  Header '{section_title}' L3 keyword. Setting section level to 3.")
-                    elif LEVEL2_KEYWORDS_HEADER.search(section_title):
-                        new_level = 2
-                        logger.debug(f"  Header '{section_title}' L2 keyword. Setting section level to 2.")
-                    else:
-                        logger.debug(f"  Header '{section_title}' no keywords. Setting section level to 1.")
-
+                    new_level = _section_level(section_title)
+                    if overlap_len and new_level != current_section_metadata["security_level"]:
+                        current_chunk_text = current_chunk_text[overlap_len:] # Don't carry text across levels
+                        overlap_len = 0
                     # *** Update the section metadata level ***
                     current_section_metadata["security_level"] = new_level
 
                 continue # Skip header paragraph from chunk text
 
-            # --- 2. Paragraph Content Analysis (REMOVED for level setting) ---
-            # We are IGNORING paragraph keywords for setting levels in this version
-
-            # --- 3. Chunking Logic ---
+            # --- 2. Chunking Logic ---
             paragraph_len = len(paragraph) + 2
             current_len = len(current_chunk_text)
 
-            # Case 1: Chunk full -> finalize old, start new
+            # Case 1: Chunk full -> finalize old, start new (seeded with the tail of the old one)
             if current_len > 0 and current_len + paragraph_len > chunk_size:
-                chunk_id = str(uuid.uuid4())
-                # *** Use the current_section_metadata directly ***
-                # The level is determined by the last header encountered before this chunk was finalized
-                chunk_metadata_final = current_section_metadata.copy()
-
-                text_snippet = current_chunk_text[:80].strip() + "..."
-                logger.info(f"--> Creating Chunk {chunk_id[-6:]}: Level={chunk_metadata_final['security_level']}, Section='{chunk_metadata_final['section']}', Text='{text_snippet}'")
-                all_chunks.append({"id": chunk_id, "text": current_chunk_text.strip(), "metadata": chunk_metadata_final})
-                current_chunk_text = paragraph # Start new chunk text
-
-            # Case 2: Paragraph too big -> create truncated chunk
-            elif current_len == 0 and paragraph_len > chunk_size:
-                chunk_id = str(uuid.uuid4())
-                # *** Use the current_section_metadata directly ***
-                chunk_metadata_final = current_section_metadata.copy()
-
-                text_snippet = paragraph[:80].strip() + "..."
-                logger.warning(f"Paragraph {i} exceeds chunk size. Truncating.")
-                logger.info(f"--> Creating Chunk {chunk_id[-6:]} (Truncated): Level={chunk_metadata_final['security_level']}, Section='{chunk_metadata_final['section']}', Text='{text_snippet}'")
-                all_chunks.append({"id": chunk_id, "text": paragraph[:chunk_size], "metadata": chunk_metadata_final})
-                current_chunk_text = "" # Reset
-
-            # Case 3: Add paragraph to current chunk
+                finished_text = current_chunk_text.strip()
+                yield finalize(finished_text)
+                tail = _overlap_tail(finished_text, overlap)
+                if tail and len(tail) + paragraph_len <= chunk_size:
+                    current_chunk_text, overlap_len = f"{tail}\n\n{paragraph}", len(tail) + 2
+                else:
+                    current_chunk_text, overlap_len = paragraph, 0
+
+            # Case 2: Add paragraph to current chunk
             else:
                 if current_chunk_text: current_chunk_text += "\n\n" + paragraph
                 else: current_chunk_text = paragraph
-                # NO level update needed here based on paragraph
 
+        logger.info("'%s' streamed %d paragraphs.", doc_name, paragraph_count)
         # Add the very last chunk
         if current_chunk_text:
-            chunk_id = str(uuid.uuid4())
-            # *** Use the final state of current_section_metadata ***
-            text_snippet = current_chunk_text[:80].strip() + "..."
-            logger.info(f"--> Creating Final Chunk {chunk_id[-6:]}: Level={current_section_metadata['security_level']}, Section='{current_section_metadata['section']}', Text='{text_snippet}'")
-            all_chunks.append({"id": chunk_id, "text": current_chunk_text.strip(), "metadata": current_section_metadata.copy()})
+            yield finalize(current_chunk_text.strip())
 
-    logger.info(f"Chunking complete. Created {len(all_chunks)} chunks total.")
+def create_chunks(documents, chunk_size=1000, overlap=100):
+    """Split documents using header-focused level assignment (list form of iter_chunks)."""
+    all_chunks = list(iter_chunks(documents, chunk_size=chunk_size, overlap=overlap))
+    logger.info("Chunking complete. Created %d chunks total.", len(all_chunks))
     if not all_chunks: logger.error("CRITICAL: No chunks generated!")
     return all_chunks
 
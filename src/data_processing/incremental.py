@@ -0,0 +1,92 @@
+# --- START OF FILE src/data_processing/incremental.py ---
+# Change detection for incremental re-ingestion: which documents changed since the last
+# build (mtime/size first, content hash to confirm) and which chunks were added or removed.
+
+import os
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+def file_signature(path, previous=None):
+    """
+    Stat (and, if needed, hash) a document file.
+
+    The sha256 is only recomputed when mtime or size differ from the previous signature,
+    so an unchanged document costs one stat() call.
+
+    Args:
+        path (str): Document path
+        previous (dict): Signature returned by an earlier call for the same file
+
+    Returns:
+        dict: {"path", "mtime_ns", "size", "sha256"}
+    """
+    stat = os.stat(path)
+    if (previous and previous.get("path") == path and previous.get("mtime_ns") == stat.st_mtime_ns
+            and previous.get("size") == stat.st_size):
+        return previous
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return {"path": path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest.hexdigest()}
+
+def detect_changed_documents(paths, previous_signatures):
+    """
+    Compare documents on disk against the signatures recorded at the last build.
+
+    Args:
+        paths (dict): Document name -> file path
+        previous_signatures (dict): Document name -> signature from file_signature
+
+    Returns:
+        tuple: (signatures, changed) where signatures maps every document to its current
+            signature and changed is the set of document names whose content differs
+            (touched-but-identical files are not reported)
+    """
+    signatures, changed = {}, set()
+    for name, path in paths.items():
+        previous = previous_signatures.get(name)
+        signatures[name] = file_signature(path, previous)
+        if previous is None or signatures[name]["sha256"] != previous.get("sha256"):
+            changed.add(name)
+    for name in previous_signatures.keys() - paths.keys():
+        changed.add(name) # Document removed from the corpus
+    if changed:
+        logger.info(f"Changed documents: {sorted(changed)}")
+    return signatures, changed
+
+def diff_chunks(old_chunks, new_chunks, sources):
+    """
+    Diff the chunks of re-chunked documents against the current chunk list by chunk id.
+
+    Chunk ids are content-addressed (make_chunk_id), so an id present on both sides has
+    identical text and its embedding can be kept; only its metadata is refreshed (e.g. a
+    section header above it changed the security level).
+
+    Args:
+        old_chunks (list): Current chunk list (position i = row i of the embedding matrix)
+        new_chunks (list): Fresh chunks of the changed documents only
+        sources (set): Names of the changed documents
+
+    Returns:
+        tuple: (kept_chunks, removed_rows, added_chunks). kept_chunks is the old list without
+            the removed rows (same order, metadata refreshed), removed_rows the sorted row
+            positions to delete, added_chunks the chunks that need embedding.
+    """
+    new_by_id = {chunk["id"]: chunk for chunk in new_chunks}
+    kept_chunks, removed_rows, kept_ids = [], [], set()
+    for row, chunk in enumerate(old_chunks):
+        if chunk.get("metadata", {}).get("source") not in sources:
+            kept_chunks.append(chunk)
+        elif chunk["id"] in new_by_id:
+            kept_chunks.append(new_by_id[chunk["id"]])
+            kept_ids.add(chunk["id"])
+        else:
+            removed_rows.append(row)
+    added_chunks = [chunk for chunk in new_chunks if chunk["id"] not in kept_ids]
+    logger.info(f"Chunk delta for {sorted(sources)}: {len(kept_ids)} unchanged, {len(removed_rows)} removed, {len(added_chunks)} added.")
+    return kept_chunks, removed_rows, added_chunks
+
+# --- END OF FILE src/data_processing/incremental.py ---
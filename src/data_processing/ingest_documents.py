@@ -1,19 +1,31 @@
 import os
 import json
+import fnmatch
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from src.setup import environment as env
+from src.data_processing.chunk_and_annotate import iter_chunks
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".txt", ".md", ".pdf")
+DOC_TYPES = ("classified", "framework")
 
 def load_documents(secret_manual_path, response_framework_path):
     """
     Load and parse the Secret Info Manual and Response Framework documents.
-    
+
     Args:
         secret_manual_path (str): Path to the Secret Info Manual document
         response_framework_path (str): Path to the Response Framework document
-        
+
     Returns:
         dict: Dictionary containing the loaded documents
     """
     documents = {}
-    
+
     # Check if files exist
     for path, doc_name in [
         (secret_manual_path, "Secret Info Manual"),
@@ -21,36 +33,192 @@ def load_documents(secret_manual_path, response_framework_path):
     ]:
         if not os.path.exists(path):
             raise FileNotFoundError(f"Document not found: {path}")
-    
+
     # Load Secret Info Manual
     try:
-        with open(secret_manual_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            documents["Secret Info Manual"] = {
-                "content": content,
-                "metadata": {
-                    "source": "Secret Info Manual",
-                    "path": secret_manual_path,
-                    "type": "classified"
-                }
-            }
+        documents["Secret Info Manual"] = load_document(secret_manual_path, "Secret Info Manual", "classified")
     except Exception as e:
         raise IOError(f"Error loading Secret Info Manual: {str(e)}")
-    
+
     # Load Response Framework
     try:
-        with open(response_framework_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            documents["Response Framework"] = {
-                "content": content,
-                "metadata": {
-                    "source": "Response Framework",
-                    "path": response_framework_path,
-                    "type": "framework"
-                }
-            }
+        documents["Response Framework"] = load_document(response_framework_path, "Response Framework", "framework")
     except Exception as e:
         raise IOError(f"Error loading Response Framework: {str(e)}")
-    
-    print(f"Successfully loaded {len(documents)} documents")
+
+    logger.info("Successfully loaded %d documents", len(documents))
     return documents
+
+# ======================================================================
+# CORPUS DIRECTORY INGESTION
+# ======================================================================
+def iter_document_lines(path):
+    """
+    Stream the text of a .txt, .md or .pdf file line by line without reading it whole.
+
+    PDFs are extracted one page at a time; a blank line after each page makes every
+    page start a new paragraph for the chunker.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError as e:
+            raise ImportError("PDF ingestion requires the 'pypdf' package (pip install pypdf).") from e
+        reader = PdfReader(path)
+        for page in reader.pages:
+            yield from (page.extract_text() or "").splitlines(keepends=True)
+            yield "\n\n"
+        return
+    if extension not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported document type: {path}")
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        yield from file
+
+def read_document_text(path):
+    """Extract the full text of a .txt, .md or .pdf file."""
+    return "".join(iter_document_lines(path))
+
+def load_document(path, source, doc_type):
+    """
+    Load one document in the format create_chunks expects.
+
+    Returns:
+        dict: {"content": str, "metadata": {"source", "path", "type"}}
+    """
+    return {
+        "content": read_document_text(path),
+        "metadata": {"source": source, "path": path, "type": doc_type}
+    }
+
+def load_manifest(manifest_path=None):
+    """
+    Read the corpus manifest, a JSON object of the form
+
+        {"documents": {"Secret_Info_Manual.txt": {"source": "Secret Info Manual", "type": "classified"},
+                       "framework/*.md": {"type": "framework"}}}
+
+    Keys are paths relative to the corpus directory or fnmatch patterns; exact paths win,
+    then patterns in file order. A missing manifest is treated as empty.
+
+    Returns:
+        dict: Path or pattern -> {"source" (optional), "type"}
+    """
+    manifest_path = manifest_path or env.DOCUMENT_MANIFEST
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+    entries = manifest.get("documents", {}) if isinstance(manifest, dict) else {}
+    logger.info(f"Loaded corpus manifest {manifest_path} with {len(entries)} entries.")
+    return entries
+
+def _manifest_entry(relative_path, manifest):
+    if relative_path in manifest:
+        return manifest[relative_path]
+    for pattern, entry in manifest.items():
+        if fnmatch.fnmatch(relative_path, pattern):
+            return entry
+    return {}
+
+def discover_documents(corpus_dir, manifest_path=None):
+    """
+    Walk a corpus directory for .txt/.md/.pdf files and attach classification from the manifest.
+
+    Files the manifest does not mention get SHADOW_DEFAULT_DOC_TYPE and a source name
+    derived from the file name ("Secret_Info_Manual.txt" -> "Secret Info Manual").
+
+    Args:
+        corpus_dir (str): Root directory of the corpus
+        manifest_path (str): Manifest file (defaults to SHADOW_DOCUMENT_MANIFEST)
+
+    Returns:
+        dict: Source name -> {"path", "type"}, in sorted path order
+    """
+    manifest = load_manifest(manifest_path)
+    documents = {}
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for filename in sorted(files):
+            if filename.startswith(".") or os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            path = os.path.join(root, filename)
+            relative_path = os.path.relpath(path, corpus_dir).replace(os.sep, "/")
+            entry = _manifest_entry(relative_path, manifest)
+
+            doc_type = entry.get("type", env.DEFAULT_DOC_TYPE)
+            if doc_type not in DOC_TYPES:
+                logger.warning(f"Unknown document type '{doc_type}' for {relative_path}; using '{env.DEFAULT_DOC_TYPE}'.")
+                doc_type = env.DEFAULT_DOC_TYPE
+            source = entry.get("source") or os.path.splitext(filename)[0].replace("_", " ")
+            if source in documents:
+                source = os.path.splitext(relative_path)[0] # Same file name in two folders; keep sources unique
+            documents[source] = {"path": path, "type": doc_type}
+
+    logger.info(f"Discovered {len(documents)} documents under {corpus_dir}.")
+    return documents
+
+def _load_and_chunk(source, entry, chunk_size, overlap):
+    """
+    Pool task: stream one document through the chunker (chunk ids only depend on source and text).
+
+    Returns:
+        tuple: (chunks, error message or None); errors are returned so one bad file doesn't stop the map
+    """
+    try:
+        document = {"lines": iter_document_lines(entry["path"]), "metadata": {"source": source, "path": entry["path"], "type": entry["type"]}}
+        return list(iter_chunks({source: document}, chunk_size=chunk_size, overlap=overlap)), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+def ingest_documents(entries, workers=None, chunk_size=1000, overlap=100):
+    """
+    Parse and chunk many documents, one document per task on a process pool for large ingests.
+
+    Args:
+        entries (dict): Source name -> {"path", "type"} (see discover_documents)
+        workers (int): Process pool size (defaults to SHADOW_INGEST_WORKERS). Ingests of fewer than
+            SHADOW_INGEST_PARALLEL_MIN_DOCS documents or SHADOW_INGEST_PARALLEL_MIN_BYTES bytes run
+            in-process, where spawning and importing workers would cost more than the parsing.
+        chunk_size (int): Passed to iter_chunks
+        overlap (int): Passed to iter_chunks
+
+    Returns:
+        list: Chunks of all documents, in entries order. Documents that fail to load are
+            logged and skipped.
+    """
+    workers = env.INGEST_WORKERS if workers is None else workers
+    workers = max(1, min(workers, len(entries)))
+    if workers > 1 and (len(entries) < env.INGEST_PARALLEL_MIN_DOCS or _total_bytes(entries) < env.INGEST_PARALLEL_MIN_BYTES):
+        workers = 1
+    sources = list(entries)
+    task_args = ([entries[source] for source in sources], [chunk_size] * len(sources), [overlap] * len(sources))
+
+    if workers == 1:
+        results = map(_load_and_chunk, sources, *task_args)
+        all_chunks = _collect_chunks(sources, entries, results)
+    else:
+        chunksize = max(1, len(sources) // (workers * 4)) # Batch small documents per task to cut IPC overhead
+        # spawn, not fork: refreshes run from server / Streamlit threads while torch or ONNX thread pools are live
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            all_chunks = _collect_chunks(sources, entries, executor.map(_load_and_chunk, sources, *task_args, chunksize=chunksize))
+
+    logger.info(f"Ingested {len(sources)} documents into {len(all_chunks)} chunks ({workers} workers).")
+    return all_chunks
+
+def _total_bytes(entries):
+    total = 0
+    for entry in entries.values():
+        try:
+            total += os.path.getsize(entry["path"])
+        except OSError:
+            pass # Reported when the document fails to load
+    return total
+
+def _collect_chunks(sources, entries, results):
+    all_chunks = []
+    for source, (chunks, error) in zip(sources, results):
+        if error:
+            logger.error(f"Failed to ingest '{source}' ({entries[source]['path']}): {error}")
+        all_chunks.extend(chunks)
+    return all_chunks
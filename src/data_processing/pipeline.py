@@ -0,0 +1,219 @@
+# --- START OF FILE src/data_processing/pipeline.py ---
+# Pipelined corpus build: reader threads -> chunker -> embedding worker, connected by bounded
+# queues so the model encodes batches while later documents are still being read and chunked.
+# Documents are streamed to the chunker in blocks of lines, never loaded whole.
+
+import time
+import queue
+import logging
+import itertools
+import threading
+import numpy as np
+
+from src.setup import environment as env
+from src.data_processing.chunk_and_annotate import iter_chunks
+from src.data_processing.ingest_documents import iter_document_lines
+
+logger = logging.getLogger(__name__)
+
+_DONE = object() # End-of-stream marker passed down each queue
+_LINE_BLOCK = 256 # Lines per hand-off from a reader to the chunker
+_LINE_BLOCKS_IN_FLIGHT = 4 # Blocks buffered per open document, bounding reader memory
+
+class StageStats:
+    """Items processed and time spent working (not waiting on queues) by one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items, seconds):
+        with self._lock:
+            self.items += items
+            self.busy_seconds += seconds
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "per_second": round(self.items / self.busy_seconds, 1) if self.busy_seconds > 0 else None,
+        }
+
+class _Aborted(Exception):
+    pass
+
+def _put(q, item, stop):
+    """Blocking put that gives up once another stage has failed (so nothing deadlocks on a full queue)."""
+    while True:
+        if stop.is_set():
+            raise _Aborted()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+def _get(q, stop):
+    while True:
+        if stop.is_set():
+            raise _Aborted()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+def run_build_pipeline(entries, embed_fn=None, readers=None, chunk_size=1000, overlap=100, batch_size=None, queue_size=None):
+    """
+    Read, chunk and embed a corpus with the three stages running concurrently.
+
+    Args:
+        entries (dict): Source name -> {"path", "type"} (see discover_documents)
+        embed_fn (callable): list of chunks -> (n, dim) matrix; None skips the embedding stage
+        readers (int): Reader threads (defaults to SHADOW_PIPELINE_READERS)
+        chunk_size (int): Passed to iter_chunks
+        overlap (int): Passed to iter_chunks
+        batch_size (int): Chunks per embed_fn call (defaults to SHADOW_PIPELINE_EMBED_BATCH)
+        queue_size (int): Capacity of each inter-stage queue (defaults to SHADOW_PIPELINE_QUEUE_SIZE)
+
+    Returns:
+        tuple: (chunks, embeddings, stats). chunks are in entries order (same as
+            ingest_documents), embeddings is the matching (n, dim) float32 matrix (None
+            without embed_fn), stats holds per-stage items, busy seconds and throughput.
+    """
+    readers = max(1, min(readers or env.PIPELINE_READERS, len(entries) or 1))
+    batch_size = batch_size or env.PIPELINE_EMBED_BATCH
+    queue_size = queue_size or env.PIPELINE_QUEUE_SIZE
+
+    work_queue = queue.Queue()
+    for position, source in enumerate(entries):
+        work_queue.put((position, source, entries[source]))
+    document_queue = queue.Queue(maxsize=queue_size) # (position, source, metadata, line block queue) or _DONE per reader
+    chunk_queue = queue.Queue(maxsize=queue_size * batch_size) # (position, chunk) or _DONE
+
+    stats = {name: StageStats(name) for name in ("read", "chunk", "embed")}
+    stop = threading.Event()
+    errors = []
+    results = [] # (position, order, chunk, vector)
+
+    def fail(stage, e):
+        if not isinstance(e, _Aborted):
+            logger.exception(f"Build pipeline {stage} stage failed: {e}")
+            errors.append(e)
+        stop.set()
+
+    def read_worker():
+        try:
+            while True:
+                try:
+                    position, source, entry = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                started = time.perf_counter()
+                try:
+                    lines = iter_document_lines(entry["path"])
+                    block = list(itertools.islice(lines, _LINE_BLOCK)) # Open/format errors surface here
+                except Exception as e:
+                    stats["read"].add(1, time.perf_counter() - started)
+                    logger.error(f"Failed to ingest '{source}' ({entry['path']}): {e}")
+                    continue
+                # The chunker consumes this document's lines while the rest is still being read;
+                # a read error after this point fails the build rather than leaving a truncated document
+                line_queue = queue.Queue(maxsize=_LINE_BLOCKS_IN_FLIGHT)
+                metadata = {"source": source, "path": entry["path"], "type": entry["type"]}
+                read_seconds = time.perf_counter() - started
+                _put(document_queue, (position, source, metadata, line_queue), stop)
+                while block:
+                    _put(line_queue, block, stop)
+                    started = time.perf_counter()
+                    block = list(itertools.islice(lines, _LINE_BLOCK))
+                    read_seconds += time.perf_counter() - started
+                _put(line_queue, _DONE, stop)
+                stats["read"].add(1, read_seconds)
+            _put(document_queue, _DONE, stop)
+        except Exception as e:
+            fail("read", e)
+
+    def chunk_worker():
+        try:
+            finished_readers = 0
+            while finished_readers < readers:
+                item = _get(document_queue, stop)
+                if item is _DONE:
+                    finished_readers += 1
+                    continue
+                position, source, metadata, line_queue = item
+                started, produced = time.perf_counter(), 0
+
+                def document_lines():
+                    nonlocal started
+                    while True:
+                        waited = time.perf_counter()
+                        block = _get(line_queue, stop)
+                        started += time.perf_counter() - waited # Waiting on the reader isn't chunking time
+                        if block is _DONE:
+                            return
+                        yield from block
+
+                document = {"lines": document_lines(), "metadata": metadata}
+                for chunk in iter_chunks({source: document}, chunk_size=chunk_size, overlap=overlap):
+                    produced += 1
+                    waited = time.perf_counter()
+                    _put(chunk_queue, (position, chunk), stop)
+                    started += time.perf_counter() - waited # Don't count back-pressure as chunking time
+                stats["chunk"].add(produced, time.perf_counter() - started)
+            _put(chunk_queue, _DONE, stop)
+        except Exception as e:
+            fail("chunk", e)
+
+    def embed_worker():
+        try:
+            batch, order = [], 0
+            while True:
+                item = _get(chunk_queue, stop)
+                if item is not _DONE:
+                    batch.append(item)
+                if batch and (len(batch) >= batch_size or item is _DONE):
+                    started = time.perf_counter()
+                    vectors = embed_fn([chunk for _, chunk in batch]) if embed_fn is not None else [None] * len(batch)
+                    if embed_fn is not None:
+                        stats["embed"].add(len(batch), time.perf_counter() - started)
+                    for (position, chunk), vector in zip(batch, vectors):
+                        results.append((position, order, chunk, vector))
+                        order += 1
+                    batch = []
+                if item is _DONE:
+                    break
+        except Exception as e:
+            fail("embed", e)
+
+    wall_started = time.perf_counter()
+    threads = [threading.Thread(target=read_worker, name=f"shadow-read-{i}", daemon=True) for i in range(readers)]
+    threads.append(threading.Thread(target=chunk_worker, name="shadow-chunk", daemon=True))
+    threads.append(threading.Thread(target=embed_worker, name="shadow-embed", daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    # Readers finish documents out of order; restore corpus order (chunk order within a document is kept)
+    results.sort(key=lambda result: (result[0], result[1]))
+    chunks = [result[2] for result in results]
+    embeddings = None
+    if embed_fn is not None:
+        embeddings = np.empty((len(results), np.asarray(results[0][3]).size if results else 0), dtype=np.float32)
+        for row, result in enumerate(results):
+            embeddings[row] = result[3]
+
+    report = {name: stage.as_dict() for name, stage in stats.items()}
+    report["wall_seconds"] = round(time.perf_counter() - wall_started, 3)
+    report["readers"] = readers
+    logger.info(f"Build pipeline: {len(entries)} documents -> {len(chunks)} chunks in {report['wall_seconds']}s "
+                f"(read {report['read']['per_second']} docs/s, chunk {report['chunk']['per_second']} chunks/s, "
+                f"embed {report['embed']['per_second']} chunks/s)")
+    return chunks, embeddings, report
+
+# --- END OF FILE src/data_processing/pipeline.py ---
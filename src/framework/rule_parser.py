@@ -0,0 +1,338 @@
+# --- START OF FILE src/framework/rule_parser.py ---
+# Parses the Response Framework ("Rule N: If ..., respond ...") and compiles the rules
+# into a single matcher:
+#   * one Aho-Corasick automaton over every quoted phrase trigger ("Omega Echo",
+#     "Ghost Key 27", "starts with" triggers, time-sensitive topics), and
+#   * a per-level bucket index of topic keywords for "If a Level-N agent asks about ..." rules.
+# Matching a query is then one pass over its characters plus one pass over its tokens,
+# regardless of how many rules the framework file contains.
+
+import re
+import math
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Curly quotes are used inconsistently in the framework file; fold them to ASCII first
+_QUOTE_TABLE = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+_RULE_LINE = re.compile(r"^\s*Rule\s+(\d+)\s*:\s*(.+?)\s*$")
+# Boundary between the trigger condition and the response instruction
+_CLAUSE_SPLIT = re.compile(r",[\"']?\s+(?=(?:provide|respond|return|explain|suggest|break|redirect)\b)", re.IGNORECASE)
+_RESPONSE_QUOTE = re.compile(r":\s*\"(.+)\"\s*\.?\s*$")
+_LEVEL_AGENT = re.compile(r"^If an? Level-(\d+) agent (?:asks about|inquires about|tries to access|asks)\s+(.+)$", re.IGNORECASE)
+# The closing quote may have been consumed by _CLAUSE_SPLIT (e.g. 'starts with "The bridge is burning,"')
+_STARTS_WITH = re.compile(r"\bstarts with\s+\"(.+?)(?:\"|$)", re.IGNORECASE)
+_QUOTED_PHRASE = re.compile(r"[\"'](.+?)(?:[\"']|$)")
+_LEVEL_QUERY = re.compile(r"\bin a Level-(\d+) query\b", re.IGNORECASE)
+_TIME_CONDITION = re.compile(r"\b(after|before)\s+(\d+\s*(?:AM|PM)\s+UTC)\b", re.IGNORECASE)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an the about of for in on to and or with without at by from into their his her its my your our "
+    "how what when where which who why do does did is are was were be can could should would i me we "
+    "tell explain give".split()
+)
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ions", "ion", "ies", "es", "ed", "ly", "s", "e")
+
+# ======================================================================
+# TEXT NORMALIZATION
+# ======================================================================
+def normalize_text(text: str) -> str:
+    """Casefold, fold curly quotes and collapse whitespace (used for phrase matching)."""
+    return re.sub(r"\s+", " ", text.translate(_QUOTE_TABLE)).strip().casefold()
+
+def _clean_phrase(phrase: str) -> str:
+    """Normalize a trigger phrase and drop trailing punctuation so "Who controls RAW?" also matches without '?'."""
+    return normalize_text(phrase).strip(" \"'").rstrip(" ,.;:!?")
+
+def stem(word: str) -> str:
+    """Crude suffix stripper, just enough for 'handling'/'handle' or 'verifying'/'verify' to agree."""
+    for _ in range(2):
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+                break
+        else:
+            break
+    return word
+
+def keyword_stems(text: str) -> List[str]:
+    """Distinct content-word stems of a text, in order of first appearance."""
+    stems = []
+    for token in _TOKEN.findall(normalize_text(text)):
+        if token in _STOPWORDS:
+            continue
+        token_stem = stem(token)
+        if token_stem not in stems:
+            stems.append(token_stem)
+    return stems
+
+# ======================================================================
+# PARSING
+# ======================================================================
+def _parse_rule_line(rule_number: int, body: str) -> Optional[Dict[str, Any]]:
+    text = body.translate(_QUOTE_TABLE)
+    split_match = _CLAUSE_SPLIT.search(text)
+    if not split_match:
+        logger.warning(f"Rule {rule_number}: could not separate condition from response, skipping: {body}")
+        return None
+    condition = text[:split_match.start()].strip()
+    instruction = text[split_match.end():].strip()
+
+    # --- Response side ---
+    quote_match = _RESPONSE_QUOTE.search(instruction)
+    if quote_match:
+        response_value = quote_match.group(1).strip()
+        response_type = "access_denied" if response_value.lower().startswith("access denied") else "direct_quote"
+    else:
+        response_value = instruction
+        response_type = "style_guide"
+
+    # --- Trigger side ---
+    rule: Dict[str, Any] = {"rule_number": rule_number, "level": None, "keywords": [], "text": body}
+    level_match = _LEVEL_AGENT.match(condition)
+    starts_match = _STARTS_WITH.search(condition)
+    time_match = _TIME_CONDITION.search(condition)
+    phrase_match = _QUOTED_PHRASE.search(condition)
+
+    if level_match:
+        topic = level_match.group(2).strip(" \"'.,")
+        rule.update(trigger_type="level_topic", trigger_value=topic, level=int(level_match.group(1)))
+        rule["keywords"] = keyword_stems(topic)
+    elif starts_match:
+        rule.update(trigger_type="starts_with", trigger_value=starts_match.group(1).strip())
+    elif time_match and phrase_match:
+        rule.update(trigger_type="time_sensitive_topic",
+                    trigger_value=f"{phrase_match.group(1).strip()}|{time_match.group(1)} {time_match.group(2)}")
+        response_type = "time_based"
+    elif phrase_match:
+        rule.update(trigger_type="phrase", trigger_value=phrase_match.group(1).strip())
+        level_query_match = _LEVEL_QUERY.search(condition)
+        if level_query_match:
+            rule["level"] = int(level_query_match.group(1))
+    else:
+        logger.warning(f"Rule {rule_number}: unrecognized trigger condition, skipping: {condition}")
+        return None
+
+    rule.update(response_type=response_type, response_value=response_value)
+    return rule
+
+def parse_rules(response_framework_path: str) -> List[Dict[str, Any]]:
+    """
+    Parse the Response Framework document into rule dictionaries.
+
+    Args:
+        response_framework_path (str): Path to Response_Framework.txt
+
+    Returns:
+        list: Rules with keys rule_number, trigger_type ('phrase', 'starts_with',
+            'time_sensitive_topic', 'level_topic'), trigger_value, level (int or None),
+            keywords, response_type ('direct_quote', 'access_denied', 'time_based',
+            'style_guide'), response_value and the original text
+    """
+    rules = []
+    with open(response_framework_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line_match = _RULE_LINE.match(line)
+            if not line_match:
+                continue
+            rule = _parse_rule_line(int(line_match.group(1)), line_match.group(2))
+            if rule:
+                rules.append(rule)
+    logger.info(f"Parsed {len(rules)} rules from {response_framework_path}")
+    return rules
+
+# ======================================================================
+# AHO-CORASICK AUTOMATON
+# ======================================================================
+class AhoCorasick:
+    """
+    Multi-pattern string matcher: finds every occurrence of every pattern in one scan.
+
+    Args:
+        patterns (list): Pattern strings (already normalized)
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            self._insert(pattern, pattern_id)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str, pattern_id: int) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern_id)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                # Inherit matches that end at the failure state (suffix patterns)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str):
+        """
+        Yield (pattern_id, start, end) for every pattern occurrence in text.
+
+        Args:
+            text (str): Text to scan (normalized the same way as the patterns)
+        """
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern_id in self._output[state]:
+                end = position + 1
+                yield pattern_id, end - len(self.patterns[pattern_id]), end
+
+# ======================================================================
+# COMPILED RULE SET
+# ======================================================================
+def _required_hits(keyword_count: int) -> int:
+    """Keywords a query must share with a topic rule: all of short topics, ~75% of long ones."""
+    if keyword_count <= 2:
+        return keyword_count
+    return max(2, math.ceil(0.75 * keyword_count))
+
+class CompiledRuleSet:
+    """
+    Rules compiled for single-pass matching. Behaves like the parsed rule list
+    (len/iteration/truthiness) so existing checks keep working.
+
+    Args:
+        rules (list): Rule dictionaries from parse_rules
+    """
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        self.rules = list(rules)
+        phrase_ids: Dict[str, int] = {}
+        self._pattern_rules: List[List[Tuple[int, bool]]] = [] # pattern id -> [(rule index, anchored)]
+        self._level_buckets: Dict[int, Dict[str, List[int]]] = {} # level -> keyword stem -> [rule index]
+        self._required: Dict[int, int] = {}
+
+        for rule_index, rule in enumerate(self.rules):
+            trigger_type = rule.get("trigger_type")
+            if trigger_type in ("phrase", "starts_with", "time_sensitive_topic"):
+                phrase = _clean_phrase(rule.get("trigger_value", "").split("|", 1)[0])
+                if not phrase:
+                    continue
+                if phrase not in phrase_ids:
+                    phrase_ids[phrase] = len(phrase_ids)
+                    self._pattern_rules.append([])
+                self._pattern_rules[phrase_ids[phrase]].append((rule_index, trigger_type == "starts_with"))
+            elif trigger_type == "level_topic" and rule.get("keywords"):
+                bucket = self._level_buckets.setdefault(rule.get("level"), {})
+                for keyword in rule["keywords"]:
+                    bucket.setdefault(keyword, []).append(rule_index)
+                self._required[rule_index] = _required_hits(len(rule["keywords"]))
+
+        self._automaton = AhoCorasick(list(phrase_ids))
+        logger.info(f"Compiled {len(self.rules)} rules: {len(phrase_ids)} phrase patterns, "
+                    f"topic buckets for levels {sorted(self._level_buckets)}")
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def match(self, query: str, agent_level: int) -> Optional[Dict[str, Any]]:
+        """
+        Find the framework rule that applies to a query.
+
+        Phrase-style triggers win over level topic rules; among phrase matches the lowest
+        rule number wins, among topic rules the best keyword coverage (then lowest number).
+
+        Args:
+            query (str): Raw user query
+            agent_level (int): Numeric clearance level of the agent
+
+        Returns:
+            dict or None: The matched rule
+        """
+        text = normalize_text(query).lstrip(" \"'")
+
+        best_phrase_rule = None
+        for pattern_id, start, end in self._automaton.iter_matches(text):
+            # Phrases must sit on word boundaries ("omega echo" should not fire inside "omega echoes")
+            if (start > 0 and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+                continue
+            for rule_index, anchored in self._pattern_rules[pattern_id]:
+                rule = self.rules[rule_index]
+                if anchored and start != 0:
+                    continue
+                if rule.get("level") is not None and rule["level"] != agent_level:
+                    continue
+                if best_phrase_rule is None or rule["rule_number"] < best_phrase_rule["rule_number"]:
+                    best_phrase_rule = rule
+        if best_phrase_rule is not None:
+            return best_phrase_rule
+
+        bucket = self._level_buckets.get(agent_level)
+        if not bucket:
+            return None
+        hits: Dict[int, int] = {}
+        for keyword in keyword_stems(query):
+            for rule_index in bucket.get(keyword, ()):
+                hits[rule_index] = hits.get(rule_index, 0) + 1
+
+        best_topic_rule, best_key = None, None
+        for rule_index, hit_count in hits.items():
+            if hit_count < self._required[rule_index]:
+                continue
+            rule = self.rules[rule_index]
+            key = (hit_count / len(rule["keywords"]), hit_count, -rule["rule_number"])
+            if best_key is None or key > best_key:
+                best_topic_rule, best_key = rule, key
+        return best_topic_rule
+
+def compile_rules(rules: List[Dict[str, Any]]) -> CompiledRuleSet:
+    """Compile parsed rules into a CompiledRuleSet."""
+    return CompiledRuleSet(rules)
+
+# Most recent compilation of a plain rule list, so list callers don't recompile per query
+_last_compiled: Optional[Tuple[List[Dict[str, Any]], CompiledRuleSet]] = None
+
+def match_rule_to_query(rules, query: str, agent_level: int) -> Optional[Dict[str, Any]]:
+    """
+    Match a query against the framework rules.
+
+    Args:
+        rules (CompiledRuleSet or list): Compiled rules (preferred) or the parsed rule list
+        query (str): The user query
+        agent_level (int): Numeric clearance level of the agent
+
+    Returns:
+        dict or None: The matched rule
+    """
+    global _last_compiled
+    if not isinstance(rules, CompiledRuleSet):
+        if _last_compiled is None or _last_compiled[0] is not rules:
+            _last_compiled = (rules, CompiledRuleSet(rules))
+        rules = _last_compiled[1]
+    return rules.match(query, agent_level)
+
+# --- END OF FILE src/framework/rule_parser.py ---
@@ -0,0 +1,194 @@
+# --- START OF FILE src/retrieval/chunk_store.py ---
+# Columnar storage for the chunk corpus. Instead of one dict (plus a metadata dict) per chunk:
+#   - all chunk texts live in one UTF-8 buffer, row i being buffer[offsets[i]:offsets[i + 1]]
+#   - source / section / doc_type are small int codes into interned string tables
+#   - security levels are an int16 array
+# Rows are read through ChunkView, a __slots__ object that answers the same chunk["text"] /
+# chunk.get("metadata", {}) lookups as the old dicts, so callers work with either form.
+
+import sys
+import logging
+import numpy as np
+from collections.abc import Mapping
+
+logger = logging.getLogger(__name__)
+
+class ChunkView(Mapping):
+    """
+    Read-only view of one chunk row (optionally with the similarity of a search hit).
+
+    Behaves like the chunk dict {"id", "text", "metadata"[, "similarity"]}; the attributes
+    (text, source, security_level, ...) read the columns directly without building dicts.
+    Pickles as a plain dict, so results sent to worker processes don't drag the store along.
+    """
+
+    __slots__ = ("store", "row", "similarity")
+
+    def __init__(self, store, row, similarity=None):
+        self.store = store
+        self.row = row
+        self.similarity = similarity
+
+    @property
+    def id(self):
+        return self.store.ids[self.row]
+
+    @property
+    def text(self):
+        return self.store.text(self.row)
+
+    @property
+    def source(self):
+        return self.store.source_values[self.store.source_codes[self.row]]
+
+    @property
+    def section(self):
+        return self.store.section_values[self.store.section_codes[self.row]]
+
+    @property
+    def doc_type(self):
+        return self.store.doc_type_values[self.store.doc_type_codes[self.row]]
+
+    @property
+    def security_level(self):
+        return int(self.store.security_levels[self.row])
+
+    @property
+    def metadata(self):
+        return self.store.metadata(self.row)
+
+    def __getitem__(self, key):
+        if key == "text":
+            return self.text
+        if key == "metadata":
+            return self.metadata
+        if key == "id":
+            return self.id
+        if key == "similarity" and self.similarity is not None:
+            return self.similarity
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from ("id", "text", "metadata")
+        if self.similarity is not None:
+            yield "similarity"
+
+    def __len__(self):
+        return 3 if self.similarity is None else 4
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __reduce__(self):
+        return (dict, (self.to_dict(),))
+
+    def __repr__(self):
+        return f"ChunkView(row={self.row}, source={self.source!r}, security_level={self.security_level}, similarity={self.similarity})"
+
+class ChunkStore:
+    """
+    Immutable columnar chunk corpus; a sequence of ChunkView (row i matches row i of the embedding matrix).
+
+    Args:
+        chunks (iterable): Chunk dicts {"id", "text", "metadata"} or ChunkViews. Metadata keys
+            other than source / section / doc_type / security_level are not kept; a missing
+            security_level is stored as 1 (the default filter_by_clearance applies).
+    """
+
+    def __init__(self, chunks):
+        ids, encoded = [], []
+        tables = {"source": {}, "section": {}, "doc_type": {}}
+        codes = {name: [] for name in tables}
+        levels = []
+        for chunk in chunks:
+            if isinstance(chunk, ChunkView):
+                store, row = chunk.store, chunk.row
+                ids.append(store.ids[row])
+                encoded.append(store.text_bytes(row))
+                metadata = store.metadata(row)
+            else:
+                ids.append(chunk.get("id"))
+                encoded.append(chunk.get("text", "").encode("utf-8"))
+                metadata = chunk.get("metadata", {})
+            for name, table in tables.items():
+                value = metadata.get(name)
+                if isinstance(value, str):
+                    value = sys.intern(value)
+                codes[name].append(table.setdefault(value, len(table)))
+            levels.append(metadata.get("security_level", 1))
+
+        self.count = len(ids)
+        self.ids = ids
+        self._buffer = b"".join(encoded)
+        self.offsets = np.zeros(self.count + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=self.count), out=self.offsets[1:])
+        del encoded
+        self.source_values, self.source_codes = list(tables["source"]), np.asarray(codes["source"], dtype=np.int32)
+        self.section_values, self.section_codes = list(tables["section"]), np.asarray(codes["section"], dtype=np.int32)
+        self.doc_type_values, self.doc_type_codes = list(tables["doc_type"]), np.asarray(codes["doc_type"], dtype=np.int32)
+        self.security_levels = np.asarray(levels, dtype=np.int16)
+        logger.info("Chunk store: %d chunks, %.1f MB of text, %d sources, %d sections.",
+                    self.count, len(self._buffer) / 1e6, len(self.source_values), len(self.section_values))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ChunkView(self, row) for row in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(f"Chunk row {index} out of range ({self.count} chunks).")
+        return ChunkView(self, index)
+
+    def __iter__(self):
+        return (ChunkView(self, row) for row in range(self.count))
+
+    @property
+    def nbytes(self):
+        return int(len(self._buffer) + self.offsets.nbytes + self.source_codes.nbytes + self.section_codes.nbytes
+                   + self.doc_type_codes.nbytes + self.security_levels.nbytes)
+
+    def text_bytes(self, row):
+        return self._buffer[self.offsets[row]:self.offsets[row + 1]]
+
+    def text(self, row):
+        return self.text_bytes(row).decode("utf-8")
+
+    def texts(self):
+        """Every chunk text in row order (e.g. for embedding)."""
+        return [self.text(row) for row in range(self.count)]
+
+    def metadata(self, row):
+        """The chunk's metadata as a new dict (keys whose value was missing are left out)."""
+        metadata = {"source": self.source_values[self.source_codes[row]],
+                    "doc_type": self.doc_type_values[self.doc_type_codes[row]],
+                    "section": self.section_values[self.section_codes[row]]}
+        metadata = {key: value for key, value in metadata.items() if value is not None}
+        metadata["security_level"] = int(self.security_levels[row])
+        return metadata
+
+    def codes(self, name):
+        """(code column, value table) of 'source', 'section' or 'doc_type'."""
+        return getattr(self, f"{name}_codes"), getattr(self, f"{name}_values")
+
+    def views(self, rows, similarities=None):
+        """ChunkViews for rows (ascending or ranked), carrying the matching similarities if given."""
+        if similarities is None:
+            return [ChunkView(self, row) for row in rows]
+        return [ChunkView(self, row, similarity) for row, similarity in zip(rows, similarities)]
+
+def security_levels_of(chunks):
+    """
+    int array of the chunks' security levels (missing levels count as 1).
+
+    Views of one store are read straight from its level column.
+    """
+    if chunks and all(isinstance(chunk, ChunkView) for chunk in chunks):
+        store = chunks[0].store
+        if all(chunk.store is store for chunk in chunks):
+            return store.security_levels[np.fromiter((chunk.row for chunk in chunks), dtype=np.int64, count=len(chunks))]
+    return np.fromiter((chunk.get("metadata", {}).get("security_level", 1) for chunk in chunks), dtype=np.int64, count=len(chunks))
+
+# --- END OF FILE src/retrieval/chunk_store.py ---
@@ -0,0 +1,91 @@
+# --- START OF FILE src/retrieval/embedding_cache.py ---
+# Persistent embedding cache keyed by (model name, sha256 of chunk text).
+# Lets restarts reuse embeddings for unchanged chunks and embed only new/edited ones.
+
+import os
+import re
+import hashlib
+import logging
+import numpy as np
+
+from src.setup import environment as env
+
+logger = logging.getLogger(__name__)
+
+def text_hash(text):
+    """Content hash used as the cache key for a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    On-disk store of embeddings for one model.
+
+    Each model gets its own file (<cache_dir>/embeddings/<model>.npz) holding
+    the text hashes and a float32 matrix of their vectors.
+
+    Args:
+        model_name (str): Embedding model the vectors were produced with
+        cache_dir (str): Root cache directory (defaults to SHADOW_CACHE_DIR)
+    """
+
+    def __init__(self, model_name, cache_dir=None):
+        self.model_name = model_name
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = os.path.join(cache_dir or env.CACHE_DIR, "embeddings", f"{safe_name}.npz")
+        self._vectors = {}
+        self._dirty = False
+        self.load()
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def __contains__(self, key):
+        return key in self._vectors
+
+    def load(self):
+        """Read the cache file if present (a corrupt file is ignored and rebuilt)."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                keys, vectors = data["keys"], data["vectors"]
+            self._vectors = {str(k): vectors[i] for i, k in enumerate(keys)}
+            logger.info(f"Loaded {len(self._vectors)} cached embeddings for '{self.model_name}' from {self.path}")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding cache {self.path}: {e}")
+            self._vectors = {}
+
+    def get(self, key):
+        return self._vectors.get(key)
+
+    def put(self, key, vector):
+        self._vectors[key] = np.asarray(vector, dtype=np.float32)
+        self._dirty = True
+
+    def prune(self, keep_keys):
+        """Drop entries for text that is no longer in the corpus, keeping the file bounded."""
+        keep_keys = set(keep_keys)
+        stale = [k for k in self._vectors if k not in keep_keys]
+        for k in stale:
+            del self._vectors[k]
+        if stale:
+            self._dirty = True
+            logger.info(f"Pruned {len(stale)} stale embeddings from cache.")
+
+    def save(self):
+        """Write the cache atomically (tmp file + rename) if anything changed."""
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        keys = list(self._vectors)
+        if keys:
+            vectors = np.stack([self._vectors[k] for k in keys]).astype(np.float32, copy=False)
+        else:
+            vectors = np.empty((0, 0), dtype=np.float32)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}.npz" # Per process: app, server and CLI may save concurrently
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), vectors=vectors)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        logger.info(f"Saved {len(keys)} embeddings to cache {self.path}")
+
+# --- END OF FILE src/retrieval/embedding_cache.py ---
@@ -1,56 +1,348 @@
+import os
+import re
+import time
+import logging
+import tempfile
+import threading
+import multiprocessing
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import ProcessPoolExecutor
+
+from src.setup import environment as env
+from src.retrieval.embedding_cache import text_hash
+from src.retrieval.lru_cache import LRUCache
+from src.retrieval.chunk_store import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+# Name of the embedding model
+MODEL_NAME = env.EMBEDDING_MODEL
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+# Identity of the vectors this process produces; part of every embedding cache key and corpus
+# fingerprint. ONNX float32 matches PyTorch to float tolerance, so both share the plain model
+# name. Each int8 graph (one per SHADOW_ONNX_QUANTIZATION config: avx2, avx512_vnni, ...) produces
+# different vectors and gets its own key, so stores and indexes built with one (or with float32 when
+# switching back) are rebuilt automatically instead of being mixed.
+MODEL_KEY = f"{MODEL_NAME}:onnx_int8:{env.ONNX_QUANTIZATION}" if env.EMBEDDING_BACKEND == "onnx_int8" else MODEL_NAME
 
 # Global model instance
 _model = None
+_model_lock = threading.Lock() # The warm-up thread and the first query may ask for the model at the same time
+
+# Query embeddings keyed by (model name, normalized query); agents repeat the same questions a lot
+_query_cache = LRUCache(maxsize=env.QUERY_CACHE_SIZE, ttl=env.QUERY_CACHE_TTL)
 
 def get_model():
     """
     Initialize and return the embedding model (lazy loading).
-    
+
     Returns:
-        SentenceTransformer: The embedding model
+        SentenceTransformer: The embedding model on the configured backend (SHADOW_EMBEDDING_BACKEND)
     """
     global _model
     if _model is None:
-        # Using a smaller model suitable for deployment
-        _model = SentenceTransformer('all-MiniLM-L6-v2')
+        with _model_lock:
+            if _model is None:
+                # Using a smaller model suitable for deployment
+                _model = _load_model(env.EMBEDDING_BACKEND)
     return _model
 
-def get_embeddings(chunks):
+def is_model_loaded():
+    return _model is not None
+
+def _onnx_model_kwargs(threads):
+    """ONNX Runtime options: CPU provider and intra-op thread count (0 = library default)."""
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError("ONNX embedding backends require ONNX Runtime (pip install sentence-transformers[onnx]).") from e
+    model_kwargs = {"provider": "CPUExecutionProvider"}
+    if threads > 0:
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1 # Encoder graphs are sequential; extra inter-op threads only contend
+        model_kwargs["session_options"] = session_options
+    return model_kwargs
+
+def _load_model(backend, threads=None):
+    """
+    Load the embedding model on one of EMBEDDING_BACKENDS with threads intra-op threads
+    (defaults to SHADOW_EMBEDDING_THREADS).
+
+    onnx_int8 dynamically quantizes the exported ONNX graph once and keeps it under
+    SHADOW_CACHE_DIR/onnx, so later starts load the int8 graph directly.
+    sentence_transformers (and torch) are imported here rather than at module load, so
+    importing the backend stays cheap and the cost lands on whoever loads the model first.
+    """
+    from sentence_transformers import SentenceTransformer
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}.")
+    threads = env.EMBEDDING_THREADS if threads is None else threads
+    if backend == "torch":
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(MODEL_NAME)
+    elif backend == "onnx":
+        model = SentenceTransformer(MODEL_NAME, backend="onnx", model_kwargs=_onnx_model_kwargs(threads))
+    else:
+        model_kwargs = _onnx_model_kwargs(threads)
+        export_dir = os.path.join(env.CACHE_DIR, "onnx", re.sub(r"[^A-Za-z0-9_.-]+", "_", MODEL_NAME))
+        file_name = f"onnx/model_qint8_{env.ONNX_QUANTIZATION}.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            logger.info(f"Exporting int8 ONNX graph for {MODEL_NAME} ({env.ONNX_QUANTIZATION}) to {export_dir}...")
+            exported = SentenceTransformer(MODEL_NAME, backend="onnx")
+            exported.save(export_dir)
+            export_dynamic_quantized_onnx_model(exported, env.ONNX_QUANTIZATION, export_dir)
+        model = SentenceTransformer(export_dir, backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name})
+    logger.info(f"Loaded embedding model {MODEL_NAME} on the '{backend}' backend"
+                f" ({threads or 'default'} threads, vector key '{MODEL_KEY}').")
+    return model
+
+def _token_lengths(model, texts):
+    """
+    Token count of each text as the model will see it (capped at its max sequence length).
+
+    Falls back to a ~4 characters per token estimate for models without a tokenizer.
+    """
+    max_length = getattr(model, "max_seq_length", None) or 512
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is not None:
+        try:
+            encoded = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_length)["input_ids"]
+            return np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(texts))
+        except Exception as e:
+            logger.debug(f"Tokenizer length estimate failed, using character estimate: {e}")
+    return np.minimum(np.fromiter((len(text) // 4 + 2 for text in texts), dtype=np.int64, count=len(texts)), max_length)
+
+def _length_buckets(lengths, token_budget, max_batch_size):
+    """
+    Group row positions into batches of similar token length.
+
+    Rows are taken longest first; a batch is closed once adding a row would make
+    (rows x longest row) - the padded size the model actually computes - exceed token_budget.
+
+    Returns:
+        list: One np.ndarray of row positions per batch
+    """
+    order = np.argsort(-lengths, kind="stable")
+    batches, start = [], 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch_size, token_budget // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+def _embedding_dim(model):
+    dim = getattr(model, "get_sentence_embedding_dimension", lambda: None)()
+    return int(dim) if dim else int(np.asarray(model.encode(["dimension probe"])).shape[-1])
+
+def _encode_batches(model, texts, batches):
+    """Encode texts batch by batch in this process into a (len(texts), dim) float32 matrix."""
+    encoded = None
+    for batch in batches:
+        vectors = np.asarray(model.encode([texts[i] for i in batch], batch_size=len(batch)), dtype=np.float32)
+        if encoded is None:
+            encoded = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        encoded[batch] = vectors
+    return encoded
+
+# ======================================================================
+# MULTI-PROCESS ENCODING
+# ======================================================================
+# Per-worker state, set once by _init_encode_worker
+_worker_model = None
+_worker_output = None
+
+def _init_encode_worker(output_path, shape, threads):
+    """Pool initializer: load the model once per worker and map the shared output matrix."""
+    global _worker_model, _worker_output
+    _worker_output = np.memmap(output_path, dtype=np.float32, mode="r+", shape=shape)
+    _worker_model = _load_model(env.EMBEDDING_BACKEND, threads=threads)
+
+def _encode_shard(rows, texts):
+    """Pool task: encode one batch and write it straight into its rows of the shared matrix."""
+    _worker_output[rows] = np.asarray(_worker_model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+    return len(rows)
+
+def _encode_multiprocess(texts, batches, workers, dim):
+    """
+    Encode batches on a pool of worker processes, each holding its own model.
+
+    Workers write into a memory-mapped scratch matrix under SHADOW_CACHE_DIR, so only the
+    input texts are pickled; vectors never travel back through the pool. Workers are spawned
+    (not forked) because forking a process with torch/ONNX thread pools can deadlock.
+
+    Returns:
+        np.ndarray: (len(texts), dim) float32 matrix
+    """
+    threads = env.EMBEDDING_THREADS or max(1, (os.cpu_count() or 1) // workers) # Don't oversubscribe cores
+    os.makedirs(env.CACHE_DIR, exist_ok=True)
+    fd, output_path = tempfile.mkstemp(prefix="encode-", suffix=".f32", dir=env.CACHE_DIR)
+    os.close(fd)
+    try:
+        output = np.memmap(output_path, dtype=np.float32, mode="w+", shape=(len(texts), dim))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_encode_worker, initargs=(output_path, output.shape, threads)) as executor:
+            list(executor.map(_encode_shard, batches, [[texts[i] for i in batch] for batch in batches]))
+        encoded = np.array(output) # Copy out so the scratch file can be removed
+        del output
+        return encoded
+    finally:
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+
+def get_embeddings(chunks, cache=None, token_budget=None, max_batch_size=None, workers=None):
     """
     Generate embeddings for document chunks.
-    
+
+    Chunks that need the model are sorted by token length and encoded in batches
+    sized by a padded-token budget rather than a fixed count, so short chunks are
+    batched widely and never padded up to long ones. Large jobs are sharded across
+    SHADOW_EMBED_WORKERS processes (see _encode_multiprocess); smaller ones, or any
+    failure of the pool, use the single in-process model.
+
     Args:
         chunks (list): List of document chunks
-        
+        cache (EmbeddingCache): Optional persistent cache; only chunks whose text
+            is not cached are sent through the model
+        token_budget (int): Padded tokens per model call (defaults to SHADOW_EMBED_TOKEN_BUDGET)
+        max_batch_size (int): Upper bound on rows per model call (defaults to SHADOW_EMBED_MAX_BATCH)
+        workers (int): Encoding processes (defaults to SHADOW_EMBED_WORKERS; <= 1 stays in-process)
+
     Returns:
-        list: List of embedding vectors corresponding to chunks
+        np.ndarray: (len(chunks), dim) float32 matrix, row i for chunks[i]
     """
-    model = get_model()
-    texts = [chunk["text"] for chunk in chunks]
-    
-    # Generate embeddings in batches to avoid memory issues
-    embeddings = []
-    batch_size = 16
-    
-    for i in range(0, len(texts), batch_size):
-        batch_texts = texts[i:i+batch_size]
-        batch_embeddings = model.encode(batch_texts)
-        embeddings.extend(batch_embeddings)
-    
-    print(f"Generated {len(embeddings)} embeddings")
+    texts = chunks.texts() if isinstance(chunks, ChunkStore) else [chunk["text"] for chunk in chunks]
+    embeddings = None # Allocated once the dimension is known
+
+    def store(row, vector):
+        nonlocal embeddings
+        if embeddings is None:
+            embeddings = np.empty((len(texts), np.asarray(vector).size), dtype=np.float32)
+        embeddings[row] = vector
+
+    # Reuse cached vectors and collect the texts that still need embedding
+    keys = [text_hash(text) for text in texts] if cache is not None else []
+    missing = []
+    for i in range(len(texts)):
+        cached = cache.get(keys[i]) if cache is not None else None
+        if cached is not None:
+            store(i, cached)
+        else:
+            missing.append(i)
+    if cache is not None:
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} chunks to embed.")
+
+    # Encode length-sorted, token-budgeted batches straight into their rows of the matrix
+    started = time.perf_counter()
+    if missing:
+        model = get_model()
+        missing_texts = [texts[i] for i in missing]
+        lengths = _token_lengths(model, missing_texts)
+        batches = _length_buckets(lengths, token_budget or env.EMBED_TOKEN_BUDGET, max_batch_size or env.EMBED_MAX_BATCH)
+        workers = min(env.EMBED_WORKERS if workers is None else workers, len(batches))
+
+        encoded = None
+        if workers > 1 and len(missing) >= env.EMBED_PARALLEL_MIN_CHUNKS:
+            try:
+                encoded = _encode_multiprocess(missing_texts, batches, workers, _embedding_dim(model))
+            except Exception as e:
+                logger.warning(f"Multi-process encoding failed, encoding in this process instead: {e}")
+        if encoded is None:
+            workers = 1
+            encoded = _encode_batches(model, missing_texts, batches)
+
+        for i, embedding in zip(missing, encoded):
+            store(i, embedding)
+            if cache is not None:
+                cache.put(keys[i], embedding)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Encoded {len(missing)} chunks in {len(batches)} length-bucketed batches on {workers} process(es) "
+                    f"({len(missing) / elapsed if elapsed > 0 else float('inf'):.1f} chunks/s).")
+
+    logger.info("Generated %d embeddings (%d from cache)", len(missing), len(texts) - len(missing))
+    if embeddings is None:
+        return np.empty((len(texts), 0), dtype=np.float32)
     return embeddings
 
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query, used as a cache key."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
 def get_query_embedding(query):
     """
-    Generate embedding for a query.
+    Generate embedding for a query (served from the LRU cache when possible).
     
     Args:
         query (str): The query text
         
     Returns:
-        np.ndarray: The embedding vector
+        np.ndarray: The embedding vector (read-only; copy before modifying)
     """
+    key = (MODEL_KEY, normalize_query(query))
+    embedding = _query_cache.get(key)
+    if embedding is not None:
+        return embedding
+
     model = get_model()
-    return model.encode(query)
\ No newline at end of file
+    embedding = np.asarray(model.encode(query), dtype=np.float32)
+    embedding.flags.writeable = False # Shared between callers through the cache
+    _query_cache.put(key, embedding)
+    return embedding
+
+def get_query_embeddings(queries, batch_size=128):
+    """
+    Generate embeddings for many queries with as few model calls as possible.
+
+    Cached queries are served from the LRU; the remaining distinct queries are
+    encoded together in large batches.
+
+    Args:
+        queries (list): Query strings
+        batch_size (int): Model batch size
+
+    Returns:
+        np.ndarray: (len(queries), dim) float32 matrix, row i for queries[i]
+    """
+    keys = [(MODEL_KEY, normalize_query(query)) for query in queries]
+    vectors = [_query_cache.get(key) for key in keys]
+
+    # Encode each distinct uncached query once
+    to_encode = {}
+    for i, (key, vector) in enumerate(zip(keys, vectors)):
+        if vector is None and key not in to_encode:
+            to_encode[key] = i
+    if to_encode:
+        model = get_model()
+        encoded = np.asarray(model.encode([queries[i] for i in to_encode.values()], batch_size=batch_size), dtype=np.float32)
+        for key, embedding in zip(to_encode, encoded):
+            embedding = embedding.copy()
+            embedding.flags.writeable = False
+            _query_cache.put(key, embedding)
+            to_encode[key] = embedding
+        vectors = [vector if vector is not None else to_encode[key] for key, vector in zip(keys, vectors)]
+    logger.info(f"Embedded {len(queries)} queries ({len(to_encode)} encoded, {len(queries) - len(to_encode)} from cache or duplicates).")
+
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack(vectors).astype(np.float32, copy=False)
+
+def get_query_cache_stats():
+    """
+    Hit/miss/eviction counters of the query-embedding cache.
+
+    Returns:
+        dict: size, maxsize, ttl, hits, misses, evictions, expirations, hit_rate
+    """
+    return _query_cache.stats()
+
+def clear_query_cache():
+    """Drop all cached query embeddings (e.g. after switching models)."""
+    _query_cache.clear()
\ No newline at end of file
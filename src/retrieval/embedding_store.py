@@ -0,0 +1,159 @@
+# --- START OF FILE src/retrieval/embedding_store.py ---
+# Single-file embedding matrix opened read-only with np.memmap.
+# Every process on a node maps the same file, so the matrix lives once in the page cache
+# instead of once per Streamlit/server worker.
+#
+# File layout (little endian):
+#   bytes 0-7     magic b"SHDWEMB1"
+#   bytes 8-11    uint32 format version
+#   bytes 12-15   uint32 dtype code (see _DTYPE_CODES)
+#   bytes 16-23   uint64 dim
+#   bytes 24-31   uint64 count
+#   bytes 32-95   ascii corpus fingerprint (zero padded)
+#   bytes 96-127  reserved
+#   bytes 128-    count x dim row-major matrix
+
+import os
+import struct
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"SHDWEMB1"
+_VERSION = 1
+_HEADER_FORMAT = "<8sIIQQ64s32x"
+HEADER_SIZE = struct.calcsize(_HEADER_FORMAT) # 128 bytes keeps the data page-friendly and aligned
+_DTYPE_CODES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+
+class EmbeddingStore:
+    """
+    Read-only view over an embedding store file.
+
+    Attributes:
+        path (str): File path
+        dim (int): Embedding dimension
+        count (int): Number of rows
+        dtype (np.dtype): Element type of the stored matrix
+        fingerprint (str): Corpus fingerprint recorded at write time
+        matrix (np.memmap): (count, dim) read-only memory map of the data
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"Embedding store {path} is truncated (no header).")
+        magic, version, dtype_code, dim, count, fingerprint = struct.unpack(_HEADER_FORMAT, header)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not an embedding store (bad magic).")
+        if version != _VERSION or dtype_code not in _DTYPE_CODES:
+            raise ValueError(f"Unsupported embedding store version/dtype in {path}: v{version}, dtype {dtype_code}.")
+
+        self.dim, self.count = int(dim), int(count)
+        self.dtype = _DTYPE_CODES[dtype_code]
+        self.fingerprint = fingerprint.rstrip(b"\0").decode("ascii")
+        expected_size = HEADER_SIZE + self.count * self.dim * self.dtype.itemsize
+        if os.path.getsize(path) < expected_size:
+            raise ValueError(f"Embedding store {path} is truncated ({os.path.getsize(path)} < {expected_size} bytes).")
+
+        if self.count == 0 or self.dim == 0:
+            self.matrix = np.empty((self.count, self.dim), dtype=self.dtype)
+        else:
+            self.matrix = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(self.count, self.dim))
+
+    def __len__(self):
+        return self.count
+
+def write_embedding_store(path, matrix, fingerprint="", dtype=np.float32):
+    """
+    Write a matrix to an embedding store file atomically (tmp file + rename).
+
+    Readers that already mapped the old file keep their mapping; new readers see the new file.
+
+    Args:
+        path (str): Target file path
+        matrix (np.ndarray): (count, dim) embedding matrix
+        fingerprint (str): Corpus fingerprint to record in the header
+        dtype: np.float32 or np.float16
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    dtype_code = next((code for code, dt in _DTYPE_CODES.items() if dt == dtype), None)
+    if dtype_code is None:
+        raise ValueError(f"Unsupported embedding store dtype: {dtype}")
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    if matrix.ndim != 2:
+        raise ValueError(f"Embedding store expects a 2-D matrix, got shape {matrix.shape}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    header = struct.pack(_HEADER_FORMAT, _MAGIC, _VERSION, dtype_code, matrix.shape[1], matrix.shape[0],
+                         fingerprint.encode("ascii")[:64])
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        matrix.tofile(f)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote embedding store {path}: {matrix.shape[0]} x {matrix.shape[1]} ({dtype.name})")
+
+def update_embedding_store(path, removed_rows, added, fingerprint=""):
+    """
+    Apply a delete/insert delta to an existing store: rows in removed_rows are dropped
+    (remaining rows keep their order) and added is appended at the end.
+
+    A pure append is written in place, data first and header last, so a reader never sees
+    a count covering rows that are not written yet and existing mappings stay valid.
+    Deletions compact the file through write_embedding_store (tmp file + rename).
+
+    Args:
+        path (str): Store file path
+        removed_rows (list): Row positions to delete
+        added (np.ndarray): (n, dim) rows to append
+        fingerprint (str): Corpus fingerprint of the updated store
+
+    Returns:
+        EmbeddingStore: The updated store, freshly mapped
+    """
+    store = EmbeddingStore(path)
+    added = np.ascontiguousarray(added, dtype=store.dtype).reshape(-1, store.dim)
+    if len(removed_rows) == 0:
+        with open(path, "r+b") as f:
+            f.seek(HEADER_SIZE + store.count * store.dim * store.dtype.itemsize)
+            f.write(added.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            dtype_code = next(code for code, dt in _DTYPE_CODES.items() if dt == store.dtype)
+            f.seek(0)
+            f.write(struct.pack(_HEADER_FORMAT, _MAGIC, _VERSION, dtype_code, store.dim, store.count + len(added),
+                                fingerprint.encode("ascii")[:64]))
+        logger.info(f"Appended {len(added)} rows to embedding store {path} ({store.count + len(added)} total)")
+    else:
+        keep = np.ones(store.count, dtype=bool)
+        keep[np.asarray(removed_rows, dtype=np.int64)] = False
+        write_embedding_store(path, np.concatenate([store.matrix[keep], added]), fingerprint=fingerprint, dtype=store.dtype)
+    return EmbeddingStore(path)
+
+def open_embedding_store(path, fingerprint=None):
+    """
+    Open an embedding store if it exists and matches the expected corpus.
+
+    Args:
+        path (str): Store file path
+        fingerprint (str): Expected corpus fingerprint (None skips the check)
+
+    Returns:
+        EmbeddingStore or None: None when the file is missing, unreadable or stale
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        store = EmbeddingStore(path)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable embedding store {path}: {e}")
+        return None
+    if fingerprint is not None and store.fingerprint != fingerprint:
+        logger.info(f"Embedding store {path} is stale (corpus changed).")
+        return None
+    return store
+
+# --- END OF FILE src/retrieval/embedding_store.py ---
@@ -0,0 +1,372 @@
+# --- START OF FILE src/retrieval/index_backends.py ---
+# Pluggable vector index backends used behind search_similar_chunks.
+# Every backend exposes the same small interface as MatrixSearchEngine:
+#   len(engine), engine.dim, engine.search(query_embedding, k, mask=None) -> (scores, indices)
+
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+
+from src.setup import environment as env
+from src.retrieval.vector_search import MatrixSearchEngine, normalize_embeddings
+from src.retrieval.quantization import QuantizedSearchEngine, build_quantized_engine, save_quantized, load_quantized
+
+logger = logging.getLogger(__name__)
+
+INDEX_BACKENDS = ("matrix", "faiss_flat", "faiss_ivf", "faiss_hnsw")
+_META_FILENAME = "index_meta.json"
+
+def _import_faiss():
+    """Import faiss lazily so the exact 'matrix' backend works without it."""
+    try:
+        import faiss
+    except ImportError as e:
+        raise ImportError("FAISS index backends require the 'faiss-cpu' package (pip install faiss-cpu).") from e
+    return faiss
+
+# ======================================================================
+# FAISS ENGINE
+# ======================================================================
+class FaissSearchEngine:
+    """
+    Inner-product FAISS index over unit-normalized embeddings (i.e. cosine similarity).
+
+    Args:
+        index: A populated faiss index
+        backend (str): One of 'faiss_flat', 'faiss_ivf', 'faiss_hnsw'
+    """
+
+    def __init__(self, index, backend):
+        self.index = index
+        self.backend = backend
+
+    def __len__(self):
+        return self.index.ntotal
+
+    @property
+    def dim(self):
+        return self.index.d
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """Tune the recall/latency trade-off of approximate indexes at query time."""
+        faiss = _import_faiss()
+        if nprobe is not None and self.backend == "faiss_ivf":
+            faiss.extract_index_ivf(self.index).nprobe = max(1, int(nprobe))
+        if ef_search is not None and self.backend == "faiss_hnsw":
+            self.index.hnsw.efSearch = max(1, int(ef_search))
+
+    def _search_params(self, mask):
+        """Search parameters restricting results to the rows set in mask (a faiss ID selector bitmap)."""
+        faiss = _import_faiss()
+        bitmap = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        if self.backend == "faiss_ivf":
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(self.index).nprobe)
+        elif self.backend == "faiss_hnsw":
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.index.hnsw.efSearch)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        params._keepalive = (bitmap, selector) # The selector only holds raw pointers
+        return params
+
+    def search(self, query_embedding, k, mask=None):
+        """
+        Find the k highest-scoring chunks for a query.
+
+        Args:
+            query_embedding (np.ndarray): The query vector (need not be normalized)
+            k (int): Number of results to return
+            mask (np.ndarray): Optional bool array; only True rows are eligible
+
+        Returns:
+            tuple: (scores, indices) as numpy arrays sorted by descending score
+        """
+        k = min(k, len(self) if mask is None else int(np.count_nonzero(mask)))
+        if k <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        query = normalize_embeddings(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))
+        if mask is None:
+            scores, indices = self.index.search(query, k)
+        else:
+            scores, indices = self.index.search(query, k, params=self._search_params(mask))
+        scores, indices = scores[0], indices[0]
+        valid = indices >= 0 # Approximate indexes pad with -1 when fewer than k hits are found
+        return np.clip(scores[valid], -1.0, 1.0), indices[valid].astype(np.int64)
+
+    def search_batch(self, query_embeddings, k, masks=None):
+        """
+        Search many queries; queries sharing a mask are sent to faiss as one batch.
+
+        Returns:
+            list: (scores, indices) per query, as returned by search()
+        """
+        queries = normalize_embeddings(np.asarray(query_embeddings, dtype=np.float32))
+        results = [None] * len(queries)
+        groups = {}
+        for row in range(len(queries)):
+            mask = masks[row] if masks is not None else None
+            groups.setdefault(id(mask), (mask, []))[1].append(row)
+
+        for mask, rows in groups.values():
+            group_k = min(k, len(self) if mask is None else int(np.count_nonzero(mask)))
+            if group_k <= 0:
+                for row in rows:
+                    results[row] = (np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64))
+                continue
+            params = self._search_params(mask) if mask is not None else None
+            scores, indices = self.index.search(queries[rows], group_k, params=params)
+            for position, row in enumerate(rows):
+                valid = indices[position] >= 0
+                results[row] = (np.clip(scores[position][valid], -1.0, 1.0), indices[position][valid].astype(np.int64))
+        return results
+
+def _build_faiss_index(matrix, backend, nlist=None, hnsw_m=None, ef_construction=None):
+    faiss = _import_faiss()
+    n, dim = matrix.shape
+
+    if backend == "faiss_ivf":
+        nlist = nlist or env.FAISS_IVF_NLIST or int(4 * np.sqrt(n))
+        # IVF needs ~39 training points per centroid; fall back to exact search on tiny corpora
+        nlist = min(nlist, n // 39)
+        if nlist <= 1:
+            logger.warning(f"Corpus too small for IVF ({n} vectors). Using exact faiss_flat index instead.")
+            return _build_faiss_index(matrix, "faiss_flat")
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(matrix)
+        index.add(matrix)
+        engine = FaissSearchEngine(index, backend)
+        engine.set_search_params(nprobe=env.FAISS_IVF_NPROBE)
+        logger.info(f"Built faiss_ivf index: {n} vectors, nlist={nlist}, nprobe={env.FAISS_IVF_NPROBE}")
+        return engine
+
+    if backend == "faiss_hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m or env.FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction or env.FAISS_HNSW_EF_CONSTRUCTION
+        index.add(matrix)
+        engine = FaissSearchEngine(index, backend)
+        engine.set_search_params(ef_search=env.FAISS_HNSW_EF_SEARCH)
+        logger.info(f"Built faiss_hnsw index: {n} vectors, M={hnsw_m or env.FAISS_HNSW_M}, efSearch={env.FAISS_HNSW_EF_SEARCH}")
+        return engine
+
+    index = faiss.IndexFlatIP(dim)
+    index.add(matrix)
+    logger.info(f"Built faiss_flat index: {n} vectors")
+    return FaissSearchEngine(index, "faiss_flat")
+
+# ======================================================================
+# BUILD / SAVE / LOAD
+# ======================================================================
+def build_index(embeddings, backend=None, normalized=False, **params):
+    """
+    Build a search engine over chunk embeddings with the configured backend.
+
+    Args:
+        embeddings (list or np.ndarray): Embedding vectors, one per chunk
+        backend (str): One of INDEX_BACKENDS (defaults to SHADOW_INDEX_BACKEND)
+        normalized (bool): Embeddings are already a unit-row float32 matrix
+        **params: Backend overrides (nlist, hnsw_m, ef_construction)
+
+    Returns:
+        MatrixSearchEngine or FaissSearchEngine: Engine ready for search_similar_chunks
+    """
+    backend = (backend or env.INDEX_BACKEND).lower()
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}'. Expected one of {INDEX_BACKENDS}.")
+    if backend == "matrix":
+        return MatrixSearchEngine(embeddings, normalized=normalized)
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32) if normalized else normalize_embeddings(embeddings)
+    return _build_faiss_index(matrix, backend, **params)
+
+def corpus_fingerprint(chunks, model_name=""):
+    """Hash of the chunk texts (in order) and model, used to tell if a saved index is still valid."""
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for chunk in chunks:
+        digest.update(b"\0")
+        digest.update(chunk["text"].encode("utf-8"))
+    return digest.hexdigest()
+
+def _build_params(backend):
+    """Configured build parameters of a backend, stored with a saved index so changing them forces a rebuild."""
+    if backend == "faiss_ivf":
+        return {"nlist": env.FAISS_IVF_NLIST}
+    if backend == "faiss_hnsw":
+        return {"hnsw_m": env.FAISS_HNSW_M, "ef_construction": env.FAISS_HNSW_EF_CONSTRUCTION}
+    return {}
+
+def save_index(engine, index_dir=None, fingerprint=""):
+    """
+    Persist a search engine to disk.
+
+    Args:
+        engine: MatrixSearchEngine or FaissSearchEngine
+        index_dir (str): Target directory (defaults to SHADOW_INDEX_DIR)
+        fingerprint (str): Corpus fingerprint stored alongside the index
+    """
+    index_dir = index_dir or env.INDEX_DIR
+    os.makedirs(index_dir, exist_ok=True)
+    if isinstance(engine, FaissSearchEngine):
+        backend, filename = engine.backend, "index.faiss"
+        _import_faiss().write_index(engine.index, os.path.join(index_dir, filename))
+    else:
+        backend, filename = "matrix", "index.npy"
+        np.save(os.path.join(index_dir, filename), engine.matrix)
+
+    meta = {"backend": backend, "file": filename, "count": len(engine), "dim": engine.dim, "fingerprint": fingerprint,
+            "params": _build_params(backend)}
+    with open(os.path.join(index_dir, _META_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    logger.info(f"Saved {backend} index ({len(engine)} vectors) to {index_dir}")
+
+def load_index(index_dir=None, backend=None, fingerprint=None):
+    """
+    Load a previously saved search engine.
+
+    Args:
+        index_dir (str): Directory written by save_index (defaults to SHADOW_INDEX_DIR)
+        backend (str): Expected backend; a saved index of another backend is ignored
+        fingerprint (str): Expected corpus fingerprint; a stale index is ignored
+            (as is one built with other nlist / M / efConstruction settings)
+
+    Returns:
+        MatrixSearchEngine or FaissSearchEngine or None: None when nothing usable is on disk
+    """
+    index_dir = index_dir or env.INDEX_DIR
+    backend = (backend or env.INDEX_BACKEND).lower()
+    meta_path = os.path.join(index_dir, _META_FILENAME)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        # An IVF request on a tiny corpus is saved as faiss_flat, so accept that too
+        if meta["backend"] != backend and not (backend == "faiss_ivf" and meta["backend"] == "faiss_flat"):
+            logger.info(f"Saved index is '{meta['backend']}', configured backend is '{backend}'. Rebuilding.")
+            return None
+        if fingerprint is not None and meta.get("fingerprint") != fingerprint:
+            logger.info("Saved index does not match the current corpus. Rebuilding.")
+            return None
+        # Search-time knobs (nprobe, efSearch) are applied on load; build-time ones need a new index
+        if meta.get("params", {}) != _build_params(meta["backend"]):
+            logger.info(f"Saved index was built with {meta.get('params', {})}, configured {_build_params(meta['backend'])}. Rebuilding.")
+            return None
+
+        path = os.path.join(index_dir, meta["file"])
+        if meta["backend"] == "matrix":
+            engine = MatrixSearchEngine(np.load(path))
+        else:
+            engine = FaissSearchEngine(_import_faiss().read_index(path), meta["backend"])
+            engine.set_search_params(nprobe=env.FAISS_IVF_NPROBE, ef_search=env.FAISS_HNSW_EF_SEARCH)
+    except Exception as e:
+        logger.warning(f"Could not load saved index from {index_dir}: {e}")
+        return None
+
+    logger.info(f"Loaded {meta['backend']} index ({len(engine)} vectors) from {index_dir}")
+    return engine
+
+def load_or_build_index(chunks, embeddings, backend=None, model_name="", normalized=False):
+    """Load the persisted index if it matches the corpus, otherwise build (and persist) a new one."""
+    backend = (backend or env.INDEX_BACKEND).lower()
+    if backend == "matrix" and normalized and env.EMBEDDING_QUANTIZATION != "none":
+        return _load_or_build_quantized(chunks, embeddings, model_name)
+    if backend == "matrix" and normalized:
+        # The exact engine searches the (memory-mapped) embedding matrix directly; nothing to persist
+        return build_index(embeddings, backend=backend, normalized=True)
+
+    fingerprint = corpus_fingerprint(chunks, model_name)
+    if env.INDEX_PERSIST:
+        engine = load_index(backend=backend, fingerprint=fingerprint)
+        if engine is not None and len(engine) == len(chunks):
+            return engine
+
+    engine = build_index(embeddings, backend=backend, normalized=normalized)
+    if env.INDEX_PERSIST:
+        try:
+            save_index(engine, fingerprint=fingerprint)
+        except Exception as e:
+            logger.warning(f"Could not persist index: {e}")
+    return engine
+
+def _quantized_path(mode):
+    """Persisted codes per mode and codec parameters, so e.g. changing SHADOW_PQ_SUBVECTORS never loads stale codebooks."""
+    tag = f"pq{env.PQ_SUBVECTORS}" if mode == "pq" else mode
+    return os.path.join(env.INDEX_DIR, f"quantized_{tag}.npz")
+
+def _load_or_build_quantized(chunks, embeddings, model_name=""):
+    """Quantized engine over the normalized matrix; codes are persisted since PQ training isn't free."""
+    mode = env.EMBEDDING_QUANTIZATION
+    fingerprint = corpus_fingerprint(chunks, model_name)
+    rescore_matrix = embeddings if env.QUANTIZED_RESCORE else None
+    if env.INDEX_PERSIST:
+        engine = load_quantized(_quantized_path(mode), mode, fingerprint=fingerprint, rescore_matrix=rescore_matrix)
+        if engine is not None and len(engine) == len(chunks):
+            logger.info(f"Loaded {mode} quantized index ({len(engine)} vectors) from {env.INDEX_DIR}")
+            return engine
+    engine = build_quantized_engine(embeddings, mode=mode)
+    if env.INDEX_PERSIST:
+        try:
+            save_quantized(engine, _quantized_path(mode), fingerprint=fingerprint)
+        except Exception as e:
+            logger.warning(f"Could not persist quantized index: {e}")
+    return engine
+
+def apply_index_delta(engine, chunks, embeddings, removed_rows, model_name=""):
+    """
+    Bring a search engine up to date after a chunk delta instead of rebuilding it.
+
+    The current engine is left untouched (in-flight queries may still use it); a new one is returned.
+
+    Args:
+        engine: Current MatrixSearchEngine or FaissSearchEngine
+        chunks (list): Chunk list after the delta
+        embeddings (np.ndarray): Normalized matrix after the delta: surviving rows in their
+            old order, then the added rows
+        removed_rows (list): Row positions deleted from the old matrix
+        model_name (str): Embedding model, part of the persisted index fingerprint
+
+    Returns:
+        MatrixSearchEngine or FaissSearchEngine: Engine over the updated matrix
+    """
+    if isinstance(engine, MatrixSearchEngine):
+        return MatrixSearchEngine(embeddings, normalized=True)
+    if isinstance(engine, QuantizedSearchEngine):
+        # Re-encode with the fitted codec (no PQ retraining); encoding is a cheap vectorized pass
+        new_engine = engine.reencode(embeddings)
+        if env.INDEX_PERSIST:
+            try:
+                save_quantized(new_engine, _quantized_path(new_engine.mode), fingerprint=corpus_fingerprint(chunks, model_name))
+            except Exception as e:
+                logger.warning(f"Could not persist quantized index: {e}")
+        return new_engine
+
+    faiss = _import_faiss()
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    added = matrix[len(engine) - len(removed_rows):]
+    if engine.backend == "faiss_hnsw" and len(removed_rows) > 0:
+        logger.info(f"HNSW cannot delete vectors; rebuilding index after removing {len(removed_rows)} rows.")
+        new_engine = build_index(matrix, backend="faiss_hnsw", normalized=True)
+    else:
+        index = faiss.clone_index(engine.index)
+        if engine.backend == "faiss_ivf":
+            # IVF labels are fixed at add time and not renumbered by remove_ids; re-add all
+            # vectors to the already trained coarse quantizer (no k-means retraining)
+            index.reset()
+            index.add(matrix)
+        else:
+            if len(removed_rows) > 0:
+                index.remove_ids(np.asarray(removed_rows, dtype=np.int64)) # Flat/HNSW keep survivor order
+            if len(added) > 0:
+                index.add(added)
+        new_engine = FaissSearchEngine(index, engine.backend)
+        logger.info(f"Applied delta to {engine.backend} index: -{len(removed_rows)} +{len(added)} ({len(new_engine)} vectors)")
+
+    if env.INDEX_PERSIST:
+        try:
+            save_index(new_engine, fingerprint=corpus_fingerprint(chunks, model_name))
+        except Exception as e:
+            logger.warning(f"Could not persist index: {e}")
+    return new_engine
+
+# --- END OF FILE src/retrieval/index_backends.py ---
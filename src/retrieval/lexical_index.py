@@ -0,0 +1,125 @@
+# --- START OF FILE src/retrieval/lexical_index.py ---
+# BM25 inverted index over chunk text. Codewords such as "S-29 Protocol", "Safehouse K-41" or
+# "EK7-ΣΔ19" are kept as whole tokens (plus their parts), so exact identifiers match exactly
+# where the embedding model only sees generic sub-word pieces.
+
+import re
+import logging
+import numpy as np
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Word characters (any script, so Greek letters in codewords survive) joined by - . / _
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+_PART_PATTERN = re.compile(r"[^\W_]+")
+
+def tokenize(text):
+    """
+    Lower-cased tokens of text for indexing and querying.
+
+    Compound identifiers yield the whole token and its alphanumeric parts:
+    "EK7-ΣΔ19" -> ["ek7-σδ19", "ek7", "σδ19"], so both exact and partial mentions match.
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.casefold()):
+        token = match.group()
+        tokens.append(token)
+        parts = _PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+class BM25Index:
+    """
+    Okapi BM25 over a chunk list, with postings stored as flat numpy arrays (CSR layout):
+    the postings of term t are doc_ids[offsets[t]:offsets[t + 1]] (ascending row numbers)
+    with matching term_freqs.
+
+    Args:
+        chunks (list): Document chunks (position i matches row i of the embedding matrix)
+        k1 (float): Term-frequency saturation
+        b (float): Document-length normalization
+    """
+
+    def __init__(self, chunks, k1=1.2, b=0.75):
+        self.count = len(chunks)
+        self.k1, self.b = float(k1), float(b)
+        self.vocabulary = {}
+        term_ids, doc_ids, term_freqs = [], [], []
+        self.doc_lengths = np.zeros(self.count, dtype=np.float32)
+        for row, chunk in enumerate(chunks):
+            tokens = tokenize(chunk.get("text", ""))
+            self.doc_lengths[row] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(row)
+                term_freqs.append(freq)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable") # Stable: rows stay ascending within each term
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        self.term_freqs = np.minimum(np.asarray(term_freqs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16)[order]
+        self.offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocabulary)), out=self.offsets[1:])
+
+        document_frequency = np.diff(self.offsets).astype(np.float64)
+        self.idf = np.log1p((self.count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        average_length = float(self.doc_lengths.mean()) if self.count else 0.0
+        # Per-row length term of the BM25 denominator, precomputed once
+        self._length_norm = (self.k1 * (1.0 - self.b + self.b * self.doc_lengths / average_length)
+                             if average_length > 0 else np.full(self.count, self.k1, dtype=np.float32)).astype(np.float32)
+        logger.info(f"BM25 index: {self.count} chunks, {len(self.vocabulary)} terms, {len(self.doc_ids)} postings.")
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return int(self.doc_ids.nbytes + self.term_freqs.nbytes + self.offsets.nbytes + self.idf.nbytes
+                   + self.doc_lengths.nbytes + self._length_norm.nbytes)
+
+    def _query_terms(self, query):
+        """Distinct vocabulary ids of the query's tokens (unknown tokens are dropped)."""
+        return sorted({self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary})
+
+    def score(self, query, mask=None):
+        """
+        BM25 score of every chunk for query (0.0 for chunks sharing no term with it).
+
+        Args:
+            query (str): Query text
+            mask (np.ndarray): Optional bool array; rows outside it score 0.0
+
+        Returns:
+            np.ndarray: float32 array of length len(self)
+        """
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in self._query_terms(query):
+            start, end = self.offsets[term], self.offsets[term + 1]
+            rows = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            scores[rows] += self.idf[term] * tf * (self.k1 + 1.0) / (tf + self._length_norm[rows])
+        if mask is not None:
+            scores[~mask] = 0.0
+        return scores
+
+    def candidates(self, query, limit=None, mask=None):
+        """
+        Rows containing at least one query term, best BM25 first when limited.
+
+        Args:
+            query (str): Query text
+            limit (int): Keep only the limit highest-scoring rows (None = all matching rows)
+            mask (np.ndarray): Optional bool array; only True rows are returned
+
+        Returns:
+            tuple: (rows, bm25 scores), rows in ascending order
+        """
+        scores = self.score(query, mask=mask)
+        rows = np.flatnonzero(scores > 0)
+        if limit is not None and len(rows) > limit:
+            rows = np.sort(rows[np.argpartition(-scores[rows], limit - 1)[:limit]])
+        return rows, scores[rows]
+
+# --- END OF FILE src/retrieval/lexical_index.py ---
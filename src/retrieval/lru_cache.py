@@ -0,0 +1,88 @@
+# --- START OF FILE src/retrieval/lru_cache.py ---
+# Small thread-safe LRU cache with optional TTL and hit/miss/eviction counters.
+
+import time
+import threading
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache, safe to share between threads (Streamlit sessions).
+
+    Args:
+        maxsize (int): Maximum number of entries (0 disables caching)
+        ttl (float): Seconds an entry stays valid (0 or None = no expiry)
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = max(0, int(maxsize))
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the cached value (marking it most recently used) or default."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        """
+        Insert or refresh an entry, evicting the least recently used one when full.
+
+        Args:
+            key: Hashable cache key
+            value: Value to store
+            ttl (float): Per-entry TTL override in seconds
+        """
+        if self.maxsize == 0:
+            return
+        ttl = ttl if ttl and ttl > 0 else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Snapshot of size and counters, including the hit rate over all lookups."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# --- END OF FILE src/retrieval/lru_cache.py ---
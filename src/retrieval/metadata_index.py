@@ -0,0 +1,98 @@
+# --- START OF FILE src/retrieval/metadata_index.py ---
+# Precomputed boolean masks over chunk metadata so search can apply source / doc_type /
+# clearance predicates *before* top-k selection instead of filtering afterwards.
+
+import logging
+import threading
+import numpy as np
+
+from src.retrieval.chunk_store import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+_MAX_CACHED_MASKS = 64
+
+class ChunkMetadataIndex:
+    """
+    Column-wise view of chunk metadata with one bitmap per source and doc_type
+    and an int array of security levels.
+
+    Args:
+        chunks (list): Document chunks (position i matches row i of the embedding matrix)
+    """
+
+    def __init__(self, chunks):
+        self.count = len(chunks)
+        if isinstance(chunks, ChunkStore): # Columns are already there; no per-chunk metadata walk
+            self.security_levels = chunks.security_levels
+            self.source_masks = self._masks_from_codes(*chunks.codes("source"))
+            self.doc_type_masks = self._masks_from_codes(*chunks.codes("doc_type"))
+        else:
+            metadata = [chunk.get("metadata", {}) for chunk in chunks]
+            # Missing levels default to 1, matching filter_by_clearance
+            self.security_levels = np.fromiter((m.get("security_level", 1) for m in metadata), dtype=np.int16, count=self.count)
+            self.source_masks = self._build_masks(m.get("source") for m in metadata)
+            self.doc_type_masks = self._build_masks(m.get("doc_type") for m in metadata)
+        self._mask_cache = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _build_masks(self, values):
+        codes = {}
+        column = np.fromiter((codes.setdefault(v, len(codes)) for v in values), dtype=np.int32, count=self.count)
+        return self._masks_from_codes(column, list(codes))
+
+    @staticmethod
+    def _masks_from_codes(column, values):
+        return {value: column == code for code, value in enumerate(values)}
+
+    def _match_any(self, masks, wanted):
+        combined = np.zeros(self.count, dtype=bool)
+        for value in wanted:
+            if value in masks:
+                combined |= masks[value]
+        return combined
+
+    def mask(self, sources=None, doc_types=None, max_security_level=None):
+        """
+        Boolean mask of chunks satisfying every given predicate.
+
+        Args:
+            sources (iterable): Allowed source names (None = any)
+            doc_types (iterable): Allowed doc types (None = any)
+            max_security_level (int): Highest security_level allowed (None = any)
+
+        Returns:
+            np.ndarray or None: Read-only bool array, or None when no predicate is given
+        """
+        if sources is None and doc_types is None and max_security_level is None:
+            return None
+        key = (
+            tuple(sorted(sources)) if sources is not None else None,
+            tuple(sorted(doc_types)) if doc_types is not None else None,
+            max_security_level,
+        )
+        with self._lock:
+            cached = self._mask_cache.get(key)
+        if cached is not None:
+            return cached
+
+        combined = np.ones(self.count, dtype=bool)
+        if sources is not None:
+            combined &= self._match_any(self.source_masks, key[0])
+        if doc_types is not None:
+            combined &= self._match_any(self.doc_type_masks, key[1])
+        if max_security_level is not None:
+            combined &= self.security_levels <= max_security_level
+        combined.flags.writeable = False
+
+        with self._lock:
+            if len(self._mask_cache) >= _MAX_CACHED_MASKS:
+                self._mask_cache.clear()
+            self._mask_cache[key] = combined
+        logger.debug(f"Built metadata mask {key}: {int(combined.sum())}/{self.count} chunks eligible")
+        return combined
+
+# --- END OF FILE src/retrieval/metadata_index.py ---
@@ -0,0 +1,383 @@
+# --- START OF FILE src/retrieval/quantization.py ---
+# Compressed chunk-matrix storage for the exact 'matrix' backend.
+#
+#   float16  2x smaller   half-precision copy of each row
+#   int8     4x smaller   one signed byte per dimension, per-dimension scale
+#   pq       ~16x smaller product quantization: one uint8 centroid id per sub-vector
+#
+# Search scores the compressed codes, keeps rescore_factor * k candidates and (optionally)
+# rescores them exactly against the float32 rows. Those rows come from the memory-mapped
+# embedding store, so only the candidate pages are touched and the codes are all that stays
+# resident.
+#
+#   python -m src.retrieval.quantization --k 10     # recall/memory report for every mode
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import numpy as np
+
+from src.setup import environment as env
+from src.retrieval.vector_search import normalize_embeddings, select_top_k
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "float16", "int8", "pq")
+_SCORE_BLOCK_ROWS = 65536 # Rows decoded per step, bounding temporary float32 memory
+
+# ======================================================================
+# CODECS
+# ======================================================================
+class Float16Codec:
+    """Half-precision rows; scores are accumulated in float32."""
+
+    mode = "float16"
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.nbytes = 0
+
+    @classmethod
+    def fit(cls, matrix, **params):
+        return cls(matrix.shape[1])
+
+    def encode(self, matrix):
+        return np.ascontiguousarray(matrix, dtype=np.float16)
+
+    def scores(self, codes, queries):
+        """(m, n) inner products between queries (m, dim) and the encoded rows."""
+        out = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _SCORE_BLOCK_ROWS):
+            block = codes[start:start + _SCORE_BLOCK_ROWS].astype(np.float32)
+            out[:, start:start + block.shape[0]] = queries @ block.T
+        return out
+
+    def state(self):
+        return {"dim": np.int64(self.dim)}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(int(state["dim"]))
+
+class Int8Codec:
+    """
+    Symmetric scalar quantization, x_d ~ code_d * scale_d with a per-dimension scale.
+
+    The scale is folded into the query, so scoring is codes @ (query * scale).
+    """
+
+    mode = "int8"
+
+    def __init__(self, scale):
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.dim = self.scale.shape[0]
+        self.nbytes = self.scale.nbytes
+
+    @classmethod
+    def fit(cls, matrix, **params):
+        peak = np.abs(np.asarray(matrix, dtype=np.float32)).max(axis=0) if len(matrix) else np.ones(matrix.shape[1], np.float32)
+        return cls(np.where(peak > 0, peak / 127.0, 1.0))
+
+    def encode(self, matrix):
+        # Rows added later may exceed the fitted range; they saturate at +-127
+        return np.clip(np.rint(np.asarray(matrix, dtype=np.float32) / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, codes, queries):
+        scaled = (queries * self.scale).astype(np.float32)
+        out = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for start in range(0, codes.shape[0], _SCORE_BLOCK_ROWS):
+            block = codes[start:start + _SCORE_BLOCK_ROWS].astype(np.float32)
+            out[:, start:start + block.shape[0]] = scaled @ block.T
+        return out
+
+    def state(self):
+        return {"scale": self.scale}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["scale"])
+
+class PQCodec:
+    """
+    Product quantization: rows are split into m sub-vectors, each replaced by the id of its
+    nearest of (up to) 256 k-means centroids. Scoring uses per-query lookup tables (ADC).
+
+    Args:
+        centroids (np.ndarray): (m, ks, dim // m) centroids per sub-space
+    """
+
+    mode = "pq"
+
+    def __init__(self, centroids):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.m, self.ks, self.sub_dim = self.centroids.shape
+        self.dim = self.m * self.sub_dim
+        self.nbytes = self.centroids.nbytes
+        self._offsets = (np.arange(self.m, dtype=np.int64) * self.ks)
+
+    @staticmethod
+    def _subvectors(dim, wanted):
+        """Largest divisor of dim not above wanted, so every sub-vector has the same width."""
+        wanted = max(1, min(wanted, dim))
+        return next(m for m in range(wanted, 0, -1) if dim % m == 0)
+
+    @classmethod
+    def fit(cls, matrix, subvectors=None, iterations=15, sample_size=10240, seed=0):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n, dim = matrix.shape
+        m = cls._subvectors(dim, subvectors or env.PQ_SUBVECTORS)
+        ks = max(1, min(256, n))
+        # ~40 training points per centroid is plenty for 256-way codebooks and keeps training fast
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(n, size=min(n, sample_size), replace=False))] if n > sample_size else matrix
+        sub_dim = dim // m
+        centroids = np.empty((m, ks, sub_dim), dtype=np.float32)
+        for j in range(m):
+            centroids[j] = _kmeans(np.ascontiguousarray(sample[:, j * sub_dim:(j + 1) * sub_dim]), ks, iterations, rng)
+        logger.info(f"Trained PQ codebooks: {m} sub-vectors x {ks} centroids on {len(sample)} rows")
+        return cls(centroids)
+
+    def encode(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        codes = np.empty((matrix.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = matrix[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+            centroids = self.centroids[j]
+            c_norms = (centroids ** 2).sum(axis=1)
+            for start in range(0, len(sub), _SCORE_BLOCK_ROWS):
+                block = sub[start:start + _SCORE_BLOCK_ROWS]
+                codes[start:start + len(block), j] = np.argmin(c_norms - 2.0 * block @ centroids.T, axis=1)
+        return codes
+
+    def scores(self, codes, queries):
+        out = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+        for row, query in enumerate(queries):
+            # tables[j, c] = <query sub-vector j, centroid c of sub-space j>
+            tables = np.einsum("jd,jcd->jc", query.reshape(self.m, self.sub_dim), self.centroids).ravel()
+            for start in range(0, codes.shape[0], _SCORE_BLOCK_ROWS):
+                block = codes[start:start + _SCORE_BLOCK_ROWS].astype(np.int64) + self._offsets
+                out[row, start:start + block.shape[0]] = tables[block].sum(axis=1)
+        return out
+
+    def state(self):
+        return {"centroids": self.centroids}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["centroids"])
+
+def _kmeans(points, k, iterations, rng):
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points."""
+    centroids = points[rng.choice(len(points), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        # ||p||^2 is the same for every centroid, so it doesn't affect the argmin
+        assignment = np.argmin((centroids ** 2).sum(axis=1) - 2.0 * points @ centroids.T, axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.stack([np.bincount(assignment, weights=points[:, d], minlength=k) for d in range(points.shape[1])], axis=1)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), size=int(empty.sum()), replace=False)]
+    return centroids
+
+_CODECS = {"float16": Float16Codec, "int8": Int8Codec, "pq": PQCodec}
+
+# ======================================================================
+# QUANTIZED SEARCH ENGINE
+# ======================================================================
+class QuantizedSearchEngine:
+    """
+    Cosine search over compressed chunk embeddings, same interface as MatrixSearchEngine.
+
+    Args:
+        codec: Fitted Float16Codec, Int8Codec or PQCodec
+        codes (np.ndarray): codec.encode(normalized matrix)
+        rescore_matrix (np.ndarray): Normalized float32 rows (ideally the store memmap) used to
+            rescore candidates exactly; None returns the approximate scores
+        rescore_factor (int): Candidates kept per requested result before rescoring
+    """
+
+    def __init__(self, codec, codes, rescore_matrix=None, rescore_factor=None):
+        self.codec = codec
+        self.codes = codes
+        self.rescore_matrix = rescore_matrix
+        self.rescore_factor = max(1, rescore_factor or env.QUANTIZED_RESCORE_FACTOR)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    @property
+    def dim(self):
+        return self.codec.dim
+
+    @property
+    def mode(self):
+        return self.codec.mode
+
+    @property
+    def nbytes(self):
+        """Resident bytes of the compressed index (codes plus codebooks/scales)."""
+        return int(self.codes.nbytes + self.codec.nbytes)
+
+    def reencode(self, embeddings):
+        """New engine over an updated matrix with the same fitted codec (no retraining)."""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        return QuantizedSearchEngine(self.codec, self.codec.encode(matrix),
+                                     rescore_matrix=embeddings if self.rescore_matrix is not None else None,
+                                     rescore_factor=self.rescore_factor)
+
+    def _select(self, approximate, query, k, mask):
+        if self.rescore_matrix is None:
+            return select_top_k(np.clip(approximate, -1.0, 1.0), k, mask=mask)
+        _, candidates = select_top_k(approximate, k * self.rescore_factor, mask=mask)
+        candidates = np.sort(candidates) # Ascending row order reads the memmap sequentially
+        exact = np.asarray(self.rescore_matrix[candidates], dtype=np.float32) @ query
+        np.clip(exact, -1.0, 1.0, out=exact)
+        top_scores, top = select_top_k(exact, k)
+        return top_scores, candidates[top]
+
+    def search(self, query_embedding, k, mask=None):
+        """
+        Find the k highest-scoring chunks for a query.
+
+        Returns:
+            tuple: (scores, indices) sorted by descending score; exact cosine scores when rescoring
+        """
+        query = normalize_embeddings(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))
+        approximate = self.codec.scores(self.codes, query)[0]
+        return self._select(approximate, query[0], k, mask)
+
+    def score_rows(self, query_embedding, rows):
+        """Scores of only the given rows (exact when rescoring, otherwise approximate)."""
+        query = normalize_embeddings(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))
+        if self.rescore_matrix is not None:
+            scores = np.asarray(self.rescore_matrix[rows], dtype=np.float32) @ query[0]
+        else:
+            scores = self.codec.scores(self.codes[rows], query)[0]
+        return np.clip(scores, -1.0, 1.0, out=scores)
+
+    def search_batch(self, query_embeddings, k, masks=None, block_size=256):
+        queries = normalize_embeddings(np.asarray(query_embeddings, dtype=np.float32))
+        results = []
+        for start in range(0, len(queries), block_size):
+            approximate = self.codec.scores(self.codes, queries[start:start + block_size])
+            for row in range(approximate.shape[0]):
+                mask = masks[start + row] if masks is not None else None
+                results.append(self._select(approximate[row], queries[start + row], k, mask))
+        return results
+
+def build_quantized_engine(embeddings, mode=None, rescore=None, **params):
+    """
+    Fit a codec on a normalized float32 matrix and encode it.
+
+    Args:
+        embeddings (np.ndarray): Normalized (n, dim) float32 matrix
+        mode (str): 'float16', 'int8' or 'pq' (defaults to SHADOW_EMBEDDING_QUANTIZATION)
+        rescore (bool): Keep a reference to embeddings for exact rescoring (defaults to SHADOW_QUANTIZED_RESCORE)
+        **params: Codec options (e.g. subvectors for pq)
+
+    Returns:
+        QuantizedSearchEngine
+    """
+    mode = (mode or env.EMBEDDING_QUANTIZATION).lower()
+    if mode not in _CODECS:
+        raise ValueError(f"Unknown quantization mode '{mode}'. Expected one of {tuple(_CODECS)}.")
+    rescore = env.QUANTIZED_RESCORE if rescore is None else rescore
+    codec = _CODECS[mode].fit(embeddings, **params)
+    engine = QuantizedSearchEngine(codec, codec.encode(embeddings), rescore_matrix=embeddings if rescore else None)
+    logger.info(f"Built {mode} quantized index: {len(engine)} vectors, {engine.nbytes / 1e6:.1f} MB "
+                f"({embeddings.shape[0] * embeddings.shape[1] * 4 / max(engine.nbytes, 1):.1f}x smaller than float32)")
+    return engine
+
+def save_quantized(engine, path, fingerprint=""):
+    """Persist codes and codec state (tmp file + rename)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+    np.savez(tmp_path, mode=np.array(engine.mode), fingerprint=np.array(fingerprint), codes=engine.codes,
+             **{f"codec_{key}": value for key, value in engine.codec.state().items()})
+    os.replace(tmp_path, path)
+    logger.info(f"Saved {engine.mode} quantized index ({len(engine)} vectors) to {path}")
+
+def load_quantized(path, mode, fingerprint=None, rescore_matrix=None):
+    """Load a persisted quantized engine, or None if missing, of another mode or stale."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if str(data["mode"]) != mode or (fingerprint is not None and str(data["fingerprint"]) != fingerprint):
+                return None
+            codec = _CODECS[mode].from_state({key[len("codec_"):]: data[key] for key in data.files if key.startswith("codec_")})
+            codes = data["codes"]
+    except Exception as e:
+        logger.warning(f"Could not load quantized index {path}: {e}")
+        return None
+    return QuantizedSearchEngine(codec, codes, rescore_matrix=rescore_matrix)
+
+# ======================================================================
+# RECALL / MEMORY REPORT
+# ======================================================================
+def evaluate_quantization(matrix, queries, k=10, modes=("float16", "int8", "pq"), rescore_factor=None):
+    """
+    Compare every quantization mode against exact float32 search.
+
+    Args:
+        matrix (np.ndarray): Normalized (n, dim) float32 chunk matrix
+        queries (np.ndarray): (m, dim) query vectors
+        k (int): Results per query
+        modes (tuple): Modes to evaluate
+        rescore_factor (int): Candidates per result for the rescored variant
+
+    Returns:
+        dict: Per mode: bytes, compression vs float32, recall@k without and with rescoring, ms/query
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    queries = normalize_embeddings(np.asarray(queries, dtype=np.float32))
+    exact = [set(select_top_k(matrix @ q, k)[1].tolist()) for q in queries]
+    report = {"chunks": int(matrix.shape[0]), "dim": int(matrix.shape[1]), "queries": int(len(queries)), "k": k,
+              "float32_bytes": int(matrix.nbytes), "modes": {}}
+
+    for mode in modes:
+        started = time.perf_counter()
+        engine = build_quantized_engine(matrix, mode=mode, rescore=False)
+        build_seconds = time.perf_counter() - started
+        entry = {"bytes": engine.nbytes, "compression": round(matrix.nbytes / max(engine.nbytes, 1), 2),
+                 "build_seconds": round(build_seconds, 3)}
+        for label, rescore_matrix in (("approximate", None), ("rescored", matrix)):
+            engine.rescore_matrix = rescore_matrix
+            engine.rescore_factor = max(1, rescore_factor or env.QUANTIZED_RESCORE_FACTOR)
+            started = time.perf_counter()
+            found = [set(engine.search(q, k)[1].tolist()) for q in queries]
+            elapsed = time.perf_counter() - started
+            hits = sum(len(truth & got) for truth, got in zip(exact, found))
+            entry[f"recall_{label}"] = round(hits / max(1, sum(len(truth) for truth in exact)), 4)
+            entry[f"ms_per_query_{label}"] = round(1000 * elapsed / max(1, len(queries)), 3)
+        report["modes"][mode] = entry
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall and memory of each quantization mode on the embedding store.")
+    parser.add_argument("--store", default=env.EMBEDDING_STORE_PATH, help="Embedding store file")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out rows (plus noise) used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to query rows")
+    args = parser.parse_args(argv)
+
+    from src.retrieval.embedding_store import open_embedding_store
+    store = open_embedding_store(args.store)
+    if store is None or len(store) == 0:
+        print(f"No usable embedding store at {args.store}. Run the app (or batch CLI) once to build it.", file=sys.stderr)
+        return 1
+    matrix = np.asarray(store.matrix, dtype=np.float32)
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)
+    queries = matrix[rows] + rng.normal(0.0, args.noise, size=(len(rows), matrix.shape[1])).astype(np.float32)
+    print(json.dumps(evaluate_quantization(matrix, queries, k=args.k), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# --- END OF FILE src/retrieval/quantization.py ---
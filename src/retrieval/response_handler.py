@@ -3,6 +3,8 @@
 import logging
 from src.data_processing.chunk_and_annotate import get_chunk_context
 
+logger = logging.getLogger(__name__)
+
 # Define the response generation similarity threshold
 RESPONSE_SIMILARITY_THRESHOLD = 0.35 # You might adjust this later based on testing
 
@@ -13,10 +15,10 @@ def generate_standard_response(query, chunks):
     Used as a fallback when no specific framework rules apply or style guide fails.
     """
     # Keep the rest of the function logic exactly the same as your active version
-    logging.info(f"Generating standard response from {len(chunks)} accessible chunks. Response threshold: {RESPONSE_SIMILARITY_THRESHOLD}")
+    logger.info("Generating standard response from %d accessible chunks. Response threshold: %s", len(chunks), RESPONSE_SIMILARITY_THRESHOLD)
 
     if not chunks:
-        logging.warning("generate_standard_response called with zero chunks.")
+        logger.warning("generate_standard_response called with zero chunks.")
         return "No relevant information could be accessed or retrieved.", "No sources."
 
     # Sort chunks by similarity (highest first)
@@ -40,7 +42,7 @@ def generate_standard_response(query, chunks):
 
         # Add text to response ONLY if above the specific response threshold
         if similarity >= RESPONSE_SIMILARITY_THRESHOLD:
-            logging.debug(f"Adding chunk {i} (Similarity: {similarity_percent}) to standard response.")
+            logger.debug("Adding chunk %d (Similarity: %s) to standard response.", i, similarity_percent)
             response_parts.append(text) # Keep it simple for now
 
     # Combine response parts into a coherent response
@@ -49,7 +51,7 @@ def generate_standard_response(query, chunks):
     else:
         # Check if chunks exist at all before trying to access index 0
         highest_sim_info = f"Highest similarity was {chunks[0].get('similarity', 0):.4f}." if chunks else "No chunks were provided."
-        logging.warning(f"No chunks met the standard response similarity threshold of {RESPONSE_SIMILARITY_THRESHOLD}. {highest_sim_info}")
+        logger.warning("No chunks met the standard response similarity threshold of %s. %s", RESPONSE_SIMILARITY_THRESHOLD, highest_sim_info)
         full_response = "Based on the available information and relevance thresholds, I cannot provide a specific answer. Relevant sections might exist but require higher relevance scores or clearance."
 
     # Generate final explanation string
@@ -1,5 +1,6 @@
 # --- security_filter.py (with added logging) ---
 import logging # Add import
+from src.retrieval.chunk_store import security_levels_of
 logger = logging.getLogger(__name__) # Get logger
 
 def filter_by_clearance(chunks, user_clearance_level):
@@ -15,34 +16,29 @@ def filter_by_clearance(chunks, user_clearance_level):
             - accessible_chunks (list): Chunks the user can access
             - is_access_denied (bool): True if any chunks were filtered due to insufficient clearance
     """
-    accessible_chunks = []
-    is_access_denied = False
-    filtered_count = 0 # Counter for logging
-
     if not chunks:
          logger.debug("filter_by_clearance received empty chunk list.")
          return [], False
 
-    logger.debug(f"Filtering {len(chunks)} chunks for user level {user_clearance_level}...")
-
-    for i, chunk in enumerate(chunks):
-        # Get chunk security level, default to 1 if not specified
-        # Make default 0 for safety if type isn't classified? No, default 1 is safer.
-        chunk_security_level = chunk.get("metadata", {}).get("security_level", 1) # Safer get
+    debug = logger.isEnabledFor(logging.DEBUG) # Checked once; the per-chunk lines below are the hot path
+    if debug:
+        logger.debug("Filtering %d chunks for user level %s...", len(chunks), user_clearance_level)
 
-        # Log the comparison being made for THIS chunk
-        logger.debug(f"  Chunk {i}: Assigned Level={chunk_security_level}, User Level={user_clearance_level}. Accessible: {chunk_security_level <= user_clearance_level}")
+    # Levels default to 1 if not specified; views of the chunk store read them from its level column
+    chunk_security_levels = security_levels_of(chunks)
+    allowed = chunk_security_levels <= user_clearance_level
+    filtered_count = len(chunks) - int(allowed.sum())
+    is_access_denied = filtered_count > 0
+    accessible_chunks = list(chunks) if not is_access_denied else [chunk for chunk, keep in zip(chunks, allowed.tolist()) if keep]
 
-        # Only include chunks with security level <= user's clearance level
-        if chunk_security_level <= user_clearance_level:
-            accessible_chunks.append(chunk)
-        else:
-            # This chunk is being filtered out
-            is_access_denied = True
-            filtered_count += 1
-            logger.debug(f"    -> Filtering chunk {i} (Level {chunk_security_level} > {user_clearance_level})")
+    if debug:
+        for i, (chunk_security_level, accessible) in enumerate(zip(chunk_security_levels.tolist(), allowed.tolist())):
+            logger.debug("  Chunk %d: Assigned Level=%s, User Level=%s. Accessible: %s",
+                         i, chunk_security_level, user_clearance_level, accessible)
+            if not accessible:
+                logger.debug("    -> Filtering chunk %d (Level %s > %s)", i, chunk_security_level, user_clearance_level)
 
     # Use logger instead of print
-    logger.info(f"Filtered {filtered_count} out of {len(chunks)} chunks due to security level.")
+    logger.info("Filtered %d out of %d chunks due to security level.", filtered_count, len(chunks))
 
     return accessible_chunks, is_access_denied
\ No newline at end of file
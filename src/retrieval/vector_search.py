@@ -2,7 +2,18 @@
 
 import numpy as np
 import logging
+from src.setup import environment as env
+from src.setup import metrics
 from src.retrieval.embedding_engine import get_query_embedding
+from src.retrieval.metadata_index import ChunkMetadataIndex
+from src.retrieval.chunk_store import ChunkStore
+from src.retrieval.lexical_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+# dense: vector search only; hybrid: dense + BM25 score fusion; lexical_prefilter: dense scoring
+# restricted to the best BM25 candidates
+RETRIEVAL_MODES = ("dense", "hybrid", "lexical_prefilter")
 
 # ======================================================================
 # DEFINE THE COSINE SIMILARITY FUNCTION *FIRST*
@@ -40,94 +51,359 @@ def cosine_similarity(vec1, vec2):
     return similarity
 
 # ======================================================================
-# DEFINE THE SEARCH FUNCTION *AFTER* COSINE SIMILARITY
+# MATRIX SEARCH ENGINE (vectorized scoring over all chunks at once)
 # ======================================================================
-def search_similar_chunks(query, chunks, chunk_embeddings, top_k=5, similarity_threshold=0.2):
+def normalize_embeddings(embeddings):
+    """
+    Stack embeddings into one contiguous float32 matrix with unit-length rows.
+
+    Args:
+        embeddings (list or np.ndarray): Embedding vectors, one per chunk
+
+    Returns:
+        np.ndarray: C-contiguous float32 matrix of shape (n, dim). Rows that were
+            empty, invalid or zero-length are left as zeros so they always score 0.0.
+    """
+    if isinstance(embeddings, np.ndarray):
+        matrix = np.array(embeddings, dtype=np.float32, order="C", ndmin=2)
+    else:
+        embeddings = list(embeddings)
+        dims = {np.asarray(e).size for e in embeddings if isinstance(e, np.ndarray) and e.size > 0}
+        if len(dims) > 1:
+            raise ValueError(f"Embeddings have inconsistent dimensions: {sorted(dims)}")
+        dim = dims.pop() if dims else 0
+        matrix = np.zeros((len(embeddings), dim), dtype=np.float32)
+        for i, embedding in enumerate(embeddings):
+            if not isinstance(embedding, np.ndarray) or embedding.size == 0:
+                logger.warning("Skipping invalid or empty embedding at index %d", i)
+                continue
+            matrix[i] = np.asarray(embedding, dtype=np.float32).ravel()
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+class MatrixSearchEngine:
     """
-    Search for chunks similar to the query using vector similarity.
+    Exact cosine-similarity search over a pre-normalized float32 embedding matrix.
+
+    The matrix is built once (at initialization) so each query costs a single
+    matrix-vector product plus a partial top-k selection.
+
+    Args:
+        embeddings (list or np.ndarray): Embedding vectors, one per chunk
+        normalized (bool): Embeddings are already a unit-row float32 matrix (e.g. a
+            read-only memmap from the embedding store); use it as-is without copying
+    """
+
+    def __init__(self, embeddings, normalized=False):
+        if normalized and isinstance(embeddings, np.ndarray) and embeddings.dtype == np.float32 \
+                and embeddings.ndim == 2 and embeddings.flags.c_contiguous:
+            self.matrix = embeddings
+        else:
+            self.matrix = normalize_embeddings(embeddings)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def score(self, query_embedding):
+        """Return cosine similarities between the query and every chunk."""
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self), dtype=np.float32)
+        scores = self.matrix @ (query / norm)
+        # Clamp to [-1, 1] to absorb floating point drift
+        return np.clip(scores, -1.0, 1.0, out=scores)
+
+    def search(self, query_embedding, k, mask=None):
+        """
+        Find the k highest-scoring chunks for a query.
+
+        Args:
+            query_embedding (np.ndarray): The query vector (need not be normalized)
+            k (int): Number of results to return
+            mask (np.ndarray): Optional bool array; only True rows are eligible
+
+        Returns:
+            tuple: (scores, indices) as numpy arrays sorted by descending score
+        """
+        return select_top_k(self.score(query_embedding), k, mask=mask)
+
+    def score_rows(self, query_embedding, rows):
+        """Cosine similarities between the query and only the given rows (ascending row numbers)."""
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(rows), dtype=np.float32)
+        scores = self.matrix[rows] @ (query / norm)
+        return np.clip(scores, -1.0, 1.0, out=scores)
+
+    def search_batch(self, query_embeddings, k, masks=None, block_size=256):
+        """
+        Search many queries with one matrix-matrix product per block of queries.
+
+        Args:
+            query_embeddings (np.ndarray): (m, dim) query matrix
+            k (int): Number of results per query
+            masks (list): Optional per-query bool masks (None entries = no restriction)
+            block_size (int): Queries scored per product, bounding the (block, n) score matrix
+
+        Returns:
+            list: (scores, indices) per query, as returned by search()
+        """
+        queries = normalize_embeddings(np.asarray(query_embeddings, dtype=np.float32))
+        results = []
+        for start in range(0, len(queries), block_size):
+            scores = queries[start:start + block_size] @ self.matrix.T
+            np.clip(scores, -1.0, 1.0, out=scores)
+            for row in range(scores.shape[0]):
+                mask = masks[start + row] if masks is not None else None
+                results.append(select_top_k(scores[row], k, mask=mask))
+        return results
+
+def select_top_k(scores, k, mask=None):
+    """
+    Pick the k largest scores with a partial selection instead of a full sort.
+
+    Args:
+        scores (np.ndarray): 1-D array of similarity scores
+        k (int): Number of results to keep
+        mask (np.ndarray): Optional bool array; only True entries are eligible
+
+    Returns:
+        tuple: (scores, indices) of the top k entries, highest first
+    """
+    if mask is not None:
+        eligible = np.flatnonzero(mask)
+        top_scores, top_positions = select_top_k(scores[eligible], k)
+        return top_scores, eligible[top_positions]
+    n = scores.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(scores, n - k)[n - k:]
+    else:
+        candidates = np.arange(n)
+    # Stable sort on the small candidate set keeps ties in chunk order, like the old list sort
+    order = np.argsort(-scores[candidates], kind="stable")
+    top = candidates[order]
+    return scores[top], top
+
+# ======================================================================
+# LEXICAL + DENSE RETRIEVAL (see lexical_index)
+# ======================================================================
+def _score_rows(engine, query_embedding, rows):
+    """Dense scores of specific rows; engines without score_rows are searched with a row mask."""
+    if hasattr(engine, "score_rows"):
+        return engine.score_rows(query_embedding, rows)
+    mask = np.zeros(len(engine), dtype=bool)
+    mask[rows] = True
+    scores, indices = engine.search(query_embedding, len(rows), mask=mask)
+    out = np.full(len(rows), -1.0, dtype=np.float32) # Rows an approximate index didn't return rank last
+    out[np.searchsorted(rows, indices)] = scores
+    return out
+
+def _lexical_search(engine, lexical_index, query, query_embedding, k, mask, mode):
+    """
+    Top k (scores, indices) for the lexical retrieval modes.
+
+    lexical_prefilter: dense scores are computed only for the SHADOW_LEXICAL_CANDIDATES best
+        BM25 rows, so identifier queries touch a handful of rows instead of the whole matrix.
+    hybrid: dense top candidates and BM25 top candidates are merged and each scored as
+        dense + w * bm25_norm * (1 - dense), bm25_norm being BM25 divided by the query's best
+        BM25 score. Scores stay cosine-like (never lowered, never above 1), so similarity
+        thresholds keep their meaning while exact term matches are pulled up.
+    Queries without any indexed term fall back to plain dense search in both modes.
+    """
+    bm25 = lexical_index.score(query, mask=mask)
+    lexical_rows = np.flatnonzero(bm25 > 0)
+    if len(lexical_rows) == 0:
+        return engine.search(query_embedding, k, mask=mask)
+    limit = max(k, env.LEXICAL_CANDIDATES)
+    if len(lexical_rows) > limit:
+        lexical_rows = np.sort(lexical_rows[np.argpartition(-bm25[lexical_rows], limit - 1)[:limit]])
+
+    if mode == "lexical_prefilter":
+        top_scores, top = select_top_k(_score_rows(engine, query_embedding, lexical_rows), k)
+        return top_scores, lexical_rows[top]
+
+    dense_scores, dense_rows = engine.search(query_embedding, limit, mask=mask)
+    rows = np.union1d(dense_rows, lexical_rows)
+    dense = np.empty(len(rows), dtype=np.float32)
+    known = np.isin(rows, dense_rows)
+    dense[np.searchsorted(rows, dense_rows)] = dense_scores
+    if not known.all():
+        dense[~known] = _score_rows(engine, query_embedding, rows[~known])
+    lexical = bm25[rows] / bm25[lexical_rows].max()
+    fused = dense + env.HYBRID_LEXICAL_WEIGHT * lexical * (1.0 - dense)
+    top_scores, top = select_top_k(fused.astype(np.float32), k)
+    return top_scores, rows[top]
+
+def _resolve_mode(mode, chunks, lexical_index):
+    """Validate the retrieval mode and build a BM25 index on demand when one is needed."""
+    mode = mode or env.RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'. Expected one of {RETRIEVAL_MODES}.")
+    if mode != "dense" and lexical_index is None:
+        lexical_index = BM25Index(chunks, k1=env.BM25_K1, b=env.BM25_B)
+    return mode, lexical_index
+
+# ======================================================================
+# DEFINE THE SEARCH FUNCTIONS *AFTER* THE ENGINE
+# ======================================================================
+def _collect_results(chunks, top_scores, top_indices, similarity_threshold):
+    """Copy the chunks for sorted top-k hits that meet the threshold, adding their similarity."""
+    if isinstance(chunks, ChunkStore):
+        # Scores are sorted, so the hits meeting the threshold are a prefix; results are views, not copies
+        keep = int(np.count_nonzero(top_scores >= similarity_threshold))
+        rows, scores = top_indices[:keep], top_scores[:keep]
+        valid = rows < len(chunks)
+        if not valid.all():
+            logger.warning("Similarity scores found for %d invalid chunk indices (store length %d).", int((~valid).sum()), len(chunks))
+            rows, scores = rows[valid], scores[valid]
+        return chunks.views(rows.tolist(), scores.tolist())
+    results = []
+    for i, similarity in zip(top_indices.tolist(), top_scores.tolist()):
+        if similarity < similarity_threshold:
+            break
+        if i >= len(chunks):
+            logger.warning("Similarity score found for invalid chunk index %d (list length %d).", i, len(chunks))
+            continue
+        chunk = chunks[i].copy() # Use copy to avoid modifying original data
+        chunk["similarity"] = similarity # Add similarity score to the chunk dict
+        results.append(chunk)
+    return results
+
+def search_similar_chunks(query, chunks, chunk_embeddings, top_k=5, similarity_threshold=0.2,
+                          sources=None, doc_types=None, max_security_level=None, metadata_index=None,
+                          mode=None, lexical_index=None):
+    """
+    Search for chunks similar to the query using vector similarity, optionally combined
+    with BM25 lexical matching (see RETRIEVAL_MODES and _lexical_search).
+
+    Metadata predicates are evaluated as precomputed masks *before* top-k selection,
+    so every returned slot holds an eligible chunk.
 
     Args:
         query (str): The query text
         chunks (list): List of document chunks
-        chunk_embeddings (list): List of embedding vectors for chunks
+        chunk_embeddings (search engine or list): Prebuilt engine from index_backends
+            (anything with .search(query_embedding, k)), or a list of embedding
+            vectors for chunks (normalized on every call)
         top_k (int): Number of top results to return
         similarity_threshold (float): Minimum similarity score threshold
+        sources (iterable): Only consider chunks from these sources
+        doc_types (iterable): Only consider chunks of these doc types
+        max_security_level (int): Only consider chunks at or below this security level
+        metadata_index (ChunkMetadataIndex): Prebuilt masks for chunks (built on demand if omitted)
+        mode (str): One of RETRIEVAL_MODES (defaults to SHADOW_RETRIEVAL_MODE)
+        lexical_index (BM25Index): Prebuilt BM25 index for chunks (built on demand if a lexical mode needs it)
 
     Returns:
         list: List of relevant chunks with similarity scores
     """
-    logging.info(f"Searching top {top_k} chunks with threshold > {similarity_threshold}")
+    logger.info("Searching top %d chunks with threshold > %s", top_k, similarity_threshold)
 
     # Initialize results list - THIS IS IMPORTANT
     results = []
 
     # Get embedding for the query
     try:
-        query_embedding = get_query_embedding(query)
+        with metrics.span("query_embedding"):
+            query_embedding = get_query_embedding(query)
         if query_embedding is None or query_embedding.size == 0:
-            logging.error("Failed to generate query embedding.")
+            logger.error("Failed to generate query embedding.")
             return results # Return empty list
     except Exception as e:
-        logging.error(f"Error getting query embedding: {e}", exc_info=True)
+        logger.error("Error getting query embedding: %s", e, exc_info=True)
         return results # Return empty list
 
     # Check if chunk embeddings are available
-    if not chunk_embeddings:
-        logging.error("Chunk embeddings list is empty.")
+    if chunk_embeddings is None or len(chunk_embeddings) == 0:
+        logger.error("Chunk embeddings list is empty.")
         return results # Return empty list
 
-    # Calculate similarity scores
-    similarities = []
-    for i, chunk_embedding in enumerate(chunk_embeddings):
-        # Ensure chunk_embedding is valid
-        if not isinstance(chunk_embedding, np.ndarray) or chunk_embedding.size == 0:
-             logging.warning(f"Skipping invalid or empty embedding at index {i}")
-             similarities.append((i, 0.0)) # Assign 0 similarity for invalid embedding
-             continue
-
-        try:
-             # Make the call to the function defined above
-             similarity = cosine_similarity(query_embedding, chunk_embedding)
-             similarities.append((i, similarity))
-        except Exception as e:
-             # Log the specific exception
-             logging.error(f"Error calculating similarity for chunk {i}: {e}", exc_info=True)
-             similarities.append((i, 0.0)) # Assign 0 similarity on error
-
-    # Sort by similarity score (descending)
-    similarities.sort(key=lambda x: x[1], reverse=True)
+    engine = chunk_embeddings if hasattr(chunk_embeddings, "search") else MatrixSearchEngine(chunk_embeddings)
 
-    # Debug log: Show top scores before filtering
-    logging.debug("Top similarity scores before threshold:")
-    for idx, sim in similarities[:max(top_k, 10)]:
-        logging.debug(f"  Index {idx}: {sim:.4f}")
-
-    # Filter results by threshold and take top_k
-    for i, similarity in similarities:
-        # Stop if we already have enough results
-        if len(results) >= top_k:
-             logging.debug(f"Reached top_k limit ({top_k}). Stopping search.")
-             break
-
-        # Check if similarity meets threshold
-        if similarity >= similarity_threshold:
-            # Ensure index is valid before accessing chunks list
-            if i < len(chunks):
-                try:
-                    chunk = chunks[i].copy() # Use copy to avoid modifying original data
-                    chunk["similarity"] = similarity # Add similarity score to the chunk dict
-                    results.append(chunk)
-                except IndexError:
-                     logging.warning(f"IndexError: Attempted to access chunk at invalid index {i} (list length {len(chunks)}).")
-                except Exception as e:
-                     logging.error(f"Error processing chunk {i} after meeting threshold: {e}", exc_info=True)
+    # Push metadata predicates down into the search as a bitmap
+    mask = None
+    if sources is not None or doc_types is not None or max_security_level is not None:
+        with metrics.span("metadata_filter"):
+            if metadata_index is None:
+                metadata_index = ChunkMetadataIndex(chunks)
+            mask = metadata_index.mask(sources=sources, doc_types=doc_types, max_security_level=max_security_level)
+        if not mask.any():
+            logger.info("No chunks satisfy the metadata predicates.")
+            return results
+
+    # Score every chunk with one matrix-vector product (or only lexical candidates) and keep the top_k
+    try:
+        mode, lexical_index = _resolve_mode(mode, chunks, lexical_index)
+        with metrics.span("vector_search"):
+            if mode == "dense":
+                top_scores, top_indices = engine.search(query_embedding, top_k, mask=mask)
             else:
-                 logging.warning(f"Similarity score found for invalid chunk index {i} (list length {len(chunks)}).")
-        # Optional: Log if a chunk is skipped due to threshold
-        # else:
-        #    logging.debug(f"Chunk {i} similarity {similarity:.4f} below threshold {similarity_threshold}. Skipping.")
+                top_scores, top_indices = _lexical_search(engine, lexical_index, query, query_embedding, top_k, mask, mode)
+    except Exception as e:
+        logger.error("Error calculating similarities: %s", e, exc_info=True)
+        return results
+
+    # Debug log: Show top scores before filtering
+    if logger.isEnabledFor(logging.DEBUG): # Skip the per-hit loop entirely unless DEBUG is on
+        logger.debug("Top similarity scores before threshold:")
+        for idx, sim in zip(top_indices, top_scores):
+            logger.debug("  Index %d: %.4f", idx, sim)
+
+    # Filter results by threshold (scores are already sorted and capped at top_k)
+    results = _collect_results(chunks, top_scores, top_indices, similarity_threshold)
+
+    logger.info("Found %d relevant chunks meeting threshold %s for query: %.50s...", len(results), similarity_threshold, query)
+    return results
+
+def search_similar_chunks_batch(query_embeddings, chunks, chunk_embeddings, top_k=5, similarity_threshold=0.2, masks=None,
+                                queries=None, mode=None, lexical_index=None):
+    """
+    Batch counterpart of search_similar_chunks for precomputed query embeddings.
+
+    Args:
+        query_embeddings (np.ndarray): (m, dim) query matrix (see get_query_embeddings)
+        chunks (list): List of document chunks
+        chunk_embeddings (search engine or list): Prebuilt engine or raw chunk embeddings
+        top_k (int): Number of top results per query
+        similarity_threshold (float): Minimum similarity score threshold
+        masks (list): Optional per-query bool masks from ChunkMetadataIndex.mask
+        queries (list): Query texts matching query_embeddings; required for the lexical modes
+        mode (str): One of RETRIEVAL_MODES (defaults to SHADOW_RETRIEVAL_MODE; dense without queries)
+        lexical_index (BM25Index): Prebuilt BM25 index for chunks
+
+    Returns:
+        list: One list of relevant chunks (with similarity scores) per query
+    """
+    if len(query_embeddings) == 0:
+        return []
+    if chunk_embeddings is None or len(chunk_embeddings) == 0:
+        logger.error("Chunk embeddings list is empty.")
+        return [[] for _ in range(len(query_embeddings))]
+
+    engine = chunk_embeddings if hasattr(chunk_embeddings, "search") else MatrixSearchEngine(chunk_embeddings)
+    mode, lexical_index = _resolve_mode(mode if queries is not None else "dense", chunks, lexical_index)
+    if mode != "dense":
+        hits = [_lexical_search(engine, lexical_index, queries[i], query, top_k, masks[i] if masks is not None else None, mode)
+                for i, query in enumerate(query_embeddings)]
+    elif hasattr(engine, "search_batch"):
+        hits = engine.search_batch(query_embeddings, top_k, masks=masks)
+    else:
+        hits = [engine.search(query, top_k, mask=masks[i] if masks is not None else None)
+                for i, query in enumerate(query_embeddings)]
 
-    logging.info(f"Found {len(results)} relevant chunks meeting threshold {similarity_threshold} for query: {query[:50]}...")
+    results = [_collect_results(chunks, scores, indices, similarity_threshold) for scores, indices in hits]
+    logger.info("Batch search: %d queries, %d with results above threshold %s.", len(results), sum(1 for r in results if r), similarity_threshold)
     return results
 
 # --- END OF FILE src/retrieval/vector_search.py ---
\ No newline at end of file
@@ -0,0 +1,129 @@
+# --- START OF FILE environment.py ---
+# Central runtime configuration. Every setting can be overridden with a SHADOW_* environment variable.
+
+import os
+
+def _env_str(name, default):
+    value = os.environ.get(name)
+    return value.strip() if value and value.strip() else default
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    try:
+        return int(value) if value not in (None, "") else default
+    except ValueError:
+        return default
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    try:
+        return float(value) if value not in (None, "") else default
+    except ValueError:
+        return default
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# --- Paths ---
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = _env_str("SHADOW_DATA_DIR", os.path.join(PROJECT_ROOT, "data"))
+CACHE_DIR = _env_str("SHADOW_CACHE_DIR", os.path.join(PROJECT_ROOT, ".shadow_cache"))
+
+# --- Ingestion ---
+# Optional corpus manifest (file/glob -> source name and classification); defaults to <DATA_DIR>/manifest.json
+DOCUMENT_MANIFEST = _env_str("SHADOW_DOCUMENT_MANIFEST", os.path.join(DATA_DIR, "manifest.json"))
+DEFAULT_DOC_TYPE = _env_str("SHADOW_DEFAULT_DOC_TYPE", "classified") # For files the manifest doesn't mention
+INGEST_WORKERS = _env_int("SHADOW_INGEST_WORKERS", 1) # Process pool size for parsing + chunking (1 = in-process)
+# A pool only pays off for directory-scale ingests; smaller ones (and most refreshes) stay in-process
+INGEST_PARALLEL_MIN_DOCS = _env_int("SHADOW_INGEST_PARALLEL_MIN_DOCS", 16)
+INGEST_PARALLEL_MIN_BYTES = _env_int("SHADOW_INGEST_PARALLEL_MIN_BYTES", 8_000_000)
+# Full builds overlap reading, chunking and embedding (reader threads -> chunker -> embedder)
+BUILD_PIPELINE = _env_bool("SHADOW_BUILD_PIPELINE", True)
+PIPELINE_READERS = _env_int("SHADOW_PIPELINE_READERS", 4)
+PIPELINE_QUEUE_SIZE = _env_int("SHADOW_PIPELINE_QUEUE_SIZE", 16) # Documents in flight between readers and chunker
+PIPELINE_EMBED_BATCH = _env_int("SHADOW_PIPELINE_EMBED_BATCH", 64) # Chunks per embedding call
+# initialize_system(force=True) on a running system re-chunks/re-embeds only changed documents
+INCREMENTAL_INGEST = _env_bool("SHADOW_INCREMENTAL_INGEST", True)
+# Keep the corpus in a columnar ChunkStore (text buffer + metadata columns) instead of per-chunk dicts
+CHUNK_STORE = _env_bool("SHADOW_CHUNK_STORE", True)
+
+# --- Embeddings ---
+EMBEDDING_MODEL = _env_str("SHADOW_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_CACHE = _env_bool("SHADOW_EMBEDDING_CACHE", True)
+# Inference backend: torch (PyTorch), onnx (ONNX Runtime float32) or onnx_int8 (dynamically quantized)
+EMBEDDING_BACKEND = _env_str("SHADOW_EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_THREADS = _env_int("SHADOW_EMBEDDING_THREADS", 0) # Intra-op threads (0 = library default)
+ONNX_QUANTIZATION = _env_str("SHADOW_ONNX_QUANTIZATION", "avx2") # arm64, avx2, avx512 or avx512_vnni
+# In-memory LRU of query embeddings (size 0 disables, TTL 0 = no expiry)
+QUERY_CACHE_SIZE = _env_int("SHADOW_QUERY_CACHE_SIZE", 1024)
+QUERY_CACHE_TTL = _env_int("SHADOW_QUERY_CACHE_TTL", 3600)
+# Chunk encoding: length-sorted batches of at most this many padded tokens (and rows)
+EMBED_TOKEN_BUDGET = _env_int("SHADOW_EMBED_TOKEN_BUDGET", 8192)
+EMBED_MAX_BATCH = _env_int("SHADOW_EMBED_MAX_BATCH", 256)
+# Multi-process encoding for large (re)builds: worker processes, each with its own model (1 = single process)
+EMBED_WORKERS = _env_int("SHADOW_EMBED_WORKERS", 1)
+EMBED_PARALLEL_MIN_CHUNKS = _env_int("SHADOW_EMBED_PARALLEL_MIN_CHUNKS", 4096) # Smaller jobs don't repay worker start-up
+# Normalized chunk matrix shared read-only (np.memmap) by every process on the node
+EMBEDDING_STORE = _env_bool("SHADOW_EMBEDDING_STORE", True)
+EMBEDDING_STORE_PATH = _env_str("SHADOW_EMBEDDING_STORE_PATH", os.path.join(CACHE_DIR, "chunk_embeddings.f32"))
+# Compressed chunk matrix for the 'matrix' index backend: none, float16, int8 or pq
+EMBEDDING_QUANTIZATION = _env_str("SHADOW_EMBEDDING_QUANTIZATION", "none").lower()
+QUANTIZED_RESCORE = _env_bool("SHADOW_QUANTIZED_RESCORE", True) # Exact float32 rescoring of the top candidates
+QUANTIZED_RESCORE_FACTOR = _env_int("SHADOW_QUANTIZED_RESCORE_FACTOR", 4) # Candidates kept per requested result
+PQ_SUBVECTORS = _env_int("SHADOW_PQ_SUBVECTORS", 96) # One byte per sub-vector (96 -> 16x smaller for 384 dims)
+
+# --- Response cache (process_query results per query + clearance level) ---
+RESPONSE_CACHE_SIZE = _env_int("SHADOW_RESPONSE_CACHE_SIZE", 512)
+RESPONSE_CACHE_TTL = _env_int("SHADOW_RESPONSE_CACHE_TTL", 600)
+
+# --- Batch query API / CLI ---
+BATCH_WORKERS = _env_int("SHADOW_BATCH_WORKERS", 1) # Process pool size for rule matching/formatting (1 = in-process)
+BATCH_PARALLEL_MIN = _env_int("SHADOW_BATCH_PARALLEL_MIN", 2000) # Uncached queries a batch needs before it fans out
+QUERY_BATCH_SIZE = _env_int("SHADOW_QUERY_BATCH_SIZE", 128) # Model batch size when encoding many queries
+
+# --- Headless query server (src/app/server.py) and its clients ---
+SERVER_HOST = _env_str("SHADOW_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = _env_int("SHADOW_SERVER_PORT", 8765)
+SERVER_SOCKET = _env_str("SHADOW_SERVER_SOCKET", "") # Unix socket path; takes precedence over host/port
+SERVER_WORKERS = _env_int("SHADOW_SERVER_WORKERS", 4) # Threads running backend work off the event loop
+SERVER_TIMEOUT = _env_int("SHADOW_SERVER_TIMEOUT", 120) # Client-side seconds to wait for an answer
+SERVER_FALLBACK = _env_bool("SHADOW_SERVER_FALLBACK", True) # Clients run the backend in-process if no server answers
+WARMUP = _env_bool("SHADOW_WARMUP", True) # Load the model and corpus in a background thread at process start
+
+# --- Logging (src/setup/logging_config.py) ---
+LOG_MODE = _env_str("SHADOW_LOG_MODE", "development").lower() # development (inline) or production (queued, sampled)
+LOG_LEVEL = _env_str("SHADOW_LOG_LEVEL", "") # "" = DEBUG in development, INFO in production
+LOG_QUEUE_SIZE = _env_int("SHADOW_LOG_QUEUE_SIZE", 10000) # Records waiting for the writer thread; overflow is dropped
+LOG_SAMPLE_RATE = _env_float("SHADOW_LOG_SAMPLE_RATE", 0.01) # Fraction of per-item DEBUG lines kept (production)
+# Loggers whose DEBUG lines are sampled, comma-separated; "name=rate" overrides the rate for one logger
+LOG_SAMPLED_LOGGERS = _env_str("SHADOW_LOG_SAMPLED_LOGGERS",
+                               "src.retrieval.security_filter,src.data_processing.chunk_and_annotate,src.retrieval.vector_search")
+
+# --- Metrics (src/setup/metrics.py) ---
+METRICS_ENABLED = _env_bool("SHADOW_METRICS", True) # Per-stage latency histograms and status / rule counters
+METRICS_FILE = _env_str("SHADOW_METRICS_FILE", "") # Prometheus text file rewritten periodically ("" = off)
+METRICS_INTERVAL = _env_int("SHADOW_METRICS_INTERVAL", 15) # Seconds between metrics file writes
+
+# --- Vector index ---
+# One of: matrix (exact numpy), faiss_flat (exact), faiss_ivf, faiss_hnsw (approximate)
+INDEX_BACKEND = _env_str("SHADOW_INDEX_BACKEND", "matrix").lower()
+INDEX_PERSIST = _env_bool("SHADOW_INDEX_PERSIST", True)
+INDEX_DIR = _env_str("SHADOW_INDEX_DIR", os.path.join(CACHE_DIR, "index"))
+FAISS_IVF_NLIST = _env_int("SHADOW_FAISS_IVF_NLIST", 0) # 0 = pick from corpus size
+FAISS_IVF_NPROBE = _env_int("SHADOW_FAISS_IVF_NPROBE", 8)
+FAISS_HNSW_M = _env_int("SHADOW_FAISS_HNSW_M", 32)
+FAISS_HNSW_EF_CONSTRUCTION = _env_int("SHADOW_FAISS_HNSW_EF_CONSTRUCTION", 200)
+FAISS_HNSW_EF_SEARCH = _env_int("SHADOW_FAISS_HNSW_EF_SEARCH", 64)
+
+# --- Lexical retrieval (BM25 inverted index, see src/retrieval/lexical_index.py) ---
+# dense (vectors only), hybrid (dense + BM25 score fusion) or lexical_prefilter (dense on BM25 candidates only)
+RETRIEVAL_MODE = _env_str("SHADOW_RETRIEVAL_MODE", "dense").lower()
+HYBRID_LEXICAL_WEIGHT = _env_float("SHADOW_HYBRID_LEXICAL_WEIGHT", 0.3) # 0..1; how far an exact match pulls a score towards 1
+LEXICAL_CANDIDATES = _env_int("SHADOW_LEXICAL_CANDIDATES", 256) # BM25 rows considered per query
+BM25_K1 = _env_float("SHADOW_BM25_K1", 1.2)
+BM25_B = _env_float("SHADOW_BM25_B", 0.75)
+
+# --- END OF FILE environment.py ---
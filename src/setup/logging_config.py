@@ -0,0 +1,158 @@
+# --- START OF FILE logging_config.py ---
+# Process-wide logging setup for the app, server and CLIs.
+#
+# development (default): records are formatted and written on the calling thread (logging.basicConfig).
+# production: the calling thread renders the message and enqueues the record; a QueueListener thread
+# formats and writes it. Per-item DEBUG lines from the hot-path loggers (SHADOW_LOG_SAMPLED_LOGGERS)
+# are sampled down to SHADOW_LOG_SAMPLE_RATE before they are even queued, and a full queue drops
+# records instead of blocking.
+
+import sys
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+from src.setup import environment as env
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+LOG_MODES = ("development", "production")
+
+_configured = False
+_lock = threading.Lock()
+_listener = None
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep 1 in every 1/rate records below INFO from the configured loggers (and their children).
+
+    Counting instead of random sampling keeps the decision to one integer increment.
+    INFO and above always pass.
+
+    Args:
+        rates (dict): Logger name -> fraction of DEBUG records to keep (0..1)
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._counters = {}
+        self._resolved = {}
+
+    def _rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        count = self._counters.get(record.name, 0)
+        self._counters[record.name] = count + 1
+        return count % round(1.0 / rate) == 0
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves the final formatting (timestamp, level, name) to the listener thread.
+
+    Like the stock prepare(), the message (msg % args) and exception traceback are rendered
+    on the calling thread, so the record holds the values as they were at call time.
+    Records are put without blocking; when the queue is full they are dropped and counted.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render msg % args now: arguments such as a metadata dict may change before the listener runs.
+        # Sampled-out records never get here (handler filters run first), so only kept records pay for it.
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _parse_sampled_loggers(spec, default_rate):
+    """'a.b,c.d=0.1' -> {'a.b': default_rate, 'c.d': 0.1}"""
+    rates = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = entry.partition("=")
+        try:
+            rates[name.strip()] = float(rate) if rate else default_rate
+        except ValueError:
+            rates[name.strip()] = default_rate
+    return rates
+
+def configure_logging(level=None, mode=None, force=False):
+    """
+    Configure the root logger once per process (later calls are no-ops unless force is set,
+    so Streamlit reruns of app.py don't stack handlers).
+
+    Args:
+        level (str or int): Root level (defaults to SHADOW_LOG_LEVEL, else DEBUG in development / INFO in production)
+        mode (str): One of LOG_MODES (defaults to SHADOW_LOG_MODE)
+        force (bool): Replace an earlier configuration
+
+    Returns:
+        str: The mode that was applied
+    """
+    global _configured, _listener
+    mode = (mode or env.LOG_MODE).lower()
+    if mode not in LOG_MODES:
+        raise ValueError(f"Unknown log mode '{mode}'. Expected one of {LOG_MODES}.")
+    with _lock:
+        if _configured and not force:
+            return mode
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        level = level or env.LOG_LEVEL or ("INFO" if mode == "production" else "DEBUG")
+        level = level.upper() if isinstance(level, str) else level
+
+        if mode == "development":
+            logging.basicConfig(level=level, format=LOG_FORMAT, force=force)
+        else:
+            stream_handler = logging.StreamHandler(sys.stderr)
+            stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            log_queue = queue.Queue(maxsize=max(0, env.LOG_QUEUE_SIZE))
+            queue_handler = DeferredQueueHandler(log_queue)
+            queue_handler.addFilter(SamplingFilter(_parse_sampled_loggers(env.LOG_SAMPLED_LOGGERS, env.LOG_SAMPLE_RATE)))
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(queue_handler)
+            root.setLevel(level)
+            _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+            _listener.start()
+            atexit.register(_stop_listener) # Flush what is still queued on interpreter exit
+        _configured = True
+    return mode
+
+def _stop_listener():
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+# --- END OF FILE logging_config.py ---
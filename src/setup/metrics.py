@@ -0,0 +1,223 @@
+# --- START OF FILE metrics.py ---
+# In-process latency and outcome metrics for the query path.
+#
+#   with metrics.span("vector_search"):      # per-stage latency histogram
+#       ...
+#   metrics.increment("queries", status="success")
+#
+# snapshot() returns a dict (counts, mean and bucket-estimated p50/p95/p99 per stage);
+# render_prometheus() returns the Prometheus text exposition format. With SHADOW_METRICS_FILE
+# set, a daemon thread rewrites that file every SHADOW_METRICS_INTERVAL seconds (for the
+# node_exporter textfile collector or any scraper that reads files).
+
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+
+from src.setup import environment as env
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (tens of microseconds for rule matching up to multi-second cold starts)
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "shadow"
+
+class _Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # Last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Bucket-interpolated quantile in seconds (the Prometheus histogram_quantile estimate)."""
+        if self.count == 0:
+            return None
+        rank, seen = q * self.count, 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count > 0:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+
+class MetricsRegistry:
+    """Thread-safe stage histograms and labelled counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._started = time.time()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = _Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._started = time.time()
+
+    def drain(self):
+        """Return and clear the raw histograms and counters (e.g. of a pool worker, to merge into the parent)."""
+        with self._lock:
+            state = ({stage: (list(h.counts), h.count, h.total) for stage, h in self._histograms.items()}, dict(self._counters))
+            self._histograms.clear()
+            self._counters.clear()
+        return state
+
+    def merge(self, state):
+        """Add histograms and counters returned by drain() in another process."""
+        histograms, counters = state
+        with self._lock:
+            for stage, (counts, count, total) in histograms.items():
+                histogram = self._histograms.get(stage)
+                if histogram is None:
+                    histogram = self._histograms[stage] = _Histogram()
+                histogram.counts = [mine + theirs for mine, theirs in zip(histogram.counts, counts)]
+                histogram.count += count
+                histogram.total += total
+            for key, amount in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: {"uptime_seconds", "stages": {stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}},
+                   "counters": {name: {"label=value,...": count}}}
+        """
+        with self._lock:
+            histograms = {stage: (h.count, h.total, [h.quantile(q) for q in (0.5, 0.95, 0.99)]) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+        stages = {}
+        for stage, (count, total, quantiles) in sorted(histograms.items()):
+            stages[stage] = {"count": count, "mean_ms": round(1000 * total / count, 3) if count else None,
+                             **{f"p{p}_ms": round(1000 * value, 3) if value is not None else None
+                                for p, value in zip((50, 95, 99), quantiles)}}
+        grouped = {}
+        for (name, labels), value in sorted(counters.items()):
+            grouped.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = value
+        return {"uptime_seconds": round(time.time() - self._started, 1), "stages": stages, "counters": grouped}
+
+    def render_prometheus(self):
+        """Prometheus text exposition of every histogram and counter."""
+        with self._lock:
+            histograms = {stage: (list(h.counts), h.count, h.total) for stage, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = [f"# HELP {PREFIX}_stage_duration_seconds Latency of each query-processing stage.",
+                 f"# TYPE {PREFIX}_stage_duration_seconds histogram"]
+        for stage, (counts, count, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(list(BUCKETS) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f'{PREFIX}_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{PREFIX}_stage_duration_seconds_count{{stage="{stage}"}} {count}')
+
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                    lines.append(f"{PREFIX}_{name}_total{{{label_text}}} {value}" if label_text else f"{PREFIX}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# ======================================================================
+# MODULE-LEVEL REGISTRY AND HELPERS
+# ======================================================================
+registry = MetricsRegistry()
+_exporter = None
+_exporter_lock = threading.Lock()
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block into the stage's latency histogram (also when it raises)."""
+    if not env.METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(stage, time.perf_counter() - started)
+        if env.METRICS_FILE and _exporter is None:
+            start_file_exporter()
+
+def observe(stage, seconds):
+    if env.METRICS_ENABLED:
+        registry.observe(stage, seconds)
+
+def increment(name, amount=1, **labels):
+    if env.METRICS_ENABLED:
+        registry.increment(name, amount, **labels)
+
+def drain():
+    return registry.drain()
+
+def merge(state):
+    registry.merge(state)
+
+def snapshot():
+    return registry.snapshot()
+
+def render_prometheus():
+    return registry.render_prometheus()
+
+def write_metrics_file(path=None):
+    """Atomically replace path (defaults to SHADOW_METRICS_FILE) with the Prometheus text."""
+    path = path or env.METRICS_FILE
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.write(render_prometheus())
+    os.replace(temporary, path) # Scrapers never see a half-written file
+
+def start_file_exporter(path=None, interval=None):
+    """Start the daemon thread that rewrites the metrics file periodically (once per process)."""
+    global _exporter
+    path, interval = path or env.METRICS_FILE, max(1, interval or env.METRICS_INTERVAL)
+    if not path:
+        return
+    with _exporter_lock:
+        if _exporter is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    write_metrics_file(path)
+                except OSError as e:
+                    logger.warning(f"Could not write metrics file {path}: {e}")
+                time.sleep(interval)
+
+        _exporter = threading.Thread(target=run, name="shadow-metrics-exporter", daemon=True)
+        _exporter.start()
+    logger.info(f"Writing Prometheus metrics to {path} every {interval}s.")
+
+# --- END OF FILE metrics.py ---
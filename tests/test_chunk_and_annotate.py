@@ -0,0 +1,114 @@
+# --- START OF FILE tests/test_chunk_and_annotate.py ---
+# Streaming chunker invariants: size bound, overlap, level boundaries and paragraph splitting.
+
+import io
+import os
+
+import pytest
+
+from src.data_processing.chunk_and_annotate import create_chunks, iter_chunks, iter_paragraphs
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+CHUNK_SIZE, OVERLAP = 300, 60
+
+def _sentence(i):
+    return f"Paragraph {i} describes field procedure number {i} in plain words for the handbook."
+
+def _document(content, doc_type="classified"):
+    return {"Doc": {"content": content, "metadata": {"type": doc_type}}}
+
+LEVELLED_TEXT = "\n\n".join([
+    "# Basic Procedures", *(_sentence(i) for i in range(8)),
+    "## Level 3 Black Site Operations", *(_sentence(i) for i in range(8, 16)),
+    "## Covert Safehouse Protocol", *(_sentence(i) for i in range(16, 24)),
+    "## Canteen Menu", *(_sentence(i) for i in range(24, 30)),
+])
+
+def _chunk_levels():
+    return list(iter_chunks(_document(LEVELLED_TEXT), chunk_size=CHUNK_SIZE, overlap=OVERLAP))
+
+def test_chunks_respect_chunk_size():
+    assert all(len(chunk["text"]) <= CHUNK_SIZE for chunk in _chunk_levels())
+
+def test_header_levels():
+    levels = {chunk["metadata"]["section"]: chunk["metadata"]["security_level"] for chunk in _chunk_levels()}
+    assert levels == {"Basic Procedures": 1, "Level 3 Black Site Operations": 3,
+                      "Covert Safehouse Protocol": 2, "Canteen Menu": 1}
+
+def test_unclassified_documents_stay_level_zero():
+    chunks = iter_chunks(_document(LEVELLED_TEXT, doc_type="public"), chunk_size=CHUNK_SIZE, overlap=OVERLAP)
+    assert {chunk["metadata"]["security_level"] for chunk in chunks} == {0}
+
+def test_overlap_within_a_level():
+    chunks = _chunk_levels()
+    pairs = [(prev, nxt) for prev, nxt in zip(chunks, chunks[1:])
+             if prev["metadata"]["security_level"] == nxt["metadata"]["security_level"]]
+    assert pairs
+    for prev, nxt in pairs:
+        carried = nxt["text"].split("\n\n", 1)[0]
+        assert prev["text"].endswith(carried) and len(carried) <= OVERLAP
+
+def test_overlap_never_crosses_a_level_change():
+    chunks = _chunk_levels()
+    for prev, nxt in zip(chunks, chunks[1:]):
+        if prev["metadata"]["security_level"] != nxt["metadata"]["security_level"]:
+            assert nxt["text"].startswith("Paragraph ")
+            assert not prev["text"].endswith(nxt["text"].split("\n\n", 1)[0])
+
+def _sentence_level(i):
+    return 1 if i < 8 or i >= 24 else 3 if i < 16 else 2
+
+def test_every_paragraph_is_kept():
+    texts = [chunk["text"] for chunk in _chunk_levels()]
+    assert all(any(_sentence(i) in text for text in texts) for i in range(30))
+
+def test_chunk_level_is_that_of_its_last_paragraph():
+    # A chunk takes the level of the last header seen before it was finished
+    for chunk in _chunk_levels():
+        last = int(chunk["text"].rsplit("Paragraph ", 1)[1].split()[0])
+        assert chunk["metadata"]["security_level"] == _sentence_level(last)
+
+def test_ids_are_deterministic_and_unique():
+    first, second = _chunk_levels(), _chunk_levels()
+    assert [chunk["id"] for chunk in first] == [chunk["id"] for chunk in second]
+    assert len({chunk["id"] for chunk in first}) == len(first)
+
+def test_line_stream_matches_content_string():
+    streamed = iter_chunks({"Doc": {"lines": io.StringIO(LEVELLED_TEXT), "metadata": {"type": "classified"}}},
+                           chunk_size=CHUNK_SIZE, overlap=OVERLAP)
+    assert list(streamed) == _chunk_levels()
+
+def test_long_paragraph_is_split_at_line_and_word_boundaries():
+    lines = [f"Rule {i}: If a query mentions topic {i}, respond with answer {i}.\n" for i in range(40)]
+    pieces = list(iter_paragraphs(lines, max_length=200))
+    assert len(pieces) > 1
+    assert [continued for _, continued in pieces] == [False] + [True] * (len(pieces) - 1)
+    assert all(len(text) <= 200 and text.startswith("Rule ") and text.endswith(".") for text, _ in pieces)
+    assert "\n".join(text for text, _ in pieces) == "".join(lines).strip()
+
+def test_word_split_without_line_breaks():
+    words = " ".join(f"word{i}" for i in range(100))
+    pieces = [text for text, _ in iter_paragraphs([words], max_length=50)]
+    assert " ".join(pieces) == words and all(len(text) <= 50 for text in pieces)
+
+def test_continuation_piece_is_never_a_header():
+    # The second piece of this over-long paragraph starts with '#'; it must not open a level-3 section
+    text = "# Lobby Notes\n\n" + "A" * 40 + "\n# Black Site Termination orders follow here"
+    chunks = list(iter_chunks(_document(text), chunk_size=60, overlap=0))
+    assert {chunk["metadata"]["section"] for chunk in chunks} == {"Lobby Notes"}
+    assert {chunk["metadata"]["security_level"] for chunk in chunks} == {1}
+    assert any(chunk["text"].startswith("# Black Site") for chunk in chunks)
+
+@pytest.mark.parametrize("max_length", [200, CHUNK_SIZE * 3])
+@pytest.mark.parametrize("name", ["Response_Framework", "Secret_Info_Manual"])
+def test_corpus_paragraph_pieces_keep_words_whole(name, max_length):
+    with open(os.path.join(DATA_DIR, f"{name}.txt"), encoding="utf-8") as f:
+        content = f.read()
+    cursor = 0
+    for text, _ in iter_paragraphs(io.StringIO(content), max_length=max_length):
+        start = content.index(text, cursor)
+        end = cursor = start + len(text)
+        assert start == 0 or not content[start - 1].isalnum()
+        assert end == len(content) or not content[end].isalnum()
+
+# --- END OF FILE tests/test_chunk_and_annotate.py ---
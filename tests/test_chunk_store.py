@@ -0,0 +1,42 @@
+# --- START OF FILE tests/test_chunk_store.py ---
+# Columnar chunk store: rows read back like the chunk dicts they were built from.
+
+import pickle
+
+import numpy as np
+
+from src.retrieval.chunk_store import ChunkStore, ChunkView, security_levels_of
+
+CHUNKS = [
+    {"id": "a", "text": "Plain text", "metadata": {"source": "Manual", "doc_type": "classified", "section": "Intro", "security_level": 1}},
+    {"id": "b", "text": "Ünïcode — text ✓", "metadata": {"source": "Manual", "doc_type": "classified", "section": "Ops", "security_level": 3}},
+    {"id": "c", "text": "", "metadata": {"source": "Framework", "doc_type": "framework"}},
+]
+
+def test_rows_match_the_source_dicts():
+    store = ChunkStore(CHUNKS)
+    assert len(store) == 3
+    assert [view.to_dict() for view in store] == [
+        CHUNKS[0], CHUNKS[1], {"id": "c", "text": "", "metadata": {"source": "Framework", "doc_type": "framework", "security_level": 1}},
+    ]
+    assert store[-1].id == "c" and [view.id for view in store[1:]] == ["b", "c"]
+
+def test_view_pickles_as_a_plain_dict():
+    view = ChunkStore(CHUNKS).views([1], similarities=[0.75])[0]
+    restored = pickle.loads(pickle.dumps(view))
+    assert type(restored) is dict
+    assert restored == {**CHUNKS[1], "similarity": 0.75}
+
+def test_store_can_be_rebuilt_from_views():
+    store = ChunkStore(CHUNKS)
+    rebuilt = ChunkStore([store[2], store[0]])
+    assert [view.to_dict() for view in rebuilt] == [store[2].to_dict(), store[0].to_dict()]
+
+def test_security_levels_of_views_and_dicts():
+    store = ChunkStore(CHUNKS)
+    views = [store[1], store[2]]
+    np.testing.assert_array_equal(security_levels_of(views), [3, 1])
+    np.testing.assert_array_equal(security_levels_of([CHUNKS[1], CHUNKS[2]]), [3, 1])
+    assert isinstance(store[0], ChunkView) and store[0].get("similarity") is None
+
+# --- END OF FILE tests/test_chunk_store.py ---
@@ -0,0 +1,129 @@
+# --- START OF FILE tests/test_incremental.py ---
+# Incremental re-ingestion: change detection, chunk diff and the delta applied to the
+# embedding store and search engines (compared against a full rebuild of the same corpus).
+
+import os
+import hashlib
+
+import numpy as np
+import pytest
+
+from src.setup import environment as env
+from src.data_processing.chunk_and_annotate import iter_chunks
+from src.data_processing.incremental import detect_changed_documents, diff_chunks
+from src.retrieval.vector_search import MatrixSearchEngine, normalize_embeddings
+from src.retrieval.quantization import build_quantized_engine
+from src.retrieval.index_backends import apply_index_delta
+from src.retrieval.embedding_store import open_embedding_store, update_embedding_store, write_embedding_store
+
+def _paragraphs(prefix, count):
+    return [f"{prefix} paragraph {i}: operational detail {i} written out as a full sentence." for i in range(count)]
+
+DOC_A = "# Field Basics\n\n" + "\n\n".join(_paragraphs("Alpha", 12))
+DOC_B = "# Field Notes\n\n" + "\n\n".join(_paragraphs("Bravo", 12))
+# Bravo 3 edited, Bravo 8 removed, a new paragraph appended
+DOC_B_EDITED = "# Field Notes\n\n" + "\n\n".join(
+    [text.replace("detail 3", "detail three") for text in _paragraphs("Bravo", 12) if "paragraph 8:" not in text]
+    + ["Bravo appendix: a paragraph that did not exist before."])
+# Same text; only the header (and so the security level) changes
+DOC_B_RELABELLED = DOC_B.replace("# Field Notes", "# Black Site Notes")
+
+def _chunks(documents):
+    seen_ids = set()
+    return [chunk for name, content in documents.items()
+            for chunk in iter_chunks({name: {"content": content, "metadata": {"type": "classified"}}},
+                                     chunk_size=250, overlap=40, seen_ids=seen_ids)]
+
+def _embed(chunks):
+    """Deterministic stand-in for the model: a vector derived from the chunk text."""
+    rows = [np.frombuffer(hashlib.sha256(chunk["text"].encode("utf-8")).digest(), dtype=np.uint8) for chunk in chunks]
+    return normalize_embeddings(np.asarray(rows, dtype=np.float32) - 127.5)
+
+def _delta(new_b):
+    old = _chunks({"A": DOC_A, "B": DOC_B})
+    kept, removed_rows, added = diff_chunks(old, _chunks({"B": new_b}), {"B"})
+    return old, kept, removed_rows, added
+
+@pytest.fixture(autouse=True)
+def no_index_persistence(monkeypatch):
+    monkeypatch.setattr(env, "INDEX_PERSIST", False)
+
+def test_diff_matches_full_rebuild():
+    old, kept, removed_rows, added = _delta(DOC_B_EDITED)
+    rebuilt = _chunks({"A": DOC_A, "B": DOC_B_EDITED})
+    assert sorted(chunk["id"] for chunk in kept + added) == sorted(chunk["id"] for chunk in rebuilt)
+    assert removed_rows == sorted(removed_rows) and removed_rows
+    assert all(old[row]["metadata"]["source"] == "B" for row in removed_rows)
+    assert [chunk["id"] for chunk in kept] == [chunk["id"] for row, chunk in enumerate(old) if row not in removed_rows]
+    assert 0 < len(added) < len(_chunks({"B": DOC_B_EDITED}))
+
+def test_unchanged_documents_are_untouched():
+    old, kept, _, _ = _delta(DOC_B_EDITED)
+    assert [chunk for chunk in kept if chunk["metadata"]["source"] == "A"] == [chunk for chunk in old if chunk["metadata"]["source"] == "A"]
+
+def test_metadata_only_change_refreshes_levels_without_reembedding():
+    _, kept, removed_rows, added = _delta(DOC_B_RELABELLED)
+    assert removed_rows == [] and added == []
+    assert {chunk["metadata"]["security_level"] for chunk in kept if chunk["metadata"]["source"] == "B"} == {3}
+
+def _delta_matrix(old, kept, removed_rows, added):
+    keep = np.ones(len(old), dtype=bool)
+    keep[removed_rows] = False
+    return np.concatenate([_embed(old)[keep], _embed(added)])
+
+def test_delta_matrix_equals_fresh_embeddings():
+    old, kept, removed_rows, added = _delta(DOC_B_EDITED)
+    np.testing.assert_array_equal(_delta_matrix(old, kept, removed_rows, added), _embed(kept + added))
+
+def test_embedding_store_delta(tmp_path):
+    path = str(tmp_path / "embeddings.f32")
+    old, kept, removed_rows, added = _delta(DOC_B_EDITED)
+    write_embedding_store(path, _embed(old), fingerprint="old")
+
+    # Pure append is written in place; a mapping taken before it stays valid
+    before = open_embedding_store(path, fingerprint="old")
+    appended = update_embedding_store(path, [], _embed(added), fingerprint="appended")
+    np.testing.assert_array_equal(appended.matrix, np.concatenate([_embed(old), _embed(added)]))
+    np.testing.assert_array_equal(before.matrix, _embed(old))
+    assert open_embedding_store(path, fingerprint="old") is None
+
+    write_embedding_store(path, _embed(old), fingerprint="old")
+    store = update_embedding_store(path, removed_rows, _embed(added), fingerprint="new")
+    assert (store.count, store.fingerprint) == (len(kept) + len(added), "new")
+    np.testing.assert_array_equal(store.matrix, _embed(kept + added))
+
+@pytest.mark.parametrize("make_engine", [
+    lambda matrix: MatrixSearchEngine(matrix, normalized=True),
+    lambda matrix: build_quantized_engine(matrix, mode="int8", rescore=True),
+], ids=["matrix", "int8"])
+def test_index_delta_finds_every_chunk(make_engine):
+    old, kept, removed_rows, added = _delta(DOC_B_EDITED)
+    engine = make_engine(_embed(old))
+    matrix = _delta_matrix(old, kept, removed_rows, added)
+    updated = apply_index_delta(engine, kept + added, matrix, removed_rows)
+    assert len(updated) == len(kept) + len(added) and len(engine) == len(old)
+    for row in range(len(matrix)):
+        _, indices = updated.search(matrix[row], 1)
+        assert indices[0] == row
+
+def test_detect_changed_documents(tmp_path):
+    paths = {}
+    for name in ("A", "B", "C"):
+        paths[name] = str(tmp_path / f"{name}.txt")
+        with open(paths[name], "w", encoding="utf-8") as f:
+            f.write(f"{name} original text")
+    signatures, changed = detect_changed_documents(paths, {})
+    assert changed == {"A", "B", "C"}
+
+    os.utime(paths["A"], ns=(0, 10 ** 9)) # Touched, same content
+    with open(paths["B"], "w", encoding="utf-8") as f:
+        f.write("B edited text")
+    os.remove(paths["C"])
+    paths.pop("C")
+    paths["D"] = str(tmp_path / "D.txt")
+    with open(paths["D"], "w", encoding="utf-8") as f:
+        f.write("D new text")
+    _, changed = detect_changed_documents(paths, signatures)
+    assert changed == {"B", "C", "D"}
+
+# --- END OF FILE tests/test_incremental.py ---
@@ -0,0 +1,83 @@
+# --- START OF FILE tests/test_rule_parser.py ---
+# Rule parsing and the compiled (Aho-Corasick + topic bucket) matcher against data/Response_Framework.txt.
+
+import os
+import re
+
+import pytest
+
+from src.framework.rule_parser import AhoCorasick, compile_rules, match_rule_to_query, parse_rules
+
+FRAMEWORK_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "Response_Framework.txt")
+
+RULES = parse_rules(FRAMEWORK_PATH)
+RULE_SET = compile_rules(RULES)
+
+def _example_query(rule):
+    """A query an agent would type to trigger the rule."""
+    trigger = rule["trigger_value"].split("|", 1)[0]
+    return trigger if rule["trigger_type"] == "starts_with" else f"Tell me about {trigger}"
+
+def test_every_rule_line_is_parsed():
+    assert sorted(rule["rule_number"] for rule in RULES) == list(range(1, 101))
+
+@pytest.mark.parametrize("rule", RULES, ids=lambda rule: f"rule{rule['rule_number']}")
+def test_example_query_maps_to_its_rule(rule):
+    matched = RULE_SET.match(_example_query(rule), rule["level"] or 1)
+    assert matched is not None and matched["rule_number"] == rule["rule_number"]
+
+@pytest.mark.parametrize("query, agent_level, rule_number", [
+    ("Omega Echo", 1, 6),
+    ("Tell me about Operation Hollow Stone", 2, 14),
+    ("Who controls RAW?", 5, 17),
+    ("who controls raw", 5, 17),
+    ("The bridge is burning", 3, 21),
+    ("What about level 5 data?", 3, 10),
+    ("Tell me about Facility X-17", 3, 31),
+    ("What is the emergency extraction protocol?", 1, 1),
+    ("How do I handle compromised assets?", 3, 8),
+    ("How to verify a false identity?", 2, 9),
+    ("Tell me about neural signature scanners", 1, 25),
+    ("What is the S-29 Protocol?", 3, None),
+    ("Describe the Handshake Protocol", 2, None),
+    ("Some random query with no match", 2, None),
+])
+def test_sample_queries(query, agent_level, rule_number):
+    matched = RULE_SET.match(query, agent_level)
+    assert (matched and matched["rule_number"]) == rule_number
+
+def test_response_types():
+    by_number = {rule["rule_number"]: rule for rule in RULES}
+    assert by_number[6]["response_type"] == "direct_quote"
+    assert by_number[6]["response_value"] == "The shadow moves, but the light never follows."
+    assert by_number[10]["response_type"] == "access_denied"
+    assert by_number[31]["response_type"] == "time_based"
+    assert by_number[31]["trigger_value"] == "Facility X-17|after 2 AM UTC"
+    assert by_number[1]["response_type"] == "style_guide"
+
+def test_phrase_needs_word_boundaries():
+    assert RULE_SET.match("The omega echoes faded", 1) is None
+
+def test_starts_with_is_anchored():
+    assert RULE_SET.match("I heard the bridge is burning", 3) is None
+
+def test_level_restricted_phrase():
+    assert RULE_SET.match("Candle Shop", 5)["rule_number"] == 29
+    assert RULE_SET.match("Candle Shop", 1) is None
+
+def test_topic_rules_only_apply_to_their_level():
+    assert RULE_SET.match("How do I handle compromised assets?", 2) is None
+
+def test_plain_rule_list_is_accepted():
+    assert match_rule_to_query(RULES, "Omega Echo", 1)["rule_number"] == 6
+
+def test_aho_corasick_finds_every_overlapping_occurrence():
+    patterns = ["he", "she", "his", "hers", "e"]
+    text = "ushers and she sells his shells"
+    automaton = AhoCorasick(patterns)
+    expected = sorted((pattern_id, match.start(), match.start() + len(pattern))
+                      for pattern_id, pattern in enumerate(patterns)
+                      for match in re.finditer(f"(?={re.escape(pattern)})", text))
+    assert sorted(automaton.iter_matches(text)) == expected
+
+# --- END OF FILE tests/test_rule_parser.py ---